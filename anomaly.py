@@ -0,0 +1,163 @@
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from config import Config
+import database
+
+HOURS = 24
+
+def _stored_baselines():
+    rows = {kind: [] for kind in database.ANOMALY_ENTITY_KINDS}
+    for kind, entity, days, mean, var, active in database.get_anomaly_baselines():
+        if kind in rows:
+            rows[kind].append((entity, days, mean, var, active))
+    baselines = {}
+    for kind, entries in rows.items():
+        if entries:
+            entities, days, mean, var, active = zip(*entries)
+            baselines[kind] = (list(entities), np.array(days, dtype=np.int64),
+                               np.array(mean, dtype=np.float64), np.array(var, dtype=np.float64),
+                               np.array(active, dtype=np.float64))
+        else:
+            empty = np.zeros((0, HOURS))
+            baselines[kind] = ([], np.zeros(0, dtype=np.int64), empty, empty, empty)
+    return baselines
+
+def hourly_matrix(entities, rows):
+    # Rows for entities without a baseline yet are appended after the stored ones.
+    index = {entity: idx for idx, entity in enumerate(entities)}
+    entities = list(entities)
+    for entity, _, _ in rows:
+        if entity not in index:
+            index[entity] = len(entities)
+            entities.append(entity)
+    counts = np.zeros((len(entities), HOURS))
+    if rows:
+        names, hours, values = zip(*rows)
+        counts[[index[name] for name in names], list(hours)] = values
+    return entities, counts
+
+def pad_baseline(days, mean, var, active, size):
+    missing = size - len(days)
+    if missing:
+        days = np.concatenate([days, np.zeros(missing, dtype=np.int64)])
+        mean, var, active = (np.vstack([matrix, np.zeros((missing, HOURS))]) for matrix in (mean, var, active))
+    return days, mean, var, active
+
+def score(counts, days, mean, var, active, warmup_days=None, z_threshold=None, min_events=None, rare_hour=None):
+    warmup_days = Config.ANOMALY_WARMUP_DAYS if warmup_days is None else warmup_days
+    z_threshold = Config.ANOMALY_Z_THRESHOLD if z_threshold is None else z_threshold
+    min_events = Config.ANOMALY_MIN_EVENTS if min_events is None else min_events
+    rare_hour = Config.ANOMALY_RARE_HOUR if rare_hour is None else rare_hour
+    
+    warm = (days >= warmup_days)[:, None]
+    # Hourly counts are roughly Poisson, so the mean floors the variance and
+    # an entity with a flat history is not flagged for its first few events.
+    spread = np.sqrt(np.maximum(var, mean) + 1.0)
+    z = (counts - mean) / spread
+    spikes = warm & (counts >= min_events) & (z >= z_threshold)
+    rare = warm & (counts > 0) & (active < rare_hour)
+    return z, spikes, rare
+
+def update(counts, days, mean, var, active, span_days=None):
+    span_days = Config.ANOMALY_BASELINE_DAYS if span_days is None else span_days
+    # Exponentially weighted over span_days; until an entity has that much
+    # history every day it was observed weighs the same.
+    alpha = np.maximum(2.0 / (span_days + 1), 1.0 / (days + 1))[:, None]
+    diff = counts - mean
+    increment = alpha * diff
+    mean = mean + increment
+    var = (1 - alpha) * (var + diff * increment)
+    active = active + alpha * ((counts > 0) - active)
+    return days + 1, mean, var, active
+
+def _array_literals(matrix):
+    # Postgres array text is several times cheaper to send than letting
+    # psycopg2 adapt every float of every row.
+    return ['{' + ','.join(map(repr, row)) + '}' for row in matrix.tolist()]
+
+def _hour_list(hours):
+    return ', '.join(f'{hour:02d}:00' for hour in hours)
+
+def _findings(day, kind, entities, counts, mean, active, z, spikes, rare):
+    findings = []
+    
+    flagged = np.flatnonzero(spikes.any(axis=1))
+    worst = np.where(spikes, z, -np.inf).argmax(axis=1)
+    for row in flagged:
+        hour = int(worst[row])
+        findings.append((
+            day, kind, entities[row], 'volume_spike', hour,
+            float(counts[row, hour]), round(float(mean[row, hour]), 2), round(float(z[row, hour]), 2),
+            f"{int(counts[row, hour])} events at {hour:02d}:00, {mean[row, hour]:.1f} expected; "
+            f"spikes at {_hour_list(np.flatnonzero(spikes[row]))}"
+        ))
+    
+    flagged = np.flatnonzero(rare.any(axis=1))
+    least_usual = np.where(rare, active, np.inf).argmin(axis=1)
+    for row in flagged:
+        hour = int(least_usual[row])
+        findings.append((
+            day, kind, entities[row], 'unusual_hour', hour,
+            float(counts[row, hour]), round(float(active[row, hour]), 4), round(float(z[row, hour]), 2),
+            f"active at {_hour_list(np.flatnonzero(rare[row]))}, "
+            f"normally active at {hour:02d}:00 on {active[row, hour]:.0%} of days"
+        ))
+    return findings
+
+def score_day(day):
+    started = time.perf_counter()
+    hourly, terminals = database.get_hourly_activity(day)
+    stored = _stored_baselines()
+    
+    baselines = []
+    findings = []
+    warm_operators = set()
+    for kind in database.ANOMALY_ENTITY_KINDS:
+        entities, days, mean, var, active = stored[kind]
+        entities, counts = hourly_matrix(entities, hourly[kind])
+        days, mean, var, active = pad_baseline(days, mean, var, active, len(entities))
+        
+        z, spikes, rare = score(counts, days, mean, var, active)
+        findings.extend(_findings(day, kind, entities, counts, mean, active, z, spikes, rare))
+        if kind == 'operator':
+            warm_operators = {entities[row] for row in np.flatnonzero(days >= Config.ANOMALY_WARMUP_DAYS)}
+        
+        seen = counts.sum(axis=1) > 0
+        days, mean, var, active = update(counts, days, mean, var, active)
+        baselines.extend(zip(
+            [kind] * len(entities), entities, days.tolist(),
+            _array_literals(mean), _array_literals(var), _array_literals(active),
+            [day if row_seen else None for row_seen in seen.tolist()]
+        ))
+    
+    # A terminal only counts as new for operators with enough history to
+    # have usual ones.
+    operators = {operator for operator, _ in terminals}
+    known = set(database.get_terminal_ips(operators)) if operators else set()
+    for operator, source_ip in sorted(terminals):
+        if operator in warm_operators and (operator, source_ip) not in known:
+            findings.append((
+                day, 'operator', operator, 'new_terminal_ip', None,
+                None, None, Config.ANOMALY_Z_THRESHOLD, f"first activity from terminal {source_ip}"
+            ))
+    
+    duration_ms = round((time.perf_counter() - started) * 1000, 3)
+    database.record_anomaly_day(day, baselines, terminals, findings, duration_ms, Config.ANOMALY_RETENTION_DAYS)
+    return {'date': day, 'entities': len(baselines), 'findings': len(findings), 'duration_ms': duration_ms}
+
+def pending_days(through=None, start=None):
+    # Only whole days are scored, and each one exactly once, in order.
+    through = through or date.today() - timedelta(days=1)
+    last = database.get_last_anomaly_run()
+    if last is not None:
+        first = max(last + timedelta(days=1), start) if start else last + timedelta(days=1)
+    else:
+        first = start or through - timedelta(days=Config.ANOMALY_BASELINE_DAYS - 1)
+    days = []
+    while first <= through:
+        days.append(first)
+        first += timedelta(days=1)
+    return days
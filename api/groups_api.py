@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request, session
 import database
+from response_cache import conditional_json
 from routes.auth import login_required, role_required
 
 bp = Blueprint('groups_api', __name__, url_prefix='/api')
@@ -8,6 +9,9 @@ bp = Blueprint('groups_api', __name__, url_prefix='/api')
 @login_required
 @role_required(['Admin', 'Manager'])
 def get_groups():
+    return conditional_json(('groups', session['role']), database.get_directory_version(), _groups_list)
+
+def _groups_list():
     groups = database.get_all_groups()
     
     groups_list = []
@@ -19,7 +23,7 @@ def get_groups():
             'created_at': group['created_at'].isoformat() if group['created_at'] else None
         })
     
-    return jsonify(groups_list)
+    return groups_list
 
 @bp.route('/groups/add', methods=['POST'])
 @login_required
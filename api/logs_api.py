@@ -1,55 +1,365 @@
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, Response, jsonify, request, session
+from datetime import datetime, timedelta
+from markupsafe import escape
+import base64
+import csv
+import io
+import json
+import logging
+import queue
+import re
+import zlib
 import database
+import parsers
+from config import Config
+from event_stream import get_broadcaster
+from ingest_queue import get_ingest_queue
 from routes.auth import login_required, role_required
 
 bp = Blueprint('logs_api', __name__, url_prefix='/api')
 
+def _enqueue_rows(rows):
+    if get_ingest_queue().submit(rows):
+        return True, None
+    response = jsonify({'error': 'Ingest queue is full, retry later'})
+    response.headers['Retry-After'] = str(Config.INGEST_RETRY_AFTER)
+    return False, (response, 503)
+
+MAX_PAGE_SIZE = 1000
+
+def encode_log_cursor(timestamp, log_id):
+    raw = f"{timestamp.isoformat()}|{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_log_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, log_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+def _log_to_dict(log):
+    return {
+        'id': log['id'],
+        'timestamp': log['timestamp'].isoformat() if log['timestamp'] else None,
+        'severity': log['severity'],
+        'source_ip': log['source_ip'],
+        'source_host': log['source_host'],
+        'event_type': log['event_type'],
+        'message': log['message'],
+        'operator': log['operator'],
+        'count': log['event_count'],
+        'last_seen': log['last_seen'].isoformat() if log['last_seen'] else None
+    }
+
+def _resolve_key(cursor_param, id_param):
+    cursor = request.args.get(cursor_param)
+    if cursor:
+        return decode_log_cursor(cursor)
+    log_id = request.args.get(id_param, type=int)
+    if log_id is None:
+        return None
+    key = database.get_log_key(log_id)
+    if key is None:
+        raise ValueError(f'Unknown log id {log_id}')
+    return key
+
+def _logs_page_response(default_limit, severity=None):
+    limit = max(1, min(request.args.get('limit', default_limit, type=int), MAX_PAGE_SIZE))
+    try:
+        after = _resolve_key('since', 'after_id')
+        before = None if after else _resolve_key('before', 'before_id')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    logs, has_more = database.get_logs_page(limit, severity, before=before, after=after, columns=database.LOG_JSON_COLUMNS)
+    
+    if after is not None:
+        newest = logs[-1] if logs else None
+        latest_cursor = encode_log_cursor(newest['timestamp'], newest['id']) if newest else encode_log_cursor(*after)
+        next_cursor = None
+    else:
+        newest = logs[0] if logs else None
+        latest_cursor = encode_log_cursor(newest['timestamp'], newest['id']) if newest else None
+        next_cursor = encode_log_cursor(logs[-1]['timestamp'], logs[-1]['id']) if has_more else None
+    
+    # Each row arrives as JSON text from Postgres; only the envelope is built here.
+    body = (
+        f'{{"has_more":{json.dumps(has_more)},"latest_cursor":{json.dumps(latest_cursor)},'
+        f'"logs":[{",".join(log["json"] for log in logs)}],"next_cursor":{json.dumps(next_cursor)}}}'
+    )
+    return Response(body, mimetype='application/json')
+
 @bp.route('/logs', methods=['GET'])
 @login_required
 @role_required(['Admin', 'Manager', 'Analyst'])
 def get_logs():
-    limit = request.args.get('limit', 100, type=int)
-    severity = request.args.get('severity')
-    
-    if severity:
-        logs = database.get_logs_by_severity(severity, limit)
-    else:
-        logs = database.get_latest_logs(limit)
-    
-    logs_list = []
-    for log in logs:
-        logs_list.append({
-            'id': log['id'],
-            'timestamp': log['timestamp'].isoformat() if log['timestamp'] else None,
-            'severity': log['severity'],
-            'source_ip': log['source_ip'],
-            'source_host': log['source_host'],
-            'event_type': log['event_type'],
-            'message': log['message']
-        })
-    
-    return jsonify(logs_list)
+    return _logs_page_response(100, request.args.get('severity'))
 
 @bp.route('/logs/latest', methods=['GET'])
 @login_required
 @role_required(['Admin', 'Manager', 'Analyst'])
 def get_latest_logs():
-    limit = request.args.get('limit', 20, type=int)
-    logs = database.get_latest_logs(limit)
+    return _logs_page_response(20)
+
+@bp.route('/logs/<int:log_id>', methods=['GET'])
+@login_required
+@role_required(['Admin', 'Manager', 'Analyst'])
+def get_log(log_id):
+    log = database.get_log_detail(log_id)
+    if log is None:
+        return jsonify({'error': 'Log not found'}), 404
+    result = _log_to_dict(log)
+    result['user_id'] = log['user_id']
+    result['log_source_id'] = log['log_source_id']
+    result['raw_log'] = log['raw_log']
+    return jsonify(result)
+
+MIN_CONTAINS_LENGTH = 3
+
+def encode_search_cursor(rank, timestamp, log_id):
+    raw = f"{rank!r}|{timestamp.isoformat()}|{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_search_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        rank, timestamp, log_id = raw.split('|')
+        return float(rank), datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+def _snippet(log, contains):
+    text = log.get('headline') or log['message'] or ''
+    if log.get('headline') is None and contains:
+        text = re.sub(re.escape(contains), lambda m: f"{database.HEADLINE_START}{m.group(0)}{database.HEADLINE_STOP}",
+                      text, flags=re.IGNORECASE)
+    return str(escape(text)).replace(database.HEADLINE_START, '<mark>').replace(database.HEADLINE_STOP, '</mark>')
+
+@bp.route('/logs/search', methods=['GET'])
+@login_required
+@role_required(['Admin', 'Manager', 'Analyst'])
+def search_logs():
+    query = request.args.get('q', '').strip()
+    contains = request.args.get('contains', '').strip()
+    order = request.args.get('sort', 'time')
+    if not query and not contains:
+        return jsonify({'error': 'q or contains is required'}), 400
+    if contains and len(contains) < MIN_CONTAINS_LENGTH:
+        return jsonify({'error': f'contains needs at least {MIN_CONTAINS_LENGTH} characters'}), 400
+    if order not in ('time', 'relevance'):
+        return jsonify({'error': 'sort must be time or relevance'}), 400
+    if order == 'relevance' and not query:
+        return jsonify({'error': 'sort=relevance needs q'}), 400
     
-    logs_list = []
+    limit = max(1, min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE))
+    try:
+        start = database.parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = database.parse_timestamp(request.args['end']) if request.args.get('end') else None
+        cursor = request.args.get('cursor')
+        if cursor:
+            before = decode_search_cursor(cursor) if order == 'relevance' else decode_log_cursor(cursor)
+        else:
+            before = None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    logs, has_more = database.search_logs(query or None, contains or None, request.args.get('severity'),
+                                          start, end, limit, before, order)
+    
+    next_cursor = None
+    if has_more:
+        last = logs[-1]
+        if order == 'relevance':
+            next_cursor = encode_search_cursor(last['rank'], last['timestamp'], last['id'])
+        else:
+            next_cursor = encode_log_cursor(last['timestamp'], last['id'])
+    
+    results = []
     for log in logs:
-        logs_list.append({
-            'id': log['id'],
-            'timestamp': log['timestamp'].isoformat() if log['timestamp'] else None,
-            'severity': log['severity'],
-            'source_ip': log['source_ip'],
-            'source_host': log['source_host'],
-            'event_type': log['event_type'],
-            'message': log['message']
-        })
-    
-    return jsonify(logs_list)
+        result = _log_to_dict(log)
+        result['rank'] = log.get('rank')
+        result['snippet'] = _snippet(log, contains)
+        results.append(result)
+    return jsonify({'logs': results, 'next_cursor': next_cursor, 'has_more': has_more})
+
+STATS_WINDOW_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+MAX_STATS_WINDOW = timedelta(days=90)
+
+def _stats_window():
+    end = datetime.now()
+    if request.args.get('start'):
+        # Offsets such as ...Z are converted to the server's local time, which
+        # is what the rollup buckets are in.
+        start = database.parse_timestamp(request.args['start'])
+        if request.args.get('end'):
+            end = database.parse_timestamp(request.args['end'])
+    else:
+        window = request.args.get('window', '24h')
+        if window == 'today':
+            start = end.replace(hour=0, minute=0, second=0, microsecond=0)
+        else:
+            unit = STATS_WINDOW_UNITS.get(window[-1:])
+            if unit is None or not window[:-1].isdigit():
+                raise ValueError(f"Invalid window '{window}', use e.g. 15m, 24h, 30d or today")
+            try:
+                start = end - timedelta(**{unit: int(window[:-1])})
+            except OverflowError:
+                raise ValueError(f'Window is limited to {MAX_STATS_WINDOW.days} days')
+    if start >= end:
+        raise ValueError('start must be before end')
+    if end - start > MAX_STATS_WINDOW:
+        raise ValueError(f'Window is limited to {MAX_STATS_WINDOW.days} days')
+    return start, end
+
+@bp.route('/logs/stats', methods=['GET'])
+@login_required
+@role_required(['Admin', 'Manager', 'Analyst'])
+def get_log_stats():
+    try:
+        start, end = _stats_window()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    bucket = request.args.get('bucket')
+    if bucket not in (None, 'minute', 'hour', 'day'):
+        return jsonify({'error': 'bucket must be minute, hour or day'}), 400
+    top_n = max(1, min(request.args.get('top', 10, type=int), 100))
+    
+    stats = database.get_event_stats(start, end, top_n, bucket)
+    stats['start'] = stats['start'].isoformat()
+    stats['end'] = stats['end'].isoformat()
+    for point in stats['histogram']:
+        point['time'] = point['time'].isoformat()
+    return jsonify(stats)
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def _ndjson_chunks(batches):
+    for rows in batches:
+        yield ''.join(f"{row[0]}\n" for row in rows).encode('utf-8')
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(database.EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows([value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def _gzip_chunks(chunks, level=None):
+    compressor = zlib.compressobj(Config.EXPORT_GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_chunks(batches, fmt, compress=False):
+    chunks = _ndjson_chunks(batches) if fmt == 'ndjson' else _csv_chunks(batches)
+    return _gzip_chunks(chunks) if compress else chunks
+
+@bp.route('/logs/export', methods=['GET'])
+@login_required
+@role_required(['Admin', 'Manager', 'Analyst'])
+def export_logs():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if not request.args.get('start'):
+        return jsonify({'error': 'start is required'}), 400
+    try:
+        start = database.parse_timestamp(request.args['start'])
+        end = database.parse_timestamp(request.args['end']) if request.args.get('end') else datetime.now()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start >= end:
+        return jsonify({'error': 'start must be before end'}), 400
+    
+    severities = [value.strip().upper() for value in request.args.get('severity', '').split(',') if value.strip()]
+    compress = request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes')
+    batches = database.iter_log_export(
+        start, end, as_json=fmt == 'ndjson', severities=severities,
+        event_type=request.args.get('event_type'), source_host=request.args.get('source_host'),
+        source_ip=request.args.get('source_ip'), log_source_id=request.args.get('log_source_id', type=int)
+    )
+    
+    # The rows are read while the body is sent, so the export holds a pooled
+    # connection for as long as the client takes to download it.
+    filename = f"syslog_events_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.{fmt}{'.gz' if compress else ''}"
+    return Response(export_chunks(batches, fmt, compress),
+                    mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+@bp.route('/logs/stream', methods=['GET'])
+@login_required
+@role_required(['Admin', 'Manager', 'Analyst'])
+def stream_logs():
+    severities = {value.strip().upper() for value in request.args.get('severity', '').split(',') if value.strip()}
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    
+    broadcaster = get_broadcaster()
+    
+    def generate():
+        # Subscribe before replaying so nothing committed in between is missed;
+        # replayed ids are skipped when they also arrive live.
+        subscription = broadcaster.subscribe(severities or None)
+        try:
+            yield f"retry: {Config.EVENT_STREAM_RETRY_MS}\n\n"
+            replayed = set()
+            if last_event_id is not None:
+                missed = database.get_events_after_id(last_event_id, Config.EVENT_STREAM_MAX_BATCH + 1)
+                if len(missed) > Config.EVENT_STREAM_MAX_BATCH:
+                    yield _sse('reset', {'reason': 'too far behind'})
+                else:
+                    for log in missed:
+                        if severities and log['severity'] not in severities:
+                            continue
+                        replayed.add(log['id'])
+                        yield _sse('log', _log_to_dict(log), log['id'])
+            
+            while True:
+                try:
+                    log = subscription.queue.get(timeout=Config.EVENT_STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.overflowed or log is None:
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.overflowed = False
+                    yield _sse('reset', {'reason': 'stream interrupted'})
+                    continue
+                if log['id'] in replayed:
+                    continue
+                yield _sse('log', _log_to_dict(log), log['id'])
+        finally:
+            broadcaster.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @bp.route('/ingest', methods=['POST'])
 def ingest_logs():
@@ -68,39 +378,44 @@ def ingest_logs():
         return jsonify({'error': 'No data provided'}), 400
     
     logs = data if isinstance(data, list) else [data]
+    received_at = datetime.now()
+    
+    parser = parsers.get_parser(source.get('source_type'), 'json')
+    items, errors = parser.parse(logs, source, received_at)
+    
+    accepted = len(items)
+    if Config.INGEST_COALESCE:
+        items = database.coalesce_items(items)
+    
+    if Config.INGEST_ASYNC and items:
+        queued, rejection = _enqueue_rows([row for _, row in items])
+        if not queued:
+            return rejection
+        
+        response = {
+            'status': 'accepted',
+            'queued': accepted,
+            'total': len(logs)
+        }
+        if errors:
+            response['errors'] = [f"Log {idx}: {message}" for idx, message in errors[:10]]
+            response['error_count'] = len(errors)
+        return jsonify(response), 202
     
     inserted_count = 0
-    errors = []
+    committed = set()
+    try:
+        inserted_count, failures = database.write_event_rows(items, committed=committed)
+        errors.extend(failures)
+    except Exception as e:
+        # Chunks committed before the error are stored; reporting them as
+        # failed would have the client send them again.
+        unwritten = [(idx, row) for idx, row in items if idx not in committed]
+        logging.error(f"Failed to ingest {len(unwritten)} of a batch of {len(items)} logs: {str(e)}")
+        inserted_count = sum(row.event_count for idx, row in items if idx in committed)
+        errors.extend((idx, str(e)) for idx, _ in unwritten)
     
-    for idx, log in enumerate(logs):
-        try:
-            severity = log.get('severity', 'INFO').upper()
-            message = log.get('message', '')
-            
-            if not message:
-                errors.append(f"Log {idx}: message is required")
-                continue
-            
-            source_ip = log.get('source_ip') or log.get('host')
-            source_host = log.get('source_host') or log.get('hostname')
-            event_type = log.get('event_type') or log.get('type')
-            raw_log = log.get('raw_log') or str(log)
-            
-            database.insert_log_event_with_source(
-                severity=severity,
-                message=message,
-                source_id=source['id'],
-                source_ip=source_ip,
-                source_host=source_host,
-                event_type=event_type,
-                raw_log=raw_log
-            )
-            inserted_count += 1
-        except Exception as e:
-            import logging
-            logging.error(f"Failed to ingest log {idx}: {str(e)}")
-            errors.append(f"Log {idx}: {str(e)}")
-            continue
+    errors.sort(key=lambda error: error[0])
     
     response = {
         'status': 'success' if inserted_count > 0 else 'error',
@@ -109,7 +424,7 @@ def ingest_logs():
     }
     
     if errors:
-        response['errors'] = errors[:10]
+        response['errors'] = [f"Log {idx}: {message}" for idx, message in errors[:10]]
         response['error_count'] = len(errors)
     
     return jsonify(response), 201 if inserted_count > 0 else 400
@@ -134,18 +449,23 @@ def receive_syslog():
         return jsonify({'error': 'Empty syslog data'}), 400
     
     try:
-        database.insert_log_event_with_source(
-            severity='INFO',
-            message=raw_data[:500],
-            source_id=source['id'],
-            source_ip=source.get('source_ip'),
-            source_host=source.get('name'),
-            event_type='SYSLOG',
-            raw_log=raw_data
-        )
+        parser = parsers.get_parser(source.get('source_type'), 'text')
+        items, failures = parser.parse([raw_data], source, sender_ip=source.get('source_ip') or request.remote_addr)
+        if failures:
+            return jsonify({'error': f'Invalid syslog data: {failures[0][1]}'}), 400
+        row = items[0][1]
+        
+        if Config.INGEST_ASYNC:
+            queued, rejection = _enqueue_rows([row])
+            if not queued:
+                return rejection
+            return jsonify({'status': 'accepted', 'message': 'Syslog event queued'}), 202
+        
+        inserted, failures = database.write_event_rows([(0, row)])
+        if failures:
+            raise ValueError(failures[0][1])
         
         return jsonify({'status': 'success', 'message': 'Syslog event received'}), 201
     except Exception as e:
-        import logging
         logging.error(f"Syslog ingestion failed: {str(e)}")
         return jsonify({'error': f'Failed to process syslog: {str(e)}'}), 500
@@ -0,0 +1,28 @@
+from flask import Blueprint, current_app, jsonify
+import database
+from correlation import get_correlation_stats
+from event_stream import get_event_stream_stats
+from ingest_queue import get_ingest_queue_stats
+from response_cache import get_response_cache_stats
+from routes.auth import login_required, role_required
+from session_store import PostgresSessionInterface
+
+bp = Blueprint('metrics_api', __name__, url_prefix='/api')
+
+@bp.route('/metrics', methods=['GET'])
+@login_required
+@role_required(['Admin'])
+def get_metrics():
+    session_interface = current_app.session_interface
+    return jsonify({
+        'db_pool': database.get_pool_stats(),
+        'api_key_cache': database.get_api_key_cache_stats(),
+        'source_counters': database.get_source_counter_stats(),
+        'rollup_counters': database.get_rollup_counter_stats(),
+        'rbac_cache': database.get_rbac_cache_stats(),
+        'response_cache': get_response_cache_stats(),
+        'sessions': session_interface.stats() if isinstance(session_interface, PostgresSessionInterface) else None,
+        'ingest_queue': get_ingest_queue_stats(),
+        'event_stream': get_event_stream_stats(),
+        'correlation': get_correlation_stats()
+    })
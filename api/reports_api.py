@@ -30,8 +30,10 @@ def get_daily_report_api():
     
     report = database.get_daily_report(group_id, report_date)
     
-    if not report:
-        database.generate_daily_report(group_id)
+    # A missing report is generated on the spot, as it always was; anything
+    # beyond one group and day goes through POST or manage.py reports.
+    if not report and (report_date or datetime.now().date()) <= datetime.now().date():
+        database.generate_daily_report(group_id, report_date)
         report = database.get_daily_report(group_id, report_date)
     
     if report:
@@ -50,4 +52,68 @@ def get_daily_report_api():
             'created_at': report['created_at'].isoformat() if report['created_at'] else None
         })
     else:
-        return jsonify({'error': 'Unable to generate report'}), 500
+        return jsonify({'error': 'No report for this group and date'}), 404
+
+MAX_GENERATE_DAYS = 31
+
+@bp.route('/daily-report', methods=['POST'])
+@login_required
+@role_required(['Admin', 'Manager'])
+def generate_daily_reports_api():
+    data = request.get_json(silent=True) or {}
+    try:
+        start = datetime.strptime(data['start'], '%Y-%m-%d').date() if data.get('start') else datetime.now().date()
+        end = datetime.strptime(data['end'], '%Y-%m-%d').date() if data.get('end') else start
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    if end < start:
+        return jsonify({'error': 'end must not be before start'}), 400
+    if (end - start).days >= MAX_GENERATE_DAYS:
+        return jsonify({'error': f'At most {MAX_GENERATE_DAYS} days per request, use manage.py reports for backfills'}), 400
+    
+    group_ids = data.get('groups')
+    if group_ids is not None and not (isinstance(group_ids, list) and all(isinstance(g, int) for g in group_ids)):
+        return jsonify({'error': 'groups must be a list of group IDs'}), 400
+    
+    generated = database.generate_reports(start, end, group_ids)
+    return jsonify({'generated': generated, 'start': start.isoformat(), 'end': end.isoformat()})
+
+MAX_FINDINGS = 500
+
+@bp.route('/anomalies', methods=['GET'])
+@login_required
+@role_required(['Admin', 'Manager'])
+def get_anomalies_api():
+    date_str = request.args.get('date')
+    if date_str:
+        try:
+            finding_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    else:
+        finding_date = database.get_last_anomaly_run()
+        if finding_date is None:
+            return jsonify({'date': None, 'findings': []})
+    
+    group_id = request.args.get('group', type=int)
+    limit = min(request.args.get('limit', 100, type=int), MAX_FINDINGS)
+    
+    findings = database.get_anomaly_findings(finding_date, group_id, limit)
+    return jsonify({
+        'date': finding_date.isoformat(),
+        'findings': [{
+            'id': finding['id'],
+            'entity_kind': finding['entity_kind'],
+            'entity': finding['entity'],
+            'user_id': finding['user_id'],
+            'username': finding['username'],
+            'group_id': finding['group_id'],
+            'finding_type': finding['finding_type'],
+            'hour': finding['hour'],
+            'observed': finding['observed'],
+            'expected': finding['expected'],
+            'score': finding['score'],
+            'details': finding['details']
+        } for finding in findings]
+    })
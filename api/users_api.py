@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request, session
 import database
+from response_cache import conditional_json
 from routes.auth import login_required, role_required
 
 bp = Blueprint('users_api', __name__, url_prefix='/api')
@@ -8,6 +9,9 @@ bp = Blueprint('users_api', __name__, url_prefix='/api')
 @login_required
 @role_required(['Admin', 'Manager'])
 def get_users():
+    return conditional_json(('users', session['role']), database.get_directory_version(), _users_list)
+
+def _users_list():
     users = database.get_all_users()
     
     users_list = []
@@ -23,7 +27,7 @@ def get_users():
             'is_active': user['is_active']
         })
     
-    return jsonify(users_list)
+    return users_list
 
 @bp.route('/users/add', methods=['POST'])
 @login_required
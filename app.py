@@ -3,18 +3,24 @@ from flask_session import Session
 from flask_wtf.csrf import CSRFProtect
 from config import Config
 import database
+import correlation
+import session_store
 import os
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-Session(app)
+if Config.SESSION_TYPE == 'postgresql':
+    session_store.init_app(app)
+else:
+    Session(app)
 csrf = CSRFProtect(app)
 
 database.init_database()
+correlation.install()
 
 from routes import auth, dashboard, users, groups, siem
-from api import logs_api, users_api, groups_api, reports_api
+from api import logs_api, users_api, groups_api, reports_api, metrics_api
 
 csrf.exempt(logs_api.ingest_logs)
 csrf.exempt(logs_api.receive_syslog)
@@ -28,6 +34,7 @@ app.register_blueprint(logs_api.bp)
 app.register_blueprint(users_api.bp)
 app.register_blueprint(groups_api.bp)
 app.register_blueprint(reports_api.bp)
+app.register_blueprint(metrics_api.bp)
 
 @app.route('/')
 def index():
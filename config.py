@@ -13,9 +13,80 @@ class Config:
     PGUSER = os.environ.get('PGUSER')
     PGPASSWORD = os.environ.get('PGPASSWORD')
     
-    SESSION_TYPE = 'filesystem'
+    DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800))
+    DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+    
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', 'true').lower() in ('1', 'true', 'yes')
+    AUTO_MIGRATE_MAX_ROWS = int(os.environ.get('AUTO_MIGRATE_MAX_ROWS', 100000))
+    
+    BULK_INSERT_CHUNK_SIZE = int(os.environ.get('BULK_INSERT_CHUNK_SIZE', 5000))
+    BULK_INSERT_MAX_ERRORS = int(os.environ.get('BULK_INSERT_MAX_ERRORS', 100))
+    
+    API_KEY_CACHE_SIZE = int(os.environ.get('API_KEY_CACHE_SIZE', 1024))
+    API_KEY_CACHE_TTL = float(os.environ.get('API_KEY_CACHE_TTL', 60))
+    API_KEY_NEGATIVE_CACHE_SIZE = int(os.environ.get('API_KEY_NEGATIVE_CACHE_SIZE', 4096))
+    API_KEY_NEGATIVE_CACHE_TTL = float(os.environ.get('API_KEY_NEGATIVE_CACHE_TTL', 30))
+    RBAC_CACHE_TTL = float(os.environ.get('RBAC_CACHE_TTL', 30))
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 64))
+    RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 30))
+    
+    INGEST_ASYNC = os.environ.get('INGEST_ASYNC', 'false').lower() in ('1', 'true', 'yes')
+    INGEST_QUEUE_MAX_SIZE = int(os.environ.get('INGEST_QUEUE_MAX_SIZE', 50000))
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+    INGEST_FLUSH_INTERVAL = float(os.environ.get('INGEST_FLUSH_INTERVAL', 0.2))
+    INGEST_RETRY_AFTER = int(os.environ.get('INGEST_RETRY_AFTER', 1))
+    INGEST_DRAIN_TIMEOUT = float(os.environ.get('INGEST_DRAIN_TIMEOUT', 10))
+    INGEST_COALESCE = os.environ.get('INGEST_COALESCE', 'false').lower() in ('1', 'true', 'yes')
+    INGEST_COALESCE_WINDOW = float(os.environ.get('INGEST_COALESCE_WINDOW', 60))
+    INGEST_COALESCE_MAX_GROUPS = int(os.environ.get('INGEST_COALESCE_MAX_GROUPS', 10000))
+    RAW_LOG_COMPRESS_LEVEL = int(os.environ.get('RAW_LOG_COMPRESS_LEVEL', 6))
+    RAW_LOG_BLOCK_SIZE = int(os.environ.get('RAW_LOG_BLOCK_SIZE', 1000))
+    SOURCE_STATS_FLUSH_INTERVAL = float(os.environ.get('SOURCE_STATS_FLUSH_INTERVAL', 1.0))
+    
+    SYSLOG_BIND_HOST = os.environ.get('SYSLOG_BIND_HOST', '0.0.0.0')
+    SYSLOG_UDP_PORT = int(os.environ.get('SYSLOG_UDP_PORT', 5514))
+    SYSLOG_TCP_PORT = int(os.environ.get('SYSLOG_TCP_PORT', 5514))
+    SYSLOG_MAX_MESSAGE_SIZE = int(os.environ.get('SYSLOG_MAX_MESSAGE_SIZE', 65536))
+    
+    SYSLOG_PARTITION_INTERVAL = os.environ.get('SYSLOG_PARTITION_INTERVAL', 'day')
+    SYSLOG_PARTITION_PREMAKE_DAYS = int(os.environ.get('SYSLOG_PARTITION_PREMAKE_DAYS', 7))
+    SYSLOG_RETENTION_DAYS = int(os.environ.get('SYSLOG_RETENTION_DAYS', 0))
+    SYSLOG_PARTITION_MAX_AGE_DAYS = int(os.environ.get('SYSLOG_PARTITION_MAX_AGE_DAYS', 90))
+    
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 5000))
+    EXPORT_GZIP_LEVEL = int(os.environ.get('EXPORT_GZIP_LEVEL', 6))
+    
+    ROLLUP_MINUTE_RETENTION_HOURS = int(os.environ.get('ROLLUP_MINUTE_RETENTION_HOURS', 48))
+    ROLLUP_FLUSH_INTERVAL = float(os.environ.get('ROLLUP_FLUSH_INTERVAL', 1.0))
+    
+    EVENT_STREAM_BACKEND = os.environ.get('EVENT_STREAM_BACKEND', 'postgres')
+    EVENT_STREAM_HEARTBEAT = float(os.environ.get('EVENT_STREAM_HEARTBEAT', 15))
+    EVENT_STREAM_QUEUE_SIZE = int(os.environ.get('EVENT_STREAM_QUEUE_SIZE', 1000))
+    EVENT_STREAM_MAX_BATCH = int(os.environ.get('EVENT_STREAM_MAX_BATCH', 500))
+    EVENT_STREAM_RETRY_MS = int(os.environ.get('EVENT_STREAM_RETRY_MS', 5000))
+    
+    CORRELATION_ENABLED = os.environ.get('CORRELATION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    CORRELATION_RULES_FILE = os.environ.get('CORRELATION_RULES_FILE',
+                                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'correlation_rules.json'))
+    CORRELATION_MAX_KEYS = int(os.environ.get('CORRELATION_MAX_KEYS', 10000))
+    
+    ANOMALY_BASELINE_DAYS = int(os.environ.get('ANOMALY_BASELINE_DAYS', 28))
+    ANOMALY_WARMUP_DAYS = int(os.environ.get('ANOMALY_WARMUP_DAYS', 7))
+    ANOMALY_RETENTION_DAYS = int(os.environ.get('ANOMALY_RETENTION_DAYS', 90))
+    ANOMALY_Z_THRESHOLD = float(os.environ.get('ANOMALY_Z_THRESHOLD', 4.0))
+    ANOMALY_MIN_EVENTS = int(os.environ.get('ANOMALY_MIN_EVENTS', 10))
+    ANOMALY_RARE_HOUR = float(os.environ.get('ANOMALY_RARE_HOUR', 0.05))
+    
+    SESSION_TYPE = os.environ.get('SESSION_TYPE', 'postgresql')
     SESSION_PERMANENT = False
     SESSION_USE_SIGNER = True
+    SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 4096))
+    SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', 5))
+    SESSION_SWEEP_INTERVAL = float(os.environ.get('SESSION_SWEEP_INTERVAL', 300))
+    SESSION_SWEEP_BATCH_SIZE = int(os.environ.get('SESSION_SWEEP_BATCH_SIZE', 5000))
     
     ROLES = ['Admin', 'Manager', 'Analyst', 'User']
     
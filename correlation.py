@@ -0,0 +1,466 @@
+import abc
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from itertools import chain
+from operator import attrgetter, itemgetter
+from datetime import timedelta
+
+from config import Config
+import database
+from database import EventRow
+
+# Columns a rule can match on or group by.
+FIELD_POSITIONS = {column: EventRow._fields.index(column)
+                   for column in ('severity', 'message', 'source_ip', 'source_host', 'event_type', 'operator', 'user_id',
+                                  'log_source_id')}
+
+TIMESTAMP = EventRow._fields.index('timestamp')
+EVENT_COUNT = EventRow._fields.index('event_count')
+
+TEXT_FIELDS = frozenset(('severity', 'message', 'source_ip', 'source_host', 'event_type', 'operator'))
+
+# Equality conditions on these columns (first one a rule has wins) decide
+# which events a rule is even looked at for; rules with none of them are
+# checked against every event.
+INDEX_FIELDS = ('event_type', 'log_source_id', 'source_host', 'severity', 'source_ip', 'operator', 'user_id')
+
+ALERT_EVENT_TYPE = 'CORRELATION'
+
+# Expired keys are swept after this many events rather than on every batch;
+# in between, max_keys still bounds each rule.
+SWEEP_EVENTS = 10000
+
+def _required(spec, field):
+    if spec.get(field) in (None, '', [], {}):
+        raise ValueError(f"missing {field!r}")
+    return spec[field]
+
+def _threshold(spec):
+    threshold = int(_required(spec, 'threshold'))
+    if threshold < 1:
+        raise ValueError("threshold must be at least 1")
+    return threshold
+
+def _position(field):
+    if field not in FIELD_POSITIONS:
+        raise ValueError(f"unknown field {field!r}")
+    return FIELD_POSITIONS[field]
+
+def _text_check(field, spec):
+    position = _position(field)
+    if field not in TEXT_FIELDS:
+        raise ValueError(f"{field} is not a text field")
+    if set(spec) == {'contains'}:
+        needle = str(spec['contains'])
+        return lambda row: row[position] is not None and needle in row[position]
+    if set(spec) == {'regex'}:
+        search = re.compile(spec['regex']).search
+        return lambda row: row[position] is not None and search(row[position]) is not None
+    raise ValueError(f"{field} condition must be a value, a list, {{\"contains\": ...}} or {{\"regex\": ...}}")
+
+def compile_match(match):
+    # {"field": value | [values] | {"contains": text} | {"regex": pattern}}
+    # -> ({field: frozenset of accepted values}, {condition: row -> bool}).
+    # Conditions are hashable, so rules that share one can share its check.
+    if not isinstance(match, dict):
+        raise ValueError("match must be an object")
+    equals = {}
+    checks = {}
+    for field, spec in match.items():
+        if isinstance(spec, dict):
+            checks[(field, 'text', json.dumps(spec, sort_keys=True))] = _text_check(field, spec)
+            continue
+        _position(field)
+        values = spec if isinstance(spec, list) else [spec]
+        if field in ('user_id', 'log_source_id'):
+            values = [int(value) for value in values]
+        equals[field] = frozenset(values)
+    return equals, checks
+
+def _combined(checks):
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+    def check(row):
+        for single in checks:
+            if not single(row):
+                return False
+        return True
+    return check
+
+class Rule(abc.ABC):
+    # Per-key window state lives in `keys`, least recently updated first, and
+    # an update re-inserts its key at the end. Beyond max_keys the stalest
+    # key is dropped. States are tuples or dicts of plain values, which the
+    # garbage collector does not track, so a large state costs nothing
+    # between updates. A key's window ends at the newest event seen for it;
+    # events arriving later with older timestamps count only inside it.
+    kind = None
+    
+    def __init__(self, spec, max_keys=None):
+        self.name = str(_required(spec, 'name'))
+        self.title = spec.get('description') or self.name
+        self.seconds = float(_required(spec, 'window'))
+        if self.seconds <= 0:
+            raise ValueError("window must be positive")
+        self.window = timedelta(seconds=self.seconds)
+        self.group_by = _required(spec, 'group_by')
+        self.key_position = _position(self.group_by)
+        self.max_keys = max_keys or Config.CORRELATION_MAX_KEYS
+        self.keys = OrderedDict()
+        self.fired = 0
+        self.evicted = 0
+        self.expired = 0
+    
+    def matches(self):
+        # (match conditions, step) pairs this rule is fed from.
+        return [(self.match, 0)]
+    
+    def _store(self, key, state):
+        keys = self.keys
+        keys[key] = state
+        if len(keys) > self.max_keys:
+            keys.popitem(last=False)
+            self.evicted += 1
+    
+    @staticmethod
+    @abc.abstractmethod
+    def latest(state):
+        pass
+    
+    @abc.abstractmethod
+    def update(self, row, step, key):
+        pass
+    
+    def expire(self, now):
+        cutoff = now - self.window
+        keys = self.keys
+        latest = self.latest
+        while keys:
+            key, state = next(iter(keys.items()))
+            if latest(state) >= cutoff:
+                break
+            del keys[key]
+            self.expired += 1
+    
+    def alert(self, row, key, count, first_seen, detail, last_seen=None):
+        self.fired += 1
+        last_seen = last_seen or row.timestamp
+        raw_log = json.dumps({
+            'rule': self.name, 'type': self.kind, 'group_by': self.group_by, 'key': key, 'count': count,
+            'first_seen': first_seen.isoformat(), 'last_seen': last_seen.isoformat(), 'window_seconds': self.seconds
+        })
+        return EventRow(last_seen, 'CRITICAL', f"{self.title}: {detail}", row.source_ip, row.source_host,
+                        ALERT_EVENT_TYPE, row.user_id, raw_log, None, operator=row.operator)
+    
+    def _seconds_text(self):
+        return f"{self.seconds:g}s"
+
+class ThresholdRule(Rule):
+    # `threshold` matching events (coalesced rows count event_count times)
+    # for one key within `window` seconds.
+    kind = 'threshold'
+    
+    def __init__(self, spec, max_keys=None):
+        super().__init__(spec, max_keys)
+        self.match = _required(spec, 'match')
+        self.threshold = _threshold(spec)
+    
+    @staticmethod
+    def latest(state):
+        return state[-2]
+    
+    def update(self, row, step, key):
+        # state: (total, ts, count, ts, count, ...), oldest first. It holds
+        # fewer than `threshold` events, so rebuilding it is cheap.
+        ts = row[TIMESTAMP]
+        count = row[EVENT_COUNT]
+        keys = self.keys
+        state = keys.get(key, ())
+        if state and ts < state[-2]:
+            return self._late(row, key, state, ts, count)
+        if state:
+            del keys[key]
+        total = count
+        first = 1
+        if state:
+            total += state[0]
+            cutoff = ts - self.window
+            while first < len(state) and state[first] < cutoff:
+                total -= state[first + 1]
+                first += 2
+        if total < self.threshold:
+            keys[key] = (total,) + state[first:] + (ts, count)
+            if not state and len(keys) > self.max_keys:
+                keys.popitem(last=False)
+                self.evicted += 1
+            return None
+        return self.alert(row, key, total, state[first] if first < len(state) else ts,
+                          f"{total} events from {self.group_by} {key} within {self._seconds_text()}")
+    
+    def _late(self, row, key, state, ts, count):
+        # Older than the newest event held for the key: outside its window
+        # the event is ignored, inside it is slotted into place.
+        latest = state[-2]
+        if ts < latest - self.window:
+            return None
+        keys = self.keys
+        del keys[key]
+        total = state[0] + count
+        entries = sorted(list(zip(state[1::2], state[2::2])) + [(ts, count)], key=itemgetter(0))
+        if total < self.threshold:
+            keys[key] = (total,) + tuple(chain.from_iterable(entries))
+            return None
+        return self.alert(row, key, total, entries[0][0],
+                          f"{total} events from {self.group_by} {key} within {self._seconds_text()}", latest)
+
+class DistinctRule(Rule):
+    # `threshold` different values of `field` among matching events for one
+    # key within `window` seconds, e.g. one address failing logins on many
+    # hosts.
+    kind = 'distinct'
+    
+    def __init__(self, spec, max_keys=None):
+        super().__init__(spec, max_keys)
+        self.match = _required(spec, 'match')
+        self.field = _required(spec, 'field')
+        self.field_position = _position(self.field)
+        self.threshold = _threshold(spec)
+    
+    @staticmethod
+    def latest(state):
+        return next(reversed(state.values()))
+    
+    def update(self, row, step, key):
+        # state: {value: last seen}, oldest sighting first.
+        value = row[self.field_position]
+        if value is None:
+            return None
+        ts = row[TIMESTAMP]
+        keys = self.keys
+        seen = keys.get(key)
+        if seen is None:
+            seen = {value: ts}
+        elif ts >= self.latest(seen):
+            del keys[key]
+            seen.pop(value, None)
+            seen[value] = ts
+            cutoff = ts - self.window
+            if next(iter(seen.values())) < cutoff:
+                seen = {seen_value: seen_ts for seen_value, seen_ts in seen.items() if seen_ts >= cutoff}
+        else:
+            # An older sighting, as for ThresholdRule: ignored outside the
+            # window, and otherwise only news if the value is.
+            if ts < self.latest(seen) - self.window or seen.get(value, ts) > ts:
+                return None
+            del keys[key]
+            seen[value] = ts
+            seen = dict(sorted(seen.items(), key=itemgetter(1)))
+        if len(seen) < self.threshold:
+            self._store(key, seen)
+            return None
+        return self.alert(row, key, len(seen), next(iter(seen.values())),
+                          f"{len(seen)} distinct {self.field} values from {self.group_by} {key} "
+                          f"within {self._seconds_text()}", self.latest(seen))
+
+class SequenceRule(Rule):
+    # Events matching each of `steps` in order, for one key, with the last
+    # no more than `window` seconds after the first. A repeat of the first
+    # step while waiting for the second restarts the window from it. Steps
+    # must also be in order in time: an event older than the step before
+    # does not advance the sequence.
+    kind = 'sequence'
+    
+    def __init__(self, spec, max_keys=None):
+        super().__init__(spec, max_keys)
+        self.steps = _required(spec, 'steps')
+        if not isinstance(self.steps, list) or len(self.steps) < 2:
+            raise ValueError("a sequence needs at least two steps")
+        if not all(isinstance(step, dict) and step for step in self.steps):
+            raise ValueError("every step needs match conditions")
+    
+    def matches(self):
+        return [(step, idx) for idx, step in enumerate(self.steps)]
+    
+    @staticmethod
+    def latest(state):
+        return state[2]
+    
+    def update(self, row, step, key):
+        # state: (started, next step, latest, row that last advanced it)
+        ts = row[TIMESTAMP]
+        keys = self.keys
+        state = keys.get(key)
+        if state is not None and ts - state[0] > self.window:
+            del keys[key]
+            state = None
+        if state is None or (step == 0 and state[1] == 1 and ts >= state[0]):
+            if step == 0:
+                keys.pop(key, None)
+                self._store(key, (ts, 1, ts, row))
+            return None
+        if step != state[1] or state[3] is row or ts < state[2]:
+            return None
+        del keys[key]
+        if step + 1 < len(self.steps):
+            self._store(key, (state[0], step + 1, ts, row))
+            return None
+        return self.alert(row, key, len(self.steps), state[0],
+                          f"{len(self.steps)}-step sequence by {self.group_by} {key} "
+                          f"within {(ts - state[0]).total_seconds():g}s")
+
+RULE_TYPES = {'threshold': ThresholdRule, 'distinct': DistinctRule, 'sequence': SequenceRule}
+
+def build_rules(specs, max_keys=None):
+    rules = []
+    names = set()
+    for number, spec in enumerate(specs, 1):
+        label = spec.get('name') if isinstance(spec, dict) else None
+        try:
+            if not isinstance(spec, dict):
+                raise ValueError("expected an object")
+            rule_class = RULE_TYPES.get(spec.get('type'))
+            if rule_class is None:
+                raise ValueError(f"type must be one of {', '.join(RULE_TYPES)}")
+            rule = rule_class(spec, max_keys)
+            for match, _ in rule.matches():
+                compile_match(match)
+        except (TypeError, ValueError, re.error) as e:
+            raise ValueError(f"rule {label or number}: {e}")
+        if rule.name in names:
+            raise ValueError(f"rule {rule.name}: duplicate name")
+        names.add(rule.name)
+        rules.append(rule)
+    return rules
+
+def load_rules(path, max_keys=None):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return build_rules(data['rules'] if isinstance(data, dict) else data, max_keys)
+
+class CorrelationEngine:
+    # Evaluates every committed event against the rules in memory. Rules are
+    # indexed by their equality conditions up front, so an event is only
+    # tested against the few rules that could match it, and rules left with
+    # the same remaining conditions are grouped so each check runs once.
+    def __init__(self, rules):
+        self.rules = rules
+        indexes = {}
+        unindexed = {}
+        combined = {}
+        for rule in rules:
+            for match, step in rule.matches():
+                equals, checks = compile_match(match)
+                field = next((field for field in INDEX_FIELDS if field in equals), None)
+                for other, values in equals.items():
+                    if other != field:
+                        checks[(other, 'in') + tuple(sorted(map(str, values)))] = self._member(FIELD_POSITIONS[other], values)
+                condition = tuple(sorted(checks))
+                if condition not in combined:
+                    combined[condition] = _combined([checks[key] for key in condition])
+                if field is None:
+                    buckets = [unindexed]
+                else:
+                    index = indexes.setdefault(field, {})
+                    buckets = [index.setdefault(value, {}) for value in equals[field]]
+                for bucket in buckets:
+                    bucket.setdefault(condition, []).append((rule.update, rule.key_position, step))
+        # bucket -> ((check or None, ((update, key position, step), ...)), ...)
+        def groups(bucket):
+            return tuple((combined[condition], tuple(targets)) for condition, targets in bucket.items())
+        self.indexes = tuple((FIELD_POSITIONS[field], {value: groups(bucket) for value, bucket in index.items()})
+                             for field, index in indexes.items())
+        self.unindexed = groups(unindexed)
+        self._lock = threading.Lock()
+        self._unswept = 0
+        self.events = 0
+        self.alerts = 0
+    
+    @staticmethod
+    def _member(position, values):
+        return lambda row: row[position] in values
+    
+    @staticmethod
+    def _apply(groups, row, alerts):
+        for check, targets in groups:
+            if check is None or check(row):
+                for update, key_position, step in targets:
+                    key = row[key_position]
+                    if key is not None:
+                        alert = update(row, step, key)
+                        if alert is not None:
+                            alerts.append(alert)
+    
+    def observe(self, rows):
+        if not rows:
+            return []
+        alerts = []
+        apply = self._apply
+        indexes = self.indexes
+        unindexed = self.unindexed
+        # Within a batch events are taken in time order; files exported
+        # newest first would otherwise look like one long run of late events.
+        rows = sorted(rows, key=attrgetter('timestamp'))
+        with self._lock:
+            for row in rows:
+                for position, index in indexes:
+                    matchers = index.get(row[position])
+                    if matchers is not None:
+                        apply(matchers, row, alerts)
+                if unindexed:
+                    apply(unindexed, row, alerts)
+            self.events += len(rows)
+            self.alerts += len(alerts)
+            self._unswept += len(rows)
+            if self._unswept >= SWEEP_EVENTS:
+                # Swept against this batch's own clock, so replaying an old
+                # file does not expire live keys.
+                now = rows[-1].timestamp
+                for rule in self.rules:
+                    rule.expire(now)
+                self._unswept = 0
+        return alerts
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'rules': len(self.rules),
+                'events': self.events,
+                'alerts': self.alerts,
+                'keys': sum(len(rule.keys) for rule in self.rules),
+                'evicted': sum(rule.evicted for rule in self.rules),
+                'expired': sum(rule.expired for rule in self.rules),
+                'fired': {rule.name: rule.fired for rule in self.rules if rule.fired}
+            }
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def install(path=None):
+    # Loads the rules file once per process and feeds every committed batch
+    # through it. A missing or invalid file is logged and leaves correlation
+    # off rather than stopping ingest.
+    global _engine
+    if not Config.CORRELATION_ENABLED:
+        return None
+    with _engine_lock:
+        if _engine is None:
+            path = path or Config.CORRELATION_RULES_FILE
+            try:
+                engine = CorrelationEngine(load_rules(path))
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Event correlation disabled, cannot load {path}: {str(e)}")
+                return None
+            database.event_row_hooks.append(engine.observe)
+            _engine = engine
+            logging.info(f"Event correlation loaded {len(engine.rules)} rules from {path}")
+    return _engine
+
+def get_correlation_stats():
+    if _engine is None:
+        return None
+    return _engine.stats()
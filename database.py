@@ -1,134 +1,584 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.pool
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor, execute_values
 from config import Config
+from cache import TTLCache
+from syslog_parser import syslog_to_log_entry
+import atexit
 import bcrypt
-from datetime import datetime
+import io
+import itertools
+import json
+import logging
+import operator
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    pass
+
+class ConnectionPool:
+    def __init__(self, dsn, min_size=1, max_size=10, timeout=30, max_lifetime=1800, health_check_interval=30):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._checked_out = {}
+        self._size = 0
+        self._closed = False
+        self._pid = os.getpid()
+        # Connections inherited over fork share their socket with the parent.
+        # Closing them here would terminate the parent's session, so the child
+        # only keeps a reference and never touches them again.
+        self._orphaned = []
+        self._reset_stats()
+    
+    def _reset_stats(self):
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._health_check_failures = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+    
+    def _reset_after_fork(self):
+        self._orphaned.extend(conn for conn, _, _ in self._idle)
+        self._orphaned.extend(conn for conn, _ in self._checked_out.values())
+        self._idle.clear()
+        self._checked_out.clear()
+        self._size = 0
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._reset_stats()
+    
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+    
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+    
+    def _discard(self, conn, reason=None):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            if reason == 'recycled':
+                self._recycled += 1
+            elif reason == 'unhealthy':
+                self._health_check_failures += 1
+            self._cond.notify()
+    
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        
+        while True:
+            conn = None
+            with self._cond:
+                self._check_pid()
+                while True:
+                    if self._closed:
+                        raise psycopg2.pool.PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, created_at, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"no connection available within {timeout}s ({self.max_size} in use)")
+                    self._cond.wait(remaining)
+            
+            if conn is None:
+                try:
+                    conn = psycopg2.connect(self.dsn)
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+                with self._cond:
+                    self._created += 1
+            elif time.monotonic() - created_at > self.max_lifetime:
+                self._discard(conn, 'recycled')
+                continue
+            elif not self._is_healthy(conn, last_used):
+                self._discard(conn, 'unhealthy')
+                continue
+            
+            waited = time.monotonic() - started
+            with self._cond:
+                self._checked_out[id(conn)] = (conn, created_at)
+                self._checkouts += 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+            return conn
+    
+    def putconn(self, conn, discard=False):
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            entry = self._checked_out.pop(id(conn), None)
+            if entry is None:
+                return
+            created_at = entry[1]
+            closed = self._closed
+        
+        reason = None
+        if not discard and not closed and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                discard = True
+            if time.monotonic() - created_at > self.max_lifetime:
+                reason = 'recycled'
+                discard = True
+        else:
+            discard = True
+        
+        if discard:
+            self._discard(conn, reason)
+            return
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+    
+    def prefill(self):
+        conns = [self.getconn() for _ in range(min(self.min_size, self.max_size))]
+        for conn in conns:
+            self.putconn(conn)
+    
+    def close_idle(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+    
+    def close(self):
+        with self._cond:
+            self._closed = True
+        self.close_idle()
+    
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'checked_out': len(self._checked_out),
+                'checkouts': self._checkouts,
+                'connections_created': self._created,
+                'connections_recycled': self._recycled,
+                'health_check_failures': self._health_check_failures,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': round(self._total_wait / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3)
+            }
+
+class PooledConnection:
+    def __init__(self, pool, conn):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+    
+    def __getattr__(self, name):
+        conn = self._conn
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(conn, name)
+    
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+    
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+    
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, '_conn', None)
+            self._pool.putconn(conn)
+    
+    def __del__(self):
+        if self.__dict__.get('_conn') is not None:
+            self.close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    Config.DATABASE_URL,
+                    min_size=Config.DB_POOL_MIN_SIZE,
+                    max_size=Config.DB_POOL_MAX_SIZE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    max_lifetime=Config.DB_POOL_MAX_LIFETIME,
+                    health_check_interval=Config.DB_POOL_HEALTH_CHECK_INTERVAL
+                )
+                _pool.prefill()
+    return _pool
+
+def get_pool_stats():
+    return get_pool().stats()
+
+def _close_idle_before_fork():
+    if _pool is not None:
+        _pool.close_idle()
+
+os.register_at_fork(before=_close_idle_before_fork)
 
 def get_db_connection():
-    conn = psycopg2.connect(Config.DATABASE_URL)
-    return conn
+    pool = get_pool()
+    return PooledConnection(pool, pool.getconn())
 
-def init_database():
+@contextmanager
+def db_connection():
     conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username VARCHAR(100) UNIQUE NOT NULL,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            role VARCHAR(50) NOT NULL,
-            group_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP,
-            is_active BOOLEAN DEFAULT TRUE
-        )
-    ''')
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS groups (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(100) UNIQUE NOT NULL,
-            description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS permissions (
-            id SERIAL PRIMARY KEY,
-            group_id INTEGER REFERENCES groups(id) ON DELETE CASCADE,
-            permission_name VARCHAR(100) NOT NULL,
-            can_create BOOLEAN DEFAULT FALSE,
-            can_read BOOLEAN DEFAULT TRUE,
-            can_update BOOLEAN DEFAULT FALSE,
-            can_delete BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS log_sources (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            source_type VARCHAR(50) NOT NULL,
-            source_ip VARCHAR(50),
-            api_key VARCHAR(255),
-            is_active BOOLEAN DEFAULT TRUE,
-            total_logs_received INTEGER DEFAULT 0,
-            last_received TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS syslog_events (
-            id SERIAL PRIMARY KEY,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            severity VARCHAR(50) NOT NULL,
-            source_ip VARCHAR(50),
-            source_host VARCHAR(255),
-            event_type VARCHAR(100),
-            message TEXT NOT NULL,
-            user_id INTEGER REFERENCES users(id),
-            log_source_id INTEGER REFERENCES log_sources(id),
-            raw_log TEXT,
-            processed BOOLEAN DEFAULT FALSE
-        )
-    ''')
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS activity_reports (
-            id SERIAL PRIMARY KEY,
-            group_id INTEGER REFERENCES groups(id) ON DELETE CASCADE,
-            report_date DATE NOT NULL,
-            total_users INTEGER DEFAULT 0,
-            active_users INTEGER DEFAULT 0,
-            total_events INTEGER DEFAULT 0,
-            critical_events INTEGER DEFAULT 0,
-            unusual_behavior_count INTEGER DEFAULT 0,
-            missing_work_count INTEGER DEFAULT 0,
-            rule_violations INTEGER DEFAULT 0,
-            summary TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def init_database():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                username VARCHAR(100) UNIQUE NOT NULL,
+                email VARCHAR(255) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                role VARCHAR(50) NOT NULL,
+                group_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP,
+                is_active BOOLEAN DEFAULT TRUE
+            )
+        ''')
+        
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS groups (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(100) UNIQUE NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS permissions (
+                id SERIAL PRIMARY KEY,
+                group_id INTEGER REFERENCES groups(id) ON DELETE CASCADE,
+                permission_name VARCHAR(100) NOT NULL,
+                can_create BOOLEAN DEFAULT FALSE,
+                can_read BOOLEAN DEFAULT TRUE,
+                can_update BOOLEAN DEFAULT FALSE,
+                can_delete BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS log_sources (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                source_type VARCHAR(50) NOT NULL,
+                source_ip VARCHAR(50),
+                api_key VARCHAR(255),
+                is_active BOOLEAN DEFAULT TRUE,
+                total_logs_received INTEGER DEFAULT 0,
+                last_received TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS syslog_events (
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                severity VARCHAR(50) NOT NULL,
+                source_ip VARCHAR(50),
+                source_host VARCHAR(255),
+                event_type VARCHAR(100),
+                message TEXT NOT NULL,
+                user_id INTEGER REFERENCES users(id),
+                log_source_id INTEGER REFERENCES log_sources(id),
+                raw_log TEXT,
+                processed BOOLEAN DEFAULT FALSE
+            )
+        ''')
+        
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS activity_reports (
+                id SERIAL PRIMARY KEY,
+                group_id INTEGER REFERENCES groups(id) ON DELETE CASCADE,
+                report_date DATE NOT NULL,
+                total_users INTEGER DEFAULT 0,
+                active_users INTEGER DEFAULT 0,
+                total_events INTEGER DEFAULT 0,
+                critical_events INTEGER DEFAULT 0,
+                unusual_behavior_count INTEGER DEFAULT 0,
+                missing_work_count INTEGER DEFAULT 0,
+                rule_violations INTEGER DEFAULT 0,
+                summary TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        conn.commit()
+        
+        cur.execute("SELECT COUNT(*) FROM users")
+        user_count = cur.fetchone()[0]
+        
+        if user_count == 0:
+            password = bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            cur.execute(
+                "INSERT INTO users (username, email, password_hash, role) VALUES (%s, %s, %s, %s)",
+                ('admin', 'admin@siem.local', password, 'Admin')
+            )
+            conn.commit()
+        
+        cur.close()
     
-    cur.execute("SELECT COUNT(*) FROM users")
-    user_count = cur.fetchone()[0]
+    import migrations
+    if Config.AUTO_MIGRATE:
+        migrations.apply_migrations(startup=True)
+    else:
+        migrations.require_migrated()
     
-    if user_count == 0:
-        password = bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    maintain_event_partitions()
+
+# Key for pg_advisory_xact_lock so two writers never create the same partition.
+PARTITION_LOCK_ID = 0x53494550
+
+_EVENT_PARTITION_RE = re.compile(r'^syslog_events_([dw])(\d{8})$')
+
+_known_event_partitions = set()
+_events_partitioned = False
+
+def event_partition_range(day, interval=None):
+    interval = interval or Config.SYSLOG_PARTITION_INTERVAL
+    if interval == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7), f"syslog_events_w{start:%Y%m%d}"
+    return day, day + timedelta(days=1), f"syslog_events_d{day:%Y%m%d}"
+
+def _events_table_partitioned(cur):
+    global _events_partitioned
+    if _events_partitioned:
+        return True
+    # Only a positive answer is remembered: the migration may run from
+    # manage.py while this process keeps writing.
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('syslog_events')")
+    row = cur.fetchone()
+    _events_partitioned = row is not None and row[0] == 'p'
+    return _events_partitioned
+
+def _event_partition_names(cur):
+    cur.execute(
+        """SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = 'syslog_events'::regclass"""
+    )
+    return {row[0] for row in cur.fetchall()}
+
+def _payload_partition(name):
+    return name.replace('syslog_events_', 'syslog_event_payloads_', 1)
+
+def _create_partition(cur, parent, name, start, end, columns):
+    # A new partition cannot be attached while the default partition
+    # still holds rows for its range, so those move across with it.
+    cur.execute(
+        f"SELECT 1 FROM {parent}_default WHERE timestamp >= %s AND timestamp < %s LIMIT 1",
+        (start, end)
+    )
+    stray = cur.fetchone() is not None
+    if stray:
         cur.execute(
-            "INSERT INTO users (username, email, password_hash, role) VALUES (%s, %s, %s, %s)",
-            ('admin', 'admin@siem.local', password, 'Admin')
+            f"""CREATE TEMP TABLE stray_rows ON COMMIT DROP AS
+                WITH moved AS (DELETE FROM {parent}_default WHERE timestamp >= %s AND timestamp < %s RETURNING {columns})
+                SELECT * FROM moved""",
+            (start, end)
         )
+    cur.execute(f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)", (start, end))
+    if stray:
+        cur.execute(f"INSERT INTO {parent} ({columns}) SELECT {columns} FROM stray_rows")
+        cur.execute("DROP TABLE stray_rows")
+
+def partitioned_days(days, premake_days=None):
+    # Days get their own partition only from the retention cutoff (or
+    # SYSLOG_PARTITION_MAX_AGE_DAYS back when nothing expires) up to the
+    # premade ones. Backdated imports and bogus timestamps such as ts=0 go to
+    # the default partition instead of creating a table per stray day.
+    today = datetime.now().date()
+    oldest = today - timedelta(days=Config.SYSLOG_RETENTION_DAYS or Config.SYSLOG_PARTITION_MAX_AGE_DAYS)
+    premake_days = Config.SYSLOG_PARTITION_PREMAKE_DAYS if premake_days is None else premake_days
+    newest = today + timedelta(days=premake_days + 1)
+    return {day for day in days if oldest <= day <= newest}
+
+def create_event_partitions(cur, days):
+    ranges = sorted({event_partition_range(day) for day in days})
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITION_LOCK_ID,))
+    existing = _event_partition_names(cur)
+    # Raw payloads are partitioned alongside the events they belong to, so
+    # retention drops both together.
+    payloads = _table_exists(cur, 'syslog_event_payloads')
+    created = []
+    for start, end, name in ranges:
+        if name in existing:
+            continue
+        _create_partition(cur, 'syslog_events', name, start, end, LOG_COLUMNS)
+        if payloads:
+            _create_partition(cur, 'syslog_event_payloads', _payload_partition(name), start, end, PAYLOAD_COLUMNS)
+        existing.add(name)
+        created.append(name)
+    return existing, created
+
+def ensure_event_partitions(days, premake_days=None):
+    missing = {day for day in partitioned_days(days, premake_days) if event_partition_range(day)[2] not in _known_event_partitions}
+    if not missing:
+        return []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if not _events_table_partitioned(cur):
+            conn.rollback()
+            return []
+        existing, created = create_event_partitions(cur, missing)
         conn.commit()
-    
-    cur.close()
-    conn.close()
+        cur.close()
+    _known_event_partitions.update(existing)
+    return created
+
+def drop_expired_event_partitions(retention_days=None):
+    retention_days = Config.SYSLOG_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return []
+    cutoff = datetime.now().date() - timedelta(days=retention_days)
+    dropped = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if not _events_table_partitioned(cur):
+            conn.rollback()
+            return []
+        for name in sorted(_event_partition_names(cur)):
+            match = _EVENT_PARTITION_RE.match(name)
+            if not match:
+                continue
+            start = datetime.strptime(match.group(2), '%Y%m%d').date()
+            end = start + timedelta(days=7 if match.group(1) == 'w' else 1)
+            if end <= cutoff:
+                cur.execute(f"DROP TABLE {name}")
+                cur.execute(f"DROP TABLE IF EXISTS {_payload_partition(name)}")
+                dropped.append(name)
+        # Rows older than the cutoff never get a partition of their own.
+        cur.execute("DELETE FROM syslog_events_default WHERE timestamp < %s", (cutoff,))
+        if _table_exists(cur, 'syslog_event_payloads_default'):
+            cur.execute("DELETE FROM syslog_event_payloads_default WHERE timestamp < %s", (cutoff,))
+        conn.commit()
+        cur.close()
+    _known_event_partitions.difference_update(dropped)
+    return dropped
+
+def maintain_event_partitions(premake_days=None, retention_days=None):
+    premake_days = Config.SYSLOG_PARTITION_PREMAKE_DAYS if premake_days is None else premake_days
+    today = datetime.now().date()
+    created = ensure_event_partitions((today + timedelta(days=offset) for offset in range(-1, premake_days + 1)), premake_days)
+    dropped = drop_expired_event_partitions(retention_days)
+    prune_minute_rollups()
+    return created, dropped
+
+def prune_minute_rollups():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if not _table_exists(cur, 'event_host_rollups_minute'):
+            conn.rollback()
+            return 0
+        cutoff = datetime.now() - timedelta(hours=Config.ROLLUP_MINUTE_RETENTION_HOURS)
+        cur.execute("DELETE FROM event_rollups_minute WHERE bucket < %s", (cutoff,))
+        deleted = cur.rowcount
+        cur.execute("DELETE FROM event_host_rollups_minute WHERE bucket < %s", (cutoff,))
+        deleted += cur.rowcount
+        conn.commit()
+        cur.close()
+    return deleted
 
 def get_user_by_username(username):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM users WHERE username = %s AND is_active = TRUE", (username,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM users WHERE username = %s AND is_active = TRUE", (username,))
+        user = cur.fetchone()
+        cur.close()
     return user
 
 def verify_password(password, password_hash):
     return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
 
+# Bumped by every write to users or groups. Cached /api/users and
+# /api/groups bodies are keyed by it, so a local write is visible on the
+# next request; other workers catch up when their entries expire.
+_directory_version = 0
+_directory_version_lock = threading.Lock()
+
+def bump_directory_version():
+    global _directory_version
+    with _directory_version_lock:
+        _directory_version += 1
+
+def get_directory_version():
+    return _directory_version
+
 def create_user(username, email, password, role, group_id=None):
-    conn = get_db_connection()
-    cur = conn.cursor()
     password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
     
-    try:
+    with db_connection() as conn:
+        cur = conn.cursor()
         cur.execute(
             "INSERT INTO users (username, email, password_hash, role, group_id) VALUES (%s, %s, %s, %s, %s) RETURNING id",
             (username, email, password_hash, role, group_id)
@@ -136,27 +586,18 @@ def create_user(username, email, password, role, group_id=None):
         user_id = cur.fetchone()[0]
         conn.commit()
         cur.close()
-        conn.close()
-        return user_id
-    except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
-        raise e
+    bump_directory_version()
+    return user_id
 
 def get_all_users():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT id, username, email, role, group_id, created_at, last_login, is_active FROM users ORDER BY created_at DESC")
-    users = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT id, username, email, role, group_id, created_at, last_login, is_active FROM users ORDER BY created_at DESC")
+        users = cur.fetchall()
+        cur.close()
     return users
 
 def update_user(user_id, **kwargs):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
     allowed_fields = ['username', 'email', 'role', 'group_id', 'is_active']
     updates = []
     values = []
@@ -166,37 +607,37 @@ def update_user(user_id, **kwargs):
             updates.append(f"{key} = %s")
             values.append(value)
     
-    if updates:
-        values.append(user_id)
-        query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s"
+    if not updates:
+        return
+    
+    values.append(user_id)
+    query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s"
+    with db_connection() as conn:
+        cur = conn.cursor()
         cur.execute(query, values)
         conn.commit()
-    
-    cur.close()
-    conn.close()
+        cur.close()
+    bump_directory_version()
 
 def delete_user(user_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET is_active = FALSE WHERE id = %s", (user_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE users SET is_active = FALSE WHERE id = %s", (user_id,))
+        conn.commit()
+        cur.close()
+    bump_directory_version()
 
 def get_all_groups():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM groups ORDER BY name")
-    groups = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM groups ORDER BY name")
+        groups = cur.fetchall()
+        cur.close()
     return groups
 
 def create_group(name, description=''):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    try:
+    with db_connection() as conn:
+        cur = conn.cursor()
         cur.execute(
             "INSERT INTO groups (name, description) VALUES (%s, %s) RETURNING id",
             (name, description)
@@ -204,193 +645,1095 @@ def create_group(name, description=''):
         group_id = cur.fetchone()[0]
         conn.commit()
         cur.close()
-        conn.close()
-        return group_id
-    except Exception as e:
-        conn.rollback()
+    invalidate_rbac_cache()
+    bump_directory_version()
+    return group_id
+
+def _load_groups_with_permissions():
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM groups ORDER BY name")
+        groups = cur.fetchall()
+        cur.execute(
+            "SELECT * FROM permissions WHERE group_id = ANY(%s) ORDER BY group_id, id",
+            ([group['id'] for group in groups],)
+        )
+        permissions = cur.fetchall()
         cur.close()
-        conn.close()
-        raise e
+    
+    by_group = {group['id']: {'group': group, 'permissions': []} for group in groups}
+    for permission in permissions:
+        by_group[permission['group_id']]['permissions'].append(permission)
+    return [by_group[group['id']] for group in groups], by_group
+
+# Group -> permissions snapshot for the groups page and permission checks.
+# Entries are keyed by a version that every local write bumps, so a load
+# racing a write is never served; the TTL bounds how long writes made by
+# other workers take to show up.
+_rbac_cache = TTLCache(maxsize=2, ttl=Config.RBAC_CACHE_TTL)
+_rbac_version = 0
+_rbac_version_lock = threading.Lock()
+
+def invalidate_rbac_cache():
+    global _rbac_version
+    with _rbac_version_lock:
+        _rbac_version += 1
+    _rbac_cache.clear()
+
+def _rbac_snapshot():
+    version = _rbac_version
+    snapshot = _rbac_cache.get(version)
+    if snapshot is None:
+        snapshot = _load_groups_with_permissions()
+        _rbac_cache.set(version, snapshot)
+    return snapshot
+
+def get_groups_with_permissions():
+    return _rbac_snapshot()[0]
 
 def get_permissions_by_group(group_id):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM permissions WHERE group_id = %s", (group_id,))
-    permissions = cur.fetchall()
-    cur.close()
-    conn.close()
-    return permissions
+    entry = _rbac_snapshot()[1].get(group_id)
+    return list(entry['permissions']) if entry else []
+
+def group_has_permission(group_id, permission_name, action='read'):
+    entry = _rbac_snapshot()[1].get(group_id)
+    if entry is None:
+        return False
+    return any(permission['permission_name'] == permission_name and permission[f'can_{action}']
+               for permission in entry['permissions'])
+
+def get_rbac_cache_stats():
+    stats = _rbac_cache.stats()
+    stats['version'] = _rbac_version
+    return stats
 
 def create_permission(group_id, permission_name, can_create=False, can_read=True, can_update=False, can_delete=False):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute(
-        "INSERT INTO permissions (group_id, permission_name, can_create, can_read, can_update, can_delete) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
-        (group_id, permission_name, can_create, can_read, can_update, can_delete)
-    )
-    perm_id = cur.fetchone()[0]
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO permissions (group_id, permission_name, can_create, can_read, can_update, can_delete) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+            (group_id, permission_name, can_create, can_read, can_update, can_delete)
+        )
+        perm_id = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+    invalidate_rbac_cache()
     return perm_id
 
+# Everything but search_vector, which is large and only used inside queries.
+# Raw payloads live in syslog_event_payloads and are read per event.
+LOG_COLUMNS = 'id, timestamp, severity, source_ip, source_host, event_type, message, user_id, log_source_id, processed, event_count, last_seen, operator'
+
+# The fields the log listing endpoints return, rendered to JSON by Postgres
+# so a page of events never becomes Python dicts on the way out.
+LOG_JSON_COLUMNS = (
+    "id, timestamp, row_to_json((SELECT r FROM (SELECT event_count AS count, event_type, id, last_seen, message, "
+    "operator, severity, source_host, source_ip, timestamp) AS r))::text AS json"
+)
+
+# Lookback windows for "newest N" reads. Bounding the timestamp lets the
+# planner prune to the last few partitions; a quiet day widens the window.
+RECENT_LOG_WINDOWS = (timedelta(days=1), timedelta(days=7), timedelta(days=31), None)
+
+def _recent_logs(cur, where, params, limit, upto=None, columns=LOG_COLUMNS, windows=RECENT_LOG_WINDOWS):
+    upto = upto or datetime.now()
+    for window in windows:
+        conditions = list(where)
+        window_params = list(params)
+        if window is not None:
+            conditions.append("timestamp >= %s")
+            window_params.append(upto - window)
+        clause = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+        cur.execute(f"SELECT {columns} FROM syslog_events {clause}ORDER BY timestamp DESC, id DESC LIMIT %s", window_params + [limit])
+        logs = cur.fetchall()
+        if len(logs) >= limit:
+            break
+    return logs
+
 def get_latest_logs(limit=100):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM syslog_events ORDER BY timestamp DESC LIMIT %s", (limit,))
-    logs = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        logs = _recent_logs(cur, [], [], limit)
+        cur.close()
     return logs
 
 def get_logs_by_severity(severity, limit=100):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM syslog_events WHERE severity = %s ORDER BY timestamp DESC LIMIT %s", (severity, limit))
-    logs = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        logs = _recent_logs(cur, ["severity = %s"], [severity], limit)
+        cur.close()
     return logs
 
-def insert_log_event(severity, message, source_ip=None, source_host=None, event_type=None, user_id=None, raw_log=None, log_source_id=None):
-    conn = get_db_connection()
-    cur = conn.cursor()
+def get_logs_page(limit=100, severity=None, before=None, after=None, columns=LOG_COLUMNS):
+    # before/after are (timestamp, id) keys. Pages after a key come back
+    # oldest first so a poller can resume from the last row it saw.
+    where = []
+    params = []
+    if severity:
+        where.append("severity = %s")
+        params.append(severity)
     
-    try:
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        if after is not None:
+            where += ["timestamp >= %s", "(timestamp, id) > (%s, %s)"]
+            cur.execute(
+                f"SELECT {columns} FROM syslog_events WHERE {' AND '.join(where)} ORDER BY timestamp, id LIMIT %s",
+                params + [after[0], after[0], after[1], limit + 1]
+            )
+            logs = cur.fetchall()
+            has_more = len(logs) > limit
+            logs = logs[:limit]
+        elif before is not None:
+            where += ["timestamp <= %s", "(timestamp, id) < (%s, %s)"]
+            cur.execute(
+                f"SELECT {columns} FROM syslog_events WHERE {' AND '.join(where)} ORDER BY timestamp DESC, id DESC LIMIT %s",
+                params + [before[0], before[0], before[1], limit]
+            )
+            logs = cur.fetchall()
+            has_more = len(logs) == limit
+        else:
+            logs = _recent_logs(cur, where, params, limit, columns=columns)
+            has_more = len(logs) == limit
+        cur.close()
+    return logs, has_more
+
+EXPORT_COLUMNS = ('id', 'timestamp', 'severity', 'source_ip', 'source_host', 'event_type', 'message', 'user_id', 'log_source_id', 'raw_log', 'event_count', 'last_seen', 'operator')
+
+def iter_log_export(start, end, as_json=False, severities=None, event_type=None, source_host=None, source_ip=None,
+                    log_source_id=None, batch_size=None):
+    # Yields batches of rows from a server-side cursor, so an export holds one
+    # batch in memory however many rows the range covers. With as_json each
+    # row is a single column of JSON text rendered by Postgres.
+    batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+    where = ["timestamp >= %s", "timestamp < %s"]
+    params = [start, end]
+    if severities:
+        where.append("severity = ANY(%s)")
+        params.append(list(severities))
+    for column, value in (('event_type', event_type), ('source_host', source_host),
+                          ('source_ip', source_ip), ('log_source_id', log_source_id)):
+        if value is not None:
+            where.append(f"{column} = %s")
+            params.append(value)
+    
+    # raw_log is filled in per batch from the compressed payload blocks.
+    columns = ', '.join('NULL::text AS raw_log' if column == 'raw_log' else column for column in EXPORT_COLUMNS)
+    if as_json:
+        columns = f"row_to_json((SELECT r FROM (SELECT {columns}) AS r))::text"
+    raw_index = EXPORT_COLUMNS.index('raw_log')
+    
+    with db_connection() as conn:
+        cur = conn.cursor(name='log_export')
+        payload_cur = conn.cursor()
         cur.execute(
-            "INSERT INTO syslog_events (severity, message, source_ip, source_host, event_type, user_id, raw_log, log_source_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
-            (severity, message, source_ip, source_host, event_type, user_id, raw_log, log_source_id)
+            f"SELECT id, timestamp, {columns} FROM syslog_events WHERE {' AND '.join(where)} ORDER BY timestamp, id",
+            params
         )
-        log_id = cur.fetchone()[0]
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            payloads = _fetch_payloads(payload_cur, [(row[0], row[1]) for row in rows])
+            if as_json:
+                yield [
+                    (row[2].replace('"raw_log":null', f'"raw_log":{json.dumps(payloads[row[0]])}', 1)
+                     if row[0] in payloads else row[2],)
+                    for row in rows
+                ]
+            else:
+                batch = []
+                for row in rows:
+                    values = list(row[2:])
+                    values[raw_index] = payloads.get(row[0])
+                    batch.append(values)
+                yield batch
+        payload_cur.close()
+        cur.close()
+
+SEARCH_CONFIG = 'english'
+
+# Stored as the generated search_vector column; to_tsvector rejects input
+# past 1MB, so oversized messages are only indexed up to the cap. Raw
+# payloads live compressed outside the table and are not indexed; of their
+# fields only the operator, which has its own column, is searchable.
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', left(coalesce(message, ''), 65536)), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(operator, '')), 'B')"
+)
+
+# Control characters cannot occur in the escaped HTML the API builds from
+# headlines, so they mark the highlighted words until then.
+HEADLINE_START = '\x02'
+HEADLINE_STOP = '\x03'
+HEADLINE_OPTIONS = f'StartSel={HEADLINE_START}, StopSel={HEADLINE_STOP}, MinWords=15, MaxWords=35'
+
+SEARCH_MAX_RANKED = 10000
+
+# Walking the timestamp index and filtering is the planner's usual choice
+# for ORDER BY ... LIMIT, and reads everything in range when a term turns
+# out to be rare. Searches use bitmap scans over short, widening windows
+# instead, which stay bounded for rare and common terms alike.
+SEARCH_WINDOWS = (timedelta(hours=1), timedelta(days=1), timedelta(days=7), timedelta(days=31), None)
+
+def _like_pattern(text):
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def search_logs(query=None, contains=None, severity=None, start=None, end=None, limit=100, before=None, order='time'):
+    # query is websearch syntax ("quoted phrases", or, -excluded) over
+    # message and operator; contains is a plain substring of message or
+    # source_ip.
+    # before is a (timestamp, id) key, or (rank, timestamp, id) by relevance.
+    tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+    where = []
+    params = []
+    if query:
+        where.append(f"search_vector @@ {tsquery}")
+        params.append(query)
+    if contains:
+        where.append("(message ILIKE %s OR source_ip ILIKE %s)")
+        params += [_like_pattern(contains)] * 2
+    if severity:
+        where.append("severity = %s")
+        params.append(severity)
+    if start:
+        where.append("timestamp >= %s")
+        params.append(start)
+    if end:
+        where.append("timestamp < %s")
+        params.append(end)
+    
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SET LOCAL enable_indexscan = off")
+        if order == 'relevance':
+            # Ranking every match of a common term would read all of them,
+            # so only the newest SEARCH_MAX_RANKED matches are ranked.
+            candidates = _recent_logs(cur, where, [query] + params, SEARCH_MAX_RANKED, upto=end,
+                                      columns=f"id, timestamp, ts_rank(search_vector, {tsquery}) AS rank",
+                                      windows=SEARCH_WINDOWS)
+            keys = sorted(((row['rank'], row['timestamp'], row['id']) for row in candidates), reverse=True)
+            if before is not None:
+                keys = [key for key in keys if key < before]
+        else:
+            if before is not None:
+                where += ["timestamp <= %s", "(timestamp, id) < (%s, %s)"]
+                params += [before[0], before[0], before[1]]
+            keys = [(None, row['timestamp'], row['id'])
+                    for row in _recent_logs(cur, where, params, limit + 1, upto=before[0] if before else end,
+                                            columns='id, timestamp', windows=SEARCH_WINDOWS)]
+        has_more = len(keys) > limit
+        keys = keys[:limit]
         
-        if log_source_id:
+        logs = []
+        if keys:
+            # Rows, ranks and headlines are only read for the page itself.
+            if query:
+                columns = f"{LOG_COLUMNS}, ts_rank(search_vector, q) AS rank, ts_headline('{SEARCH_CONFIG}', message, q, %s) AS headline"
+                source = f"syslog_events, {tsquery} q"
+                head = [HEADLINE_OPTIONS, query]
+            else:
+                columns = f"{LOG_COLUMNS}, NULL::real AS rank, NULL AS headline"
+                source = 'syslog_events'
+                head = []
             cur.execute(
-                "UPDATE log_sources SET total_logs_received = total_logs_received + 1, last_received = CURRENT_TIMESTAMP WHERE id = %s",
-                (log_source_id,)
+                f"SELECT {columns} FROM {source} WHERE id = ANY(%s) AND timestamp >= %s AND timestamp <= %s",
+                head + [[key[2] for key in keys], min(key[1] for key in keys), max(key[1] for key in keys)]
             )
-        
-        conn.commit()
+            rows = {row['id']: row for row in cur.fetchall()}
+            logs = [rows[key[2]] for key in keys if key[2] in rows]
         cur.close()
-        conn.close()
-        return log_id
-    except Exception as e:
-        conn.rollback()
+    return logs, has_more
+
+# Committed event batches are announced on this channel as
+# "min_id,max_id,min_timestamp,max_timestamp" for the live stream.
+EVENTS_CHANNEL = 'syslog_events'
+
+# Called with the same payload after commit; the in-process stream backend
+# registers here instead of listening for NOTIFY.
+event_commit_hooks = []
+
+def _announce_events(cur, low_id, high_id, low_ts, high_ts):
+    payload = f"{low_id},{high_id},{low_ts.isoformat()},{high_ts.isoformat()}"
+    if Config.EVENT_STREAM_BACKEND == 'postgres':
+        cur.execute("SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, payload))
+    return payload
+
+def _events_committed(payload):
+    for hook in event_commit_hooks:
+        hook(payload)
+
+# Called with the EventRows of every committed batch. A hook may return
+# derived rows (correlation alerts); they are written once the batch is done
+# and are not passed to the hooks again.
+event_row_hooks = []
+
+def _rows_committed(rows, derived):
+    if derived is None:
+        return
+    for hook in event_row_hooks:
+        try:
+            derived.extend(hook(rows) or ())
+        except Exception:
+            logging.exception("Event row hook failed")
+
+def _write_derived_rows(rows):
+    inserted, failures = write_event_rows(list(enumerate(rows)), run_hooks=False)
+    for idx, message in failures:
+        logging.error(f"Failed to write {rows[idx].event_type} event: {message}")
+
+STREAM_COLUMNS = 'id, timestamp, severity, source_ip, source_host, event_type, message, event_count, last_seen, operator'
+
+def get_events_in_range(after_id, high_id, low_ts, high_ts, limit):
+    # One page of an announced batch, oldest first; the next page starts
+    # after the last id returned.
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(
+            f"""SELECT {STREAM_COLUMNS} FROM syslog_events
+                WHERE id > %s AND id <= %s AND timestamp BETWEEN %s AND %s
+                ORDER BY id LIMIT %s""",
+            (after_id, high_id, low_ts, high_ts, limit)
+        )
+        logs = cur.fetchall()
         cur.close()
-        conn.close()
-        raise e
-
-def receive_syslog_event(raw_data):
-    insert_log_event(
-        severity='INFO',
-        message=raw_data,
-        event_type='SYSLOG',
-        raw_log=raw_data
-    )
+    return logs
 
-def generate_daily_report(group_id):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    today = datetime.now().date()
-    
-    cur.execute("SELECT COUNT(*) as total FROM users WHERE group_id = %s", (group_id,))
-    total_users = cur.fetchone()['total']
-    
-    cur.execute("SELECT COUNT(*) as active FROM users WHERE group_id = %s AND last_login::date = %s", (group_id, today))
-    active_users = cur.fetchone()['active']
-    
-    cur.execute("SELECT COUNT(*) as total FROM syslog_events WHERE timestamp::date = %s", (today,))
-    total_events = cur.fetchone()['total']
-    
-    cur.execute("SELECT COUNT(*) as critical FROM syslog_events WHERE severity = 'CRITICAL' AND timestamp::date = %s", (today,))
-    critical_events = cur.fetchone()['critical']
-    
-    unusual_behavior = 0
-    missing_work = total_users - active_users
-    rule_violations = critical_events
+def get_events_after_id(last_id, limit):
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(f"SELECT {STREAM_COLUMNS} FROM syslog_events WHERE id > %s ORDER BY id LIMIT %s", (last_id, limit))
+        logs = cur.fetchall()
+        cur.close()
+    return logs
+
+# Windows up to 6 hours are answered from per-minute rollups, up to 3 days
+# from hourly ones and longer ones from daily ones. The window start is
+# aligned to that unit and the tail up to `end` is filled in from the finer
+# tables, so the cost depends on the window, not on the number of events.
+ROLLUP_SPANS = (timedelta(hours=6), timedelta(days=3))
+
+HISTOGRAM_STEPS = {'minute': timedelta(minutes=1), 'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+def _rollup_segments(table_prefix, columns, level, start, end, params_head=()):
+    segments = []
+    params = []
+    lower = start
+    for idx in range(level, -1, -1):
+        unit = ROLLUP_UNITS[idx]
+        upper = _truncate_timestamp(end, unit) if idx else end
+        segments.append(f"SELECT {columns} FROM {table_prefix}_{unit} WHERE bucket >= %s AND bucket < %s")
+        params += list(params_head) + [lower, upper]
+        lower = upper
+    return ' UNION ALL '.join(segments), params
+
+def get_event_stats(start, end, top_n=10, bucket=None):
+    span = end - start
+    level = sum(1 for limit in ROLLUP_SPANS if span > limit)
+    # Minute rollups are pruned after ROLLUP_MINUTE_RETENTION_HOURS, so older
+    # windows are read from the hourly ones and widened to whole hours.
+    if start < datetime.now() - timedelta(hours=Config.ROLLUP_MINUTE_RETENTION_HOURS):
+        level = max(level, 1)
+        if end != _truncate_timestamp(end, 'hour'):
+            end = _truncate_timestamp(end, 'hour') + timedelta(hours=1)
+    start = _truncate_timestamp(start, ROLLUP_UNITS[level])
+    if bucket is None:
+        bucket = 'minute' if span <= timedelta(hours=2) else 'hour' if span <= timedelta(days=3) else 'day'
+    if ROLLUP_UNITS.index(bucket) < level:
+        bucket = ROLLUP_UNITS[level]
     
-    summary = f"Daily report for group {group_id}: {active_users}/{total_users} users active, {total_events} events, {critical_events} critical alerts"
+    stats = {
+        'start': start,
+        'end': end,
+        'bucket': bucket,
+        'total': 0,
+        'severity': dict.fromkeys(Config.LOG_SEVERITIES, 0),
+        'event_types': [],
+        'source_hosts': [],
+        'histogram': []
+    }
+    histogram = {}
     
-    cur.execute(
-        """INSERT INTO activity_reports 
-           (group_id, report_date, total_users, active_users, total_events, critical_events, 
-            unusual_behavior_count, missing_work_count, rule_violations, summary) 
-           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id""",
-        (group_id, today, total_users, active_users, total_events, critical_events, 
-         unusual_behavior, missing_work, rule_violations, summary)
-    )
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if not _table_exists(cur, 'event_host_rollups_day'):
+            conn.rollback()
+            return stats
+        
+        union, params = _rollup_segments(
+            'event_rollups', 'date_trunc(%s, bucket) AS t, severity, event_type, event_count', level, start, end, (bucket,))
+        cur.execute(
+            f"""WITH r AS ({union})
+                SELECT GROUPING(severity, event_type, t), severity, event_type, t, SUM(event_count)
+                FROM r
+                GROUP BY GROUPING SETS ((severity), (event_type), (t, severity))""",
+            params
+        )
+        event_types = []
+        for grouping, severity, event_type, t, count in cur.fetchall():
+            count = int(count)
+            if grouping == 3:
+                stats['severity'][severity] = count
+                stats['total'] += count
+            elif grouping == 5:
+                event_types.append({'event_type': event_type or None, 'count': count})
+            else:
+                histogram.setdefault(t, dict.fromkeys(Config.LOG_SEVERITIES, 0))[severity] = count
+        stats['event_types'] = sorted(event_types, key=lambda item: item['count'], reverse=True)[:top_n]
+        
+        union, params = _rollup_segments('event_host_rollups', 'source_host, event_count', level, start, end)
+        cur.execute(
+            f"SELECT source_host, SUM(event_count) AS total FROM ({union}) r GROUP BY source_host ORDER BY total DESC LIMIT %s",
+            params + [top_n]
+        )
+        stats['source_hosts'] = [{'source_host': host or None, 'count': int(count)} for host, count in cur.fetchall()]
+        cur.close()
     
-    report_id = cur.fetchone()['id']
-    conn.commit()
-    cur.close()
-    conn.close()
-    return report_id
+    t = _truncate_timestamp(start, bucket)
+    step = HISTOGRAM_STEPS[bucket]
+    while t < end:
+        stats['histogram'].append({'time': t, 'counts': histogram.get(t, dict.fromkeys(Config.LOG_SEVERITIES, 0))})
+        t += step
+    return stats
+
+def get_log_key(log_id):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT timestamp, id FROM syslog_events WHERE id = %s", (log_id,))
+        key = cur.fetchone()
+        cur.close()
+    return key
+
+def get_log_detail(log_id):
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(f"SELECT {LOG_COLUMNS} FROM syslog_events WHERE id = %s", (log_id,))
+        log = cur.fetchone()
+        cur.close()
+        if log is not None:
+            cur = conn.cursor()
+            log['raw_log'] = _fetch_payloads(cur, [(log['id'], log['timestamp'])]).get(log['id'])
+            cur.close()
+    return log
+
+def insert_log_event(severity, message, source_ip=None, source_host=None, event_type=None, user_id=None, raw_log=None, log_source_id=None):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO syslog_events (severity, message, source_ip, source_host, event_type, user_id, log_source_id) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id, timestamp",
+            (severity, message, source_ip, source_host, event_type, user_id, log_source_id)
+        )
+        log_id, timestamp = cur.fetchone()
+        
+        row = EventRow(timestamp, severity, message, source_ip, source_host, event_type, user_id, raw_log, log_source_id)
+        _store_payloads(cur, [log_id], [row])
+        payload = _announce_events(cur, log_id, log_id, timestamp, timestamp)
+        conn.commit()
+        cur.close()
+    if log_source_id:
+        _source_counters.add({log_source_id: 1})
+    _rollup_counters.add([row])
+    _events_committed(payload)
+    derived = []
+    _rows_committed([row], derived)
+    if derived:
+        _write_derived_rows(derived)
+    return log_id
+
+def receive_syslog_event(raw_data, source_ip=None, log_source_id=None):
+    row = normalize_log_entry(syslog_to_log_entry(raw_data, source_ip), log_source_id)
+    inserted, failures = write_event_rows([(0, row)])
+    if failures:
+        raise ValueError(failures[0][1])
+
+def generate_reports(start_date, end_date, group_ids=None):
+    # One pass over the date range for every group: events are attributed
+    # to a group through their user (user_id, or an operator matching a
+    # username), and a user counts as active on a day with an event or their
+    # last login. Events with no user, or whose user is in no group, count
+    # toward every group, as reports always counted them. Re-running a range overwrites it.
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if _table_exists(cur, 'anomaly_findings'):
+            unusual = """SELECT u.group_id, f.finding_date AS report_date, COUNT(*) AS findings
+                   FROM anomaly_findings f JOIN users u ON u.id = f.user_id
+                   WHERE f.finding_date BETWEEN %(start)s AND %(end)s
+                   GROUP BY 1, 2"""
+        else:
+            unusual = "SELECT NULL::int AS group_id, NULL::date AS report_date, 0 AS findings WHERE FALSE"
+        cur.execute(
+            f"""WITH days AS (
+                   SELECT d::date AS report_date
+                   FROM generate_series(%(start)s::date, %(end)s::date, interval '1 day') d
+               ),
+               members AS (
+                   SELECT g.id AS group_id, COUNT(u.id) AS total_users
+                   FROM groups g LEFT JOIN users u ON u.group_id = g.id
+                   WHERE %(group_ids)s::int[] IS NULL OR g.id = ANY(%(group_ids)s::int[])
+                   GROUP BY g.id
+               ),
+               per_user AS (
+                   SELECT COALESCE(e.user_id, o.id) AS user_id, e.timestamp::date AS report_date,
+                          SUM(e.event_count) AS total_events,
+                          COALESCE(SUM(e.event_count) FILTER (WHERE e.severity = 'CRITICAL'), 0) AS critical_events
+                   FROM syslog_events e
+                   LEFT JOIN users o ON e.user_id IS NULL AND o.username = e.operator
+                   WHERE e.timestamp >= %(start)s AND e.timestamp < %(end_exclusive)s
+                   GROUP BY 1, 2
+               ),
+               unattributed AS (
+                   SELECT p.report_date, SUM(p.total_events) AS total_events, SUM(p.critical_events) AS critical_events
+                   FROM per_user p LEFT JOIN users u ON u.id = p.user_id
+                   WHERE u.group_id IS NULL
+                   GROUP BY 1
+               ),
+               events AS (
+                   SELECT u.group_id, p.report_date, SUM(p.total_events) AS total_events,
+                          SUM(p.critical_events) AS critical_events
+                   FROM per_user p JOIN users u ON u.id = p.user_id
+                   GROUP BY 1, 2
+               ),
+               active AS (
+                   SELECT u.group_id, a.report_date, COUNT(DISTINCT a.user_id) AS active_users
+                   FROM (
+                       SELECT user_id, report_date FROM per_user WHERE user_id IS NOT NULL
+                       UNION
+                       SELECT id, last_login::date FROM users
+                       WHERE last_login >= %(start)s AND last_login < %(end_exclusive)s
+                   ) a JOIN users u ON u.id = a.user_id
+                   GROUP BY 1, 2
+               ),
+               unusual AS (
+                   {unusual}
+               ),
+               report AS (
+                   SELECT m.group_id, d.report_date, m.total_users,
+                          COALESCE(a.active_users, 0) AS active_users,
+                          COALESCE(e.total_events, 0) + COALESCE(n.total_events, 0) AS total_events,
+                          COALESCE(e.critical_events, 0) + COALESCE(n.critical_events, 0) AS critical_events,
+                          COALESCE(x.findings, 0) AS unusual_behavior_count
+                   FROM members m
+                   CROSS JOIN days d
+                   LEFT JOIN events e ON e.group_id = m.group_id AND e.report_date = d.report_date
+                   LEFT JOIN unattributed n ON n.report_date = d.report_date
+                   LEFT JOIN active a ON a.group_id = m.group_id AND a.report_date = d.report_date
+                   LEFT JOIN unusual x ON x.group_id = m.group_id AND x.report_date = d.report_date
+               )
+               INSERT INTO activity_reports
+                   (group_id, report_date, total_users, active_users, total_events, critical_events,
+                    unusual_behavior_count, missing_work_count, rule_violations, summary)
+               SELECT group_id, report_date, total_users, active_users, total_events, critical_events,
+                      unusual_behavior_count, GREATEST(total_users - active_users, 0), critical_events,
+                      format('Daily report for group %%s: %%s/%%s users active, %%s events, %%s critical alerts',
+                             group_id, active_users, total_users, total_events, critical_events)
+               FROM report
+               ON CONFLICT (group_id, report_date) DO UPDATE SET
+                   total_users = EXCLUDED.total_users,
+                   active_users = EXCLUDED.active_users,
+                   total_events = EXCLUDED.total_events,
+                   critical_events = EXCLUDED.critical_events,
+                   unusual_behavior_count = EXCLUDED.unusual_behavior_count,
+                   missing_work_count = EXCLUDED.missing_work_count,
+                   rule_violations = EXCLUDED.rule_violations,
+                   summary = EXCLUDED.summary,
+                   created_at = CURRENT_TIMESTAMP""",
+            {
+                'start': start_date,
+                'end': end_date,
+                'end_exclusive': end_date + timedelta(days=1),
+                'group_ids': list(group_ids) if group_ids is not None else None
+            }
+        )
+        generated = cur.rowcount
+        conn.commit()
+        cur.close()
+    return generated
+
+def generate_daily_report(group_id, report_date=None):
+    report_date = report_date or datetime.now().date()
+    generate_reports(report_date, report_date, [group_id])
+    report = get_daily_report(group_id, report_date)
+    return report['id'] if report else None
 
 def get_daily_report(group_id, date=None):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
     if date is None:
         date = datetime.now().date()
     
-    cur.execute("SELECT * FROM activity_reports WHERE group_id = %s AND report_date = %s", (group_id, date))
-    report = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM activity_reports WHERE group_id = %s AND report_date = %s", (group_id, date))
+        report = cur.fetchone()
+        cur.close()
     return report
 
+ANOMALY_ENTITY_KINDS = ('operator', 'source_ip', 'event_type')
+
+def get_last_anomaly_run():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT MAX(score_date) FROM anomaly_runs")
+        last = cur.fetchone()[0]
+        cur.close()
+    return last
+
+def get_hourly_activity(day):
+    # Per-entity hourly counts for one day in a single scan of its partition;
+    # the (operator, source_ip) set feeds the terminal IP check. An event's
+    # operator is its operator column, or the name of its user_id's user.
+    hourly = {kind: [] for kind in ANOMALY_ENTITY_KINDS}
+    terminals = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT GROUPING(operator, source_ip, event_type, hour), operator, source_ip, event_type, hour, SUM(event_count)::int
+               FROM (
+                   SELECT COALESCE(e.operator, u.username) AS operator, e.source_ip, NULLIF(e.event_type, '') AS event_type,
+                          EXTRACT(HOUR FROM e.timestamp)::int AS hour, e.event_count
+                   FROM syslog_events e LEFT JOIN users u ON u.id = e.user_id
+                   WHERE e.timestamp >= %s AND e.timestamp < %s
+               ) e
+               GROUP BY GROUPING SETS ((operator, hour), (source_ip, hour), (event_type, hour), (operator, source_ip))""",
+            (day, day + timedelta(days=1))
+        )
+        for grouping, operator_name, source_ip, event_type, hour, count in cur:
+            if grouping == 0b0110 and operator_name is not None:
+                hourly['operator'].append((operator_name, hour, count))
+            elif grouping == 0b1010 and source_ip:
+                hourly['source_ip'].append((source_ip, hour, count))
+            elif grouping == 0b1100 and event_type is not None:
+                hourly['event_type'].append((event_type, hour, count))
+            elif grouping == 0b0011 and operator_name is not None and source_ip:
+                terminals.append((operator_name, source_ip))
+        cur.close()
+    return hourly, terminals
+
+def get_anomaly_baselines():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT entity_kind, entity, days_observed, hourly_mean, hourly_var, hourly_active
+               FROM anomaly_baselines"""
+        )
+        baselines = cur.fetchall()
+        cur.close()
+    return baselines
+
+def get_terminal_ips(operators):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT operator, source_ip FROM anomaly_terminal_ips WHERE operator = ANY(%s)", (list(operators),))
+        known = cur.fetchall()
+        cur.close()
+    return known
+
+def record_anomaly_day(day, baselines, terminals, findings, duration_ms, retention_days):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        # The ledger row goes first: a second scorer for the same day fails
+        # here instead of folding the day into the baselines twice.
+        cur.execute(
+            "INSERT INTO anomaly_runs (score_date, entities, findings, duration_ms) VALUES (%s, %s, %s, %s)",
+            (day, len(baselines), len(findings), duration_ms)
+        )
+        execute_values(
+            cur,
+            """INSERT INTO anomaly_baselines
+                   (entity_kind, entity, days_observed, hourly_mean, hourly_var, hourly_active, last_day)
+               VALUES %s
+               ON CONFLICT (entity_kind, entity) DO UPDATE SET
+                   days_observed = EXCLUDED.days_observed,
+                   hourly_mean = EXCLUDED.hourly_mean,
+                   hourly_var = EXCLUDED.hourly_var,
+                   hourly_active = EXCLUDED.hourly_active,
+                   last_day = GREATEST(anomaly_baselines.last_day, EXCLUDED.last_day)""",
+            baselines,
+            # Idle entities keep their last_day; NOT NULL is checked before the conflict.
+            template="(%s, %s, %s, %s::float8[], %s::float8[], %s::float8[], COALESCE(%s::date, '-infinity'::date))",
+            page_size=1000
+        )
+        execute_values(
+            cur,
+            """INSERT INTO anomaly_terminal_ips (operator, source_ip, first_seen, last_seen) VALUES %s
+               ON CONFLICT (operator, source_ip) DO UPDATE SET
+                   last_seen = EXCLUDED.last_seen,
+                   days_seen = anomaly_terminal_ips.days_seen + 1""",
+            [(operator_name, source_ip, day, day) for operator_name, source_ip in sorted(terminals)],
+            page_size=1000
+        )
+        # Operator findings belong to the user of that name, if there is one,
+        # which is what puts them in that user's group reports.
+        execute_values(
+            cur,
+            """INSERT INTO anomaly_findings
+                   (finding_date, entity_kind, entity, user_id, finding_type, hour, observed, expected, score, details)
+               SELECT v.finding_date, v.entity_kind, v.entity, u.id, v.finding_type, v.hour, v.observed, v.expected, v.score, v.details
+               FROM (VALUES %s) AS v (finding_date, entity_kind, entity, finding_type, hour, observed, expected, score, details)
+               LEFT JOIN users u ON v.entity_kind = 'operator' AND u.username = v.entity""",
+            findings,
+            template='(%s::date, %s, %s, %s, %s::smallint, %s::float8, %s::float8, %s::float8, %s)',
+            page_size=1000
+        )
+        # last_day only moves for entities that were active, so idle ones age out.
+        if retention_days:
+            cutoff = day - timedelta(days=retention_days)
+            cur.execute("DELETE FROM anomaly_baselines WHERE last_day < %s", (cutoff,))
+            cur.execute("DELETE FROM anomaly_terminal_ips WHERE last_seen < %s", (cutoff,))
+        cur.execute(
+            """UPDATE activity_reports r SET unusual_behavior_count = (
+                   SELECT COUNT(*) FROM anomaly_findings f JOIN users u ON u.id = f.user_id
+                   WHERE f.finding_date = r.report_date AND u.group_id = r.group_id
+               )
+               WHERE r.report_date = %s""",
+            (day,)
+        )
+        conn.commit()
+        cur.close()
+
+def get_anomaly_findings(finding_date, group_id=None, limit=100):
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(
+            """SELECT f.id, f.finding_date, f.entity_kind, f.entity, f.user_id, u.username, u.group_id,
+                      f.finding_type, f.hour, f.observed, f.expected, f.score, f.details
+               FROM anomaly_findings f LEFT JOIN users u ON u.id = f.user_id
+               WHERE f.finding_date = %s AND (%s::int IS NULL OR u.group_id = %s)
+               ORDER BY f.score DESC, f.id
+               LIMIT %s""",
+            (finding_date, group_id, group_id, limit)
+        )
+        findings = cur.fetchall()
+        cur.close()
+    return findings
+
 def update_last_login(user_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s", (user_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s", (user_id,))
+        conn.commit()
+        cur.close()
+    bump_directory_version()
+
+def get_session(session_id):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT data, EXTRACT(EPOCH FROM expiry - NOW()) FROM sessions WHERE id = %s AND expiry > NOW()",
+            (session_id,)
+        )
+        row = cur.fetchone()
+        cur.close()
+    if row is None:
+        return None
+    return bytes(row[0]), float(row[1])
+
+def save_session(session_id, data, lifetime_seconds):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO sessions (id, data, expiry) VALUES (%s, %s, NOW() + %s * INTERVAL '1 second')
+               ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, expiry = EXCLUDED.expiry""",
+            (session_id, psycopg2.Binary(data), lifetime_seconds)
+        )
+        conn.commit()
+        cur.close()
+
+def delete_session(session_id):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM sessions WHERE id = %s", (session_id,))
+        conn.commit()
+        cur.close()
+
+def delete_expired_sessions(batch_size=5000):
+    # Short batches keep each sweep from holding locks on a large backlog;
+    # SKIP LOCKED lets several workers sweep at once without waiting.
+    deleted = 0
+    with db_connection() as conn:
+        cur = conn.cursor()
+        while True:
+            cur.execute(
+                """DELETE FROM sessions WHERE id IN (
+                       SELECT id FROM sessions WHERE expiry <= NOW() LIMIT %s FOR UPDATE SKIP LOCKED
+                   )""",
+                (batch_size,)
+            )
+            conn.commit()
+            deleted += cur.rowcount
+            if cur.rowcount < batch_size:
+                break
+        cur.close()
+    return deleted
 
 def create_log_source(name, source_type, source_ip=None, api_key=None):
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO log_sources (name, source_type, source_ip, api_key) VALUES (%s, %s, %s, %s) RETURNING id",
+            (name, source_type, source_ip, api_key)
+        )
+        source_id = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
     
-    cur.execute(
-        "INSERT INTO log_sources (name, source_type, source_ip, api_key) VALUES (%s, %s, %s, %s) RETURNING id",
-        (name, source_type, source_ip, api_key)
-    )
-    source_id = cur.fetchone()[0]
-    conn.commit()
-    cur.close()
-    conn.close()
+    if api_key:
+        _invalid_api_key_cache.pop(api_key)
     return source_id
 
+def set_log_source_active(source_id, is_active):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE log_sources SET is_active = %s WHERE id = %s RETURNING api_key", (is_active, source_id))
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+    
+    if row and row[0]:
+        _api_key_cache.pop(row[0])
+        _invalid_api_key_cache.pop(row[0])
+    return row is not None
+
 def get_all_log_sources():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM log_sources ORDER BY created_at DESC")
-    sources = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM log_sources ORDER BY created_at DESC")
+        sources = cur.fetchall()
+        cur.execute("SELECT LOCALTIMESTAMP AS now")
+        db_now = cur.fetchone()['now']
+        cur.close()
+    # Counts this process has not flushed yet, so the page is not a flush
+    # interval behind for sources it is receiving.
+    pending = _source_counters.pending()
+    now = time.monotonic()
+    for source in sources:
+        if source['id'] in pending:
+            received, received_at = pending[source['id']]
+            last_received = db_now - timedelta(seconds=now - received_at)
+            source['total_logs_received'] = (source['total_logs_received'] or 0) + received
+            source['last_received'] = max(source['last_received'] or last_received, last_received)
     return sources
 
-def update_log_source_stats(source_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE log_sources SET total_logs_received = total_logs_received + 1, last_received = CURRENT_TIMESTAMP WHERE id = %s",
-        (source_id,)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+def get_log_source(source_id):
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM log_sources WHERE id = %s", (source_id,))
+        source = cur.fetchone()
+        cur.close()
+    return dict(source) if source else None
+
+def get_active_log_sources_by_ip():
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM log_sources WHERE is_active = TRUE AND source_ip IS NOT NULL AND source_ip <> '' ORDER BY id")
+        sources = cur.fetchall()
+        cur.close()
+    return {source['source_ip']: dict(source) for source in sources}
+
+def update_log_source_stats(source_id, count=1):
+    _source_counters.add({source_id: count})
+
+class SourceCounters:
+    # Bumping log_sources inside every ingest transaction made all writers for
+    # one source queue on its row lock until commit. Counts collect here
+    # instead and a background thread adds them with one UPDATE per interval.
+    label = 'Log source counter'
+    
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        
+        self.flushes = 0
+        self.flushed_events = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        # Counts inherited over fork were the parent's to flush.
+        self._pending = {}
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='source-counters', daemon=True)
+        self._thread.start()
+    
+    def add(self, counts):
+        # Arrival is kept on the monotonic clock and turned into a timestamp
+        # by the database at flush, so last_received is on the same clock as
+        # every other timestamp it writes, whatever the app host's time zone.
+        received_at = time.monotonic()
+        with self._lock:
+            self._ensure_started()
+            self._merge({source_id: (count, received_at) for source_id, count in counts.items()})
+    
+    def _merge(self, entries):
+        for source_id, (count, received_at) in entries.items():
+            received, last_received = self._pending.get(source_id, (0, received_at))
+            self._pending[source_id] = (received + count, max(last_received, received_at))
+    
+    def pending(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return {}
+            return dict(self._pending)
+    
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+    
+    def flush(self):
+        with self._lock:
+            if self._pid != os.getpid() or not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+        
+        started = time.perf_counter()
+        try:
+            with db_connection() as conn:
+                cur = conn.cursor()
+                self._write(cur, pending)
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            logging.error(f"{self.label} flush failed: {str(e)}")
+            with self._lock:
+                self.failed_flushes += 1
+                self._merge(pending)
+            return 0
+        
+        with self._lock:
+            self.flushes += 1
+            self.flushed_events += self._events(pending)
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+        return len(pending)
+    
+    def _write(self, cur, pending):
+        now = time.monotonic()
+        # Sorted so flushes from several workers lock rows in the same order.
+        execute_values(
+            cur,
+            """UPDATE log_sources s
+               SET total_logs_received = COALESCE(s.total_logs_received, 0) + v.received,
+                   last_received = GREATEST(s.last_received, CURRENT_TIMESTAMP - v.age * INTERVAL '1 second')
+               FROM (VALUES %s) AS v (id, received, age)
+               WHERE s.id = v.id""",
+            [(source_id, received, now - last_received) for source_id, (received, last_received) in sorted(pending.items())],
+            template='(%s, %s, %s::float8)',
+            page_size=1000
+        )
+    
+    def _events(self, pending):
+        return sum(received for received, _ in pending.values())
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'pending_sources': len(self._pending),
+                'pending_events': self._events(self._pending),
+                'flush_interval': self.flush_interval,
+                'flushes': self.flushes,
+                'flushed_events': self.flushed_events,
+                'failed_flushes': self.failed_flushes,
+                'last_flush_ms': self.last_flush_ms
+            }
+
+class RollupCounters(SourceCounters):
+    # The rollup rows are shared by every writer (one per minute, severity,
+    # event type and source), so they are bumped the same way as the source
+    # counters: summed here and upserted once per interval.
+    label = 'Event rollup'
+    
+    def add(self, rows):
+        counts = Counter()
+        for unit in ROLLUP_UNITS:
+            for row in rows:
+                bucket = _truncate_timestamp(row.timestamp, unit)
+                counts[unit, 'event', (bucket, row.severity, row.event_type or '', row.log_source_id or 0)] += row.event_count
+                counts[unit, 'host', (bucket, row.source_host or '')] += row.event_count
+        with self._lock:
+            self._ensure_started()
+            self._merge(counts)
+    
+    def _merge(self, entries):
+        for key, count in entries.items():
+            self._pending[key] = self._pending.get(key, 0) + count
+    
+    def _write(self, cur, pending):
+        if not _table_exists(cur, 'event_host_rollups_day'):
+            return
+        tables = {}
+        for (unit, kind, key), count in pending.items():
+            tables.setdefault((unit, kind), {})[key] = count
+        for (unit, kind), counts in sorted(tables.items()):
+            if kind == 'event':
+                _upsert_counts(cur, f'event_rollups_{unit}', ('bucket', 'severity', 'event_type', 'log_source_id'), counts)
+            else:
+                _upsert_counts(cur, f'event_host_rollups_{unit}', ('bucket', 'source_host'), counts)
+    
+    def _events(self, pending):
+        return sum(count for (unit, kind, _), count in pending.items() if unit == 'day' and kind == 'host')
+    
+    def stats(self):
+        stats = super().stats()
+        stats['pending_rows'] = stats.pop('pending_sources')
+        return stats
+
+_source_counters = SourceCounters(flush_interval=Config.SOURCE_STATS_FLUSH_INTERVAL)
+_rollup_counters = RollupCounters(flush_interval=Config.ROLLUP_FLUSH_INTERVAL)
+
+def get_source_counter_stats():
+    return _source_counters.stats()
+
+def get_rollup_counter_stats():
+    return _rollup_counters.stats()
+
+def flush_source_counters():
+    return _source_counters.flush()
+
+def flush_rollup_counters():
+    return _rollup_counters.flush()
+
+atexit.register(flush_source_counters)
+atexit.register(flush_rollup_counters)
+
+_api_key_cache = TTLCache(maxsize=Config.API_KEY_CACHE_SIZE, ttl=Config.API_KEY_CACHE_TTL)
+_invalid_api_key_cache = TTLCache(maxsize=Config.API_KEY_NEGATIVE_CACHE_SIZE, ttl=Config.API_KEY_NEGATIVE_CACHE_TTL)
+_api_key_db_lookups = 0
 
 def verify_api_key(api_key):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM log_sources WHERE api_key = %s AND is_active = TRUE", (api_key,))
-    source = cur.fetchone()
-    cur.close()
-    conn.close()
+    global _api_key_db_lookups
+    source = _api_key_cache.get(api_key)
+    if source is not None:
+        return source
+    if _invalid_api_key_cache.get(api_key):
+        return None
+    
+    _api_key_db_lookups += 1
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM log_sources WHERE api_key = %s AND is_active = TRUE", (api_key,))
+        source = cur.fetchone()
+        cur.close()
+    
+    # Unknown keys are remembered in their own, separately bounded cache so a
+    # flood of random keys cannot evict the sources that are really in use.
+    if source is None:
+        _invalid_api_key_cache.set(api_key, True)
+        return None
+    source = dict(source)
+    _api_key_cache.set(api_key, source)
     return source
 
+def get_api_key_cache_stats():
+    return {
+        'valid': _api_key_cache.stats(),
+        'invalid': _invalid_api_key_cache.stats(),
+        'db_lookups': _api_key_db_lookups
+    }
+
 def insert_log_event_with_source(severity, message, source_id=None, source_ip=None, source_host=None, event_type=None, user_id=None, raw_log=None):
     return insert_log_event(
         severity=severity,
@@ -403,61 +1746,387 @@ def insert_log_event_with_source(severity, message, source_id=None, source_ip=No
         log_source_id=source_id
     )
 
-def insert_bulk_logs(logs_data, log_source_id=None):
-    inserted_count = 0
-    errors = []
-    
-    for idx, log_entry in enumerate(logs_data):
-        conn = None
-        cur = None
+EVENT_COLUMNS = ('timestamp', 'severity', 'message', 'source_ip', 'source_host', 'event_type', 'user_id', 'raw_log', 'log_source_id', 'event_count', 'last_seen', 'operator')
+
+EventRow = namedtuple('EventRow', EVENT_COLUMNS, defaults=(1, None, None))
+
+EVENT_COLUMN_LIMITS = {'severity': 50, 'source_ip': 50, 'source_host': 255, 'event_type': 100, 'operator': 255}
+
+TIMESTAMP_FORMATS = ('%Y/%m/%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%b %d %Y %H:%M:%S', '%d-%b-%Y %H:%M:%S')
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+def parse_timestamp(value):
+    if isinstance(value, datetime):
+        timestamp = value
+    else:
+        text = str(value).strip()
         try:
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            cur.execute(
-                "INSERT INTO syslog_events (severity, message, source_ip, source_host, event_type, raw_log, timestamp, log_source_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-                (
-                    log_entry.get('severity', 'INFO'),
-                    log_entry.get('message', ''),
-                    log_entry.get('source_ip'),
-                    log_entry.get('source_host'),
-                    log_entry.get('event_type'),
-                    log_entry.get('raw_log'),
-                    log_entry.get('timestamp'),
-                    log_source_id
-                )
-            )
-            conn.commit()
-            inserted_count += 1
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            errors.append(f"Row {idx}: {str(e)}")
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                conn.close()
+            timestamp = datetime.fromisoformat(text)
+        except ValueError:
+            for fmt in TIMESTAMP_FORMATS:
+                try:
+                    timestamp = datetime.strptime(text, fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError(f"invalid timestamp {text!r}")
+    if timestamp.tzinfo is not None:
+        # Offsets can push a time at the calendar limits past year 1 or 9999.
+        try:
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        except (OverflowError, OSError):
+            raise ValueError(f"timestamp out of range {timestamp.isoformat()!r}")
+    return timestamp
+
+def _clean_text(value, column):
+    if value is None:
+        return None
+    text = str(value)
+    if '\x00' in text:
+        text = text.replace('\x00', '')
+    limit = EVENT_COLUMN_LIMITS.get(column)
+    if limit and len(text) > limit:
+        raise ValueError(f"{column} exceeds {limit} characters")
+    return text
+
+def normalize_log_entry(entry, log_source_id=None, default_timestamp=None):
+    timestamp = entry.get('timestamp')
+    if timestamp in (None, ''):
+        timestamp = default_timestamp or datetime.now()
+    else:
+        timestamp = parse_timestamp(timestamp)
     
-    if log_source_id and inserted_count > 0:
-        conn = None
-        cur = None
+    user_id = entry.get('user_id')
+    if user_id in ('', None):
+        user_id = None
+    else:
         try:
-            conn = get_db_connection()
-            cur = conn.cursor()
-            cur.execute(
-                "UPDATE log_sources SET total_logs_received = total_logs_received + %s, last_received = CURRENT_TIMESTAMP WHERE id = %s",
-                (inserted_count, log_source_id)
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid user_id {user_id!r}")
+    
+    return EventRow(
+        timestamp=timestamp,
+        severity=_clean_text(entry.get('severity') or 'INFO', 'severity').upper(),
+        message=_clean_text(entry.get('message') or '', 'message'),
+        source_ip=_clean_text(entry.get('source_ip') or None, 'source_ip'),
+        source_host=_clean_text(entry.get('source_host') or None, 'source_host'),
+        event_type=_clean_text(entry.get('event_type') or None, 'event_type'),
+        user_id=user_id,
+        raw_log=_clean_text(entry.get('raw_log'), 'raw_log'),
+        log_source_id=log_source_id if log_source_id is not None else entry.get('log_source_id'),
+        operator=_clean_text(entry.get('operator') or None, 'operator')
+    )
+
+def event_fingerprint(row):
+    # The operator is part of it so repeats by different operators stay
+    # separate rows, each attributable to its operator.
+    return (row.log_source_id, row.source_ip, row.source_host, row.severity, row.event_type, row.user_id, row.operator,
+            ' '.join(row.message.split()).casefold())
+
+class EventCoalescer:
+    # Folds repeats of an event (same fingerprint, within `window` of the
+    # first one) into a single row carrying event_count and last_seen. Open
+    # groups are closed once the stream moves past their window; at most
+    # max_groups are held, the oldest being closed early beyond that.
+    def __init__(self, window=None, max_groups=None):
+        self.window = timedelta(seconds=Config.INGEST_COALESCE_WINDOW if window is None else window)
+        self.max_groups = max_groups or Config.INGEST_COALESCE_MAX_GROUPS
+        self._groups = OrderedDict()
+        self.events = 0
+        self.rows = 0
+    
+    def add(self, idx, row):
+        self.events += row.event_count
+        closed = []
+        key = event_fingerprint(row)
+        group = self._groups.get(key)
+        if group is not None and abs(row.timestamp - group[1].timestamp) > self.window:
+            closed.append(self._close(key))
+            group = None
+        last_seen = row.last_seen or row.timestamp
+        if group is None:
+            self._groups[key] = [idx, row, row.event_count, last_seen]
+        else:
+            if row.timestamp < group[1].timestamp:
+                group[1] = group[1]._replace(timestamp=row.timestamp)
+            group[2] += row.event_count
+            group[3] = max(group[3], last_seen)
+        
+        while self._groups:
+            oldest_key, oldest = next(iter(self._groups.items()))
+            if len(self._groups) <= self.max_groups and row.timestamp - oldest[1].timestamp <= self.window:
+                break
+            closed.append(self._close(oldest_key))
+        return closed
+    
+    def _close(self, key):
+        idx, row, count, last_seen = self._groups.pop(key)
+        self.rows += 1
+        if count == 1:
+            return idx, row
+        return idx, row._replace(event_count=count, last_seen=last_seen)
+    
+    def drain(self):
+        return [self._close(key) for key in list(self._groups)]
+
+def coalesce_items(items, window=None, max_groups=None):
+    coalescer = EventCoalescer(window, max_groups)
+    rows = []
+    for idx, row in items:
+        rows.extend(coalescer.add(idx, row))
+    rows.extend(coalescer.drain())
+    return rows
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return str(value).translate(_COPY_ESCAPES)
+
+# The columns COPY writes to syslog_events; raw_log goes to the payload blocks.
+COPY_COLUMNS = tuple(column for column in EVENT_COLUMNS if column != 'raw_log')
+
+_copy_fields = operator.itemgetter(*(EVENT_COLUMNS.index(column) for column in COPY_COLUMNS))
+
+PAYLOAD_COLUMNS = 'timestamp, first_id, last_id, event_ids, lengths, data'
+
+def payload_worth_keeping(message, raw_log):
+    # A raw line that only repeats the message adds nothing to the event.
+    return bool(raw_log) and raw_log.strip() != message.strip()
+
+def payload_blocks(entries, level=None, block_size=None):
+    # entries are (event_id, timestamp, raw_log). Payloads of one batch are
+    # compressed together, which finds far more repetition than compressing
+    # each line on its own; a block never spans two days, so it always lies
+    # in a single partition and below block_size payloads stays cheap to read.
+    level = Config.RAW_LOG_COMPRESS_LEVEL if level is None else level
+    block_size = block_size or Config.RAW_LOG_BLOCK_SIZE
+    by_day = {}
+    for entry in sorted(entries):
+        by_day.setdefault(entry[1].date(), []).append(entry)
+    for day_entries in by_day.values():
+        for offset in range(0, len(day_entries), block_size):
+            block = day_entries[offset:offset + block_size]
+            encoded = [raw_log.encode('utf-8') for _, _, raw_log in block]
+            yield (
+                min(timestamp for _, timestamp, _ in block), block[0][0], block[-1][0],
+                [event_id for event_id, _, _ in block], [len(data) for data in encoded],
+                psycopg2.Binary(zlib.compress(b''.join(encoded), level))
             )
-            conn.commit()
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            errors.append(f"Failed to update source stats: {str(e)}")
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                conn.close()
+
+def _store_payloads(cur, ids, rows):
+    entries = [(event_id, row.timestamp, row.raw_log) for event_id, row in zip(ids, rows) if payload_worth_keeping(row.message, row.raw_log)]
+    if entries:
+        execute_values(cur, f"INSERT INTO syslog_event_payloads ({PAYLOAD_COLUMNS}) VALUES %s", list(payload_blocks(entries)))
+
+def _fetch_payloads(cur, keys):
+    # keys are (event_id, timestamp). A block starts no earlier than the day
+    # of its first event and no later than any event in it.
+    if not keys:
+        return {}
+    wanted = {event_id for event_id, _ in keys}
+    low = min(timestamp for _, timestamp in keys).replace(hour=0, minute=0, second=0, microsecond=0)
+    cur.execute(
+        """SELECT event_ids, lengths, data FROM syslog_event_payloads
+           WHERE timestamp >= %s AND timestamp <= %s AND last_id >= %s AND first_id <= %s""",
+        (low, max(timestamp for _, timestamp in keys), min(wanted), max(wanted))
+    )
+    payloads = {}
+    for event_ids, lengths, data in cur.fetchall():
+        if wanted.isdisjoint(event_ids):
+            continue
+        raw = zlib.decompress(data)
+        offset = 0
+        for event_id, length in zip(event_ids, lengths):
+            if event_id in wanted:
+                payloads[event_id] = raw[offset:offset + length].decode('utf-8')
+            offset += length
+    return payloads
+
+def _allocate_event_ids(cur, count):
+    cur.execute("SELECT nextval('syslog_events_id_seq') FROM generate_series(1, %s)", (count,))
+    return [row[0] for row in cur.fetchall()]
+
+def _copy_event_rows(cur, ids, rows):
+    # COPY cannot return the generated keys, so ids are drawn from the
+    # sequence up front; the live stream needs them to find the batch.
+    buf = io.StringIO()
+    for event_id, row in zip(ids, rows):
+        buf.write(str(event_id))
+        buf.write('\t')
+        buf.write('\t'.join(map(_copy_value, _copy_fields(row))))
+        buf.write('\n')
+    buf.seek(0)
+    cur.copy_expert(f"COPY syslog_events (id, {', '.join(COPY_COLUMNS)}) FROM STDIN", buf)
+
+_existing_tables = set()
+
+def _table_exists(cur, name):
+    if name not in _existing_tables:
+        cur.execute("SELECT to_regclass(%s)", (name,))
+        if cur.fetchone()[0] is None:
+            return False
+        _existing_tables.add(name)
+    return True
+
+ROLLUP_UNITS = ('minute', 'hour', 'day')
+
+def _truncate_timestamp(timestamp, unit):
+    if unit == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+def _weighted_counts(keys, rows):
+    counts = Counter()
+    for key, row in zip(keys, rows):
+        counts[key] += row.event_count
+    return counts
+
+def _upsert_counts(cur, table, columns, counts):
+    # Sorted so concurrent writers lock the shared rollup rows in the same order.
+    execute_values(
+        cur,
+        f"""INSERT INTO {table} ({', '.join(columns)}, event_count) VALUES %s
+            ON CONFLICT ({', '.join(columns)})
+            DO UPDATE SET event_count = {table}.event_count + EXCLUDED.event_count""",
+        [key + (count,) for key, count in sorted(counts.items())],
+        page_size=1000
+    )
+
+def _error_message(error):
+    diag = getattr(error, 'diag', None)
+    if diag is not None and diag.message_primary:
+        return diag.message_primary
+    return str(error).strip()
+
+def _write_chunk(conn, items, failures, derived=None, committed=None):
+    rows = [row for _, row in items]
+    try:
+        cur = conn.cursor()
+        ids = _allocate_event_ids(cur, len(rows))
+        _copy_event_rows(cur, ids, rows)
+        _store_payloads(cur, ids, rows)
+        timestamps = [row.timestamp for row in rows]
+        payload = _announce_events(cur, min(ids), max(ids), min(timestamps), max(timestamps))
+        conn.commit()
+        cur.close()
+        if committed is not None:
+            committed.update(idx for idx, _ in items)
+        counts = _weighted_counts((row.log_source_id for row in rows), rows)
+        counts.pop(None, None)
+        if counts:
+            _source_counters.add(counts)
+        _rollup_counters.add(rows)
+        _events_committed(payload)
+        _rows_committed(rows, derived)
+        return sum(row.event_count for row in rows)
+    except psycopg2.OperationalError:
+        raise
+    except psycopg2.DatabaseError as e:
+        conn.rollback()
+        if len(items) == 1:
+            failures.append((items[0][0], _error_message(e)))
+            return 0
+        # Split the chunk until the offending rows are isolated; the good
+        # halves still go in with one COPY each.
+        mid = len(items) // 2
+        return (_write_chunk(conn, items[:mid], failures, derived, committed) +
+                _write_chunk(conn, items[mid:], failures, derived, committed))
+
+def write_event_rows(items, run_hooks=True, committed=None):
+    # `committed`, when given, is a set that receives the indexes of the items
+    # whose chunk was committed, so a caller retrying after a connection error
+    # can leave out the ones already written.
+    failures = []
+    if not items:
+        return 0, failures
+    ensure_event_partitions({row.timestamp.date() for _, row in items})
+    derived = [] if run_hooks and event_row_hooks else None
+    try:
+        with db_connection() as conn:
+            inserted = _write_chunk(conn, items, failures, derived, committed)
+    finally:
+        # Written on a fresh connection once this one is back in the pool,
+        # including alerts from chunks committed before a connection error.
+        if derived:
+            _write_derived_rows(derived)
+    return inserted, failures
+
+def insert_bulk_logs(logs_data, log_source_id=None, chunk_size=None, coalesce=None, parser=None, source=None):
+    # Without a parser logs_data are entry dicts for normalize_log_entry;
+    # with one they are that parser's records, and `source` is the log source
+    # row they belong to.
+    chunk_size = chunk_size or Config.BULK_INSERT_CHUNK_SIZE
+    coalesce = Config.INGEST_COALESCE if coalesce is None else coalesce
+    started = time.perf_counter()
+    default_timestamp = datetime.now()
+    inserted_count = 0
+    total = 0
+    error_count = 0
+    errors = []
+    chunk = []
+    
+    # logs_data may be a lazy iterator over a huge upload; only one chunk and
+    # the first BULK_INSERT_MAX_ERRORS messages are ever held in memory.
+    def record_error(idx, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < Config.BULK_INSERT_MAX_ERRORS:
+            errors.append(f"Row {idx}: {message}")
+    
+    def flush():
+        inserted, failures = write_event_rows(chunk)
+        for idx, message in failures:
+            record_error(idx, message)
+        chunk.clear()
+        return inserted
+    
+    # Repeats are folded across chunk boundaries; the coalescer's own bound
+    # keeps the open groups from growing with the upload.
+    coalescer = EventCoalescer() if coalesce else None
+    records = iter(logs_data)
+    while True:
+        batch = list(itertools.islice(records, chunk_size))
+        if not batch:
+            break
+        if parser is None:
+            items = []
+            failures = []
+            for idx, log_entry in enumerate(batch, total):
+                try:
+                    items.append((idx, normalize_log_entry(log_entry, log_source_id, default_timestamp)))
+                except ValueError as e:
+                    failures.append((idx, str(e)))
+        else:
+            items, failures = parser.parse(batch, source, default_timestamp, start=total)
+        total += len(batch)
+        for idx, message in failures:
+            record_error(idx, message)
+        for idx, row in items:
+            if coalescer is None:
+                chunk.append((idx, row))
+            else:
+                chunk.extend(coalescer.add(idx, row))
+            if len(chunk) >= chunk_size:
+                inserted_count += flush()
+    if coalescer is not None:
+        chunk.extend(coalescer.drain())
+    if chunk:
+        inserted_count += flush()
     
-    return inserted_count, errors
+    elapsed = time.perf_counter() - started
+    return {
+        'inserted': inserted_count,
+        'coalesced': coalescer.events - coalescer.rows if coalescer is not None else 0,
+        'total': total,
+        'errors': errors,
+        'error_count': error_count,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_sec': round(inserted_count / elapsed, 1) if elapsed > 0 else 0.0
+    }
@@ -0,0 +1,209 @@
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import psycopg2
+from config import Config
+import database
+
+class Subscription:
+    def __init__(self, severities=None, maxsize=1000):
+        self.severities = severities
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+    
+    def offer(self, rows):
+        for row in rows:
+            if self.severities and row['severity'] not in self.severities:
+                continue
+            try:
+                self.queue.put_nowait(row)
+            except queue.Full:
+                # A client this far behind gets told to reload instead of
+                # holding an ever-growing backlog in the server.
+                self.overflowed = True
+                return
+    
+    def reset(self):
+        self.overflowed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+class EventBroadcaster:
+    # One listener thread per process turns batch announcements into a
+    # single query and fans the rows out to every open stream.
+    def __init__(self, backend='postgres', queue_size=1000, max_batch=500):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._payloads = []
+        self._recent_ids = deque(maxlen=10000)
+        self._recent_set = set()
+        self._thread = None
+        self._pid = None
+        
+        self.batches = 0
+        self.delivered = 0
+        self.reconnects = 0
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        self._subscribers.clear()
+        self._payloads = []
+        self._pid = os.getpid()
+        target = self._listen_postgres if self.backend == 'postgres' else self._listen_local
+        if self.backend != 'postgres' and self.publish not in database.event_commit_hooks:
+            database.event_commit_hooks.append(self.publish)
+        self._thread = threading.Thread(target=target, name='event-stream', daemon=True)
+        self._thread.start()
+    
+    def subscribe(self, severities=None):
+        subscription = Subscription(severities, self.queue_size)
+        with self._lock:
+            self._ensure_started()
+            self._subscribers.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+    
+    def publish(self, payload):
+        with self._cond:
+            self._payloads.append(payload)
+            self._cond.notify()
+    
+    def _listen_local(self):
+        while True:
+            with self._cond:
+                while not self._payloads:
+                    self._cond.wait()
+                payloads, self._payloads = self._payloads, []
+            self._dispatch(payloads)
+    
+    def _listen_postgres(self):
+        delay = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(Config.DATABASE_URL)
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {database.EVENTS_CHANNEL}")
+                delay = 1
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    payloads = [notify.payload for notify in conn.notifies]
+                    conn.notifies.clear()
+                    if payloads:
+                        self._dispatch(payloads)
+            except Exception as e:
+                logging.error(f"Event stream listener failed: {str(e)}")
+            finally:
+                if conn is not None:
+                    conn.close()
+            # Anything committed while we were not listening is lost to the
+            # stream, so every client is told to reload.
+            self.reconnects += 1
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for subscription in subscribers:
+                subscription.reset()
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+    
+    def _dispatch(self, payloads):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        
+        ranges = []
+        for payload in payloads:
+            try:
+                low_id, high_id, low_ts, high_ts = payload.split(',')
+                ranges.append((int(low_id), int(high_id), datetime.fromisoformat(low_ts), datetime.fromisoformat(high_ts)))
+            except ValueError:
+                logging.warning(f"Ignoring malformed event announcement: {payload!r}")
+        if not ranges:
+            return
+        
+        # Each announced batch is paged through to its end; a bulk load can
+        # announce thousands of rows at once.
+        for low_id, high_id, low_ts, high_ts in sorted(ranges):
+            after_id = low_id - 1
+            while True:
+                try:
+                    rows = database.get_events_in_range(after_id, high_id, low_ts, high_ts, self.max_batch)
+                except Exception as e:
+                    logging.error(f"Event stream fetch failed: {str(e)}")
+                    # The rest of the batch is lost to the stream.
+                    for subscription in subscribers:
+                        subscription.reset()
+                    return
+                self._deliver(subscribers, rows)
+                if len(rows) < self.max_batch:
+                    break
+                after_id = rows[-1]['id']
+    
+    def _deliver(self, subscribers, rows):
+        # Concurrent batches can interleave ids, so overlapping ranges may
+        # return rows that were already sent.
+        fresh = []
+        for row in rows:
+            if row['id'] in self._recent_set:
+                continue
+            if len(self._recent_ids) == self._recent_ids.maxlen:
+                self._recent_set.discard(self._recent_ids[0])
+            self._recent_ids.append(row['id'])
+            self._recent_set.add(row['id'])
+            fresh.append(row)
+        
+        for subscription in subscribers:
+            subscription.offer(fresh)
+        self.batches += 1
+        self.delivered += len(fresh)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'subscribers': len(self._subscribers),
+                'batches': self.batches,
+                'delivered': self.delivered,
+                'reconnects': self.reconnects
+            }
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+def get_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                _broadcaster = EventBroadcaster(
+                    backend=Config.EVENT_STREAM_BACKEND,
+                    queue_size=Config.EVENT_STREAM_QUEUE_SIZE,
+                    max_batch=Config.EVENT_STREAM_MAX_BATCH
+                )
+    return _broadcaster
+
+def get_event_stream_stats():
+    if _broadcaster is None:
+        return None
+    return _broadcaster.stats()
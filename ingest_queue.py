@@ -0,0 +1,181 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from config import Config
+import database
+
+class IngestQueue:
+    def __init__(self, maxsize=50000, batch_size=500, flush_interval=0.2, write_rows=None):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_rows = write_rows or database.write_event_rows
+        
+        self._items = deque()
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._flushing = 0
+        
+        self.enqueued = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_time = 0.0
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        # The writer thread does not survive a fork; each worker starts its own
+        # on first use and drops anything it inherited from the parent.
+        self._items.clear()
+        self._oldest = None
+        self._pid = os.getpid()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+        self._thread.start()
+    
+    def submit(self, rows):
+        with self._cond:
+            self._ensure_started()
+            if self._stopping or len(self._items) + len(rows) > self.maxsize:
+                self.rejected += len(rows)
+                return False
+            was_empty = not self._items
+            if was_empty:
+                self._oldest = time.monotonic()
+            self._items.extend(rows)
+            self.enqueued += len(rows)
+            if was_empty or len(self._items) >= self.batch_size:
+                self._cond.notify()
+        return True
+    
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if len(self._items) >= self.batch_size or (self._stopping and self._items):
+                    break
+                if self._stopping:
+                    return None
+                if self._items:
+                    remaining = self._oldest + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            
+            count = min(self.batch_size, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+            self._oldest = time.monotonic() if self._items else None
+            self._flushing = len(batch)
+            return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._flush(batch)
+    
+    def _flush(self, batch):
+        started = time.perf_counter()
+        items = list(enumerate(batch))
+        if Config.INGEST_COALESCE:
+            items = database.coalesce_items(items)
+        # A connection error can come after some chunks of the batch were
+        # committed; only the rest is written again.
+        committed = set()
+        for attempt in range(3):
+            try:
+                inserted, failures = self.write_rows(items, committed=committed)
+                self.written += inserted
+                self.failed += len(failures)
+                for idx, message in failures[:10]:
+                    logging.error(f"Queued log rejected: {message}")
+                break
+            except psycopg2.OperationalError as e:
+                logging.warning(f"Ingest flush attempt {attempt + 1} failed: {str(e)}")
+                self.written += sum(row.event_count for idx, row in items if idx in committed)
+                items = [(idx, row) for idx, row in items if idx not in committed]
+                committed.clear()
+                time.sleep(0.5 * (attempt + 1))
+            except Exception as e:
+                logging.error(f"Ingest flush failed: {str(e)}")
+                self.written += sum(row.event_count for idx, row in items if idx in committed)
+                self.failed += sum(row.event_count for idx, row in items if idx not in committed)
+                break
+        else:
+            lost = sum(row.event_count for _, row in items)
+            logging.error(f"Dropping {lost} queued logs after repeated database errors")
+            self.failed += lost
+        
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._flushing = 0
+            self.batches += 1
+            self.last_flush_ms = round(elapsed * 1000, 3)
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            self._total_flush_time += elapsed
+            self._cond.notify_all()
+    
+    def stop(self, timeout=None):
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                return True
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+    
+    def stats(self):
+        with self._cond:
+            return {
+                'depth': len(self._items),
+                'in_flight': self._flushing,
+                'maxsize': self.maxsize,
+                'enqueued': self.enqueued,
+                'rejected': self.rejected,
+                'written': self.written,
+                'failed': self.failed,
+                'batches': self.batches,
+                'last_flush_ms': self.last_flush_ms,
+                'max_flush_ms': self.max_flush_ms,
+                'avg_flush_ms': round(self._total_flush_time / self.batches * 1000, 3) if self.batches else 0.0
+            }
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_ingest_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestQueue(
+                    maxsize=Config.INGEST_QUEUE_MAX_SIZE,
+                    batch_size=Config.INGEST_BATCH_SIZE,
+                    flush_interval=Config.INGEST_FLUSH_INTERVAL
+                )
+    return _queue
+
+def get_ingest_queue_stats():
+    if _queue is None:
+        return None
+    return _queue.stats()
+
+def _drain_on_exit():
+    if _queue is not None and not _queue.stop(Config.INGEST_DRAIN_TIMEOUT):
+        logging.error(f"Ingest queue not drained on shutdown, {_queue.stats()['depth']} logs lost")
+
+atexit.register(_drain_on_exit)
@@ -0,0 +1,139 @@
+import argparse
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+PARTITION_RE = re.compile(r'(?<=syslog_events_)[dw]\d{8}')
+
+def cmd_migrate(args):
+    import migrations
+    applied = migrations.apply_migrations(target=args.target, log=print)
+    if not applied:
+        print("No pending migrations")
+
+def cmd_showmigrations(args):
+    import migrations
+    for migration in migrations.get_status():
+        mark = 'X' if migration['applied_at'] else ' '
+        applied_at = migration['applied_at'].strftime('%Y-%m-%d %H:%M:%S') if migration['applied_at'] else 'pending'
+        print(f"[{mark}] {migration['version']:04d}_{migration['name']:<40} {applied_at}  {migration['description']}")
+
+def cmd_explain(args):
+    import migrations
+    failed = False
+    for result in migrations.check_index_usage():
+        status = 'ok' if result['uses_index'] else 'SEQ SCAN'
+        # One line per distinct scan, with partition names folded together.
+        scans = dict.fromkeys(
+            f"{node_type}({PARTITION_RE.sub('*', name)})" for node_type, name in result['scans']
+        )
+        scans = ', '.join(scans)
+        print(f"{status:<9} {result['query']:<22} {scans}")
+        failed = failed or not result['uses_index']
+    if failed:
+        sys.exit(1)
+
+def cmd_partitions(args):
+    import database
+    created, dropped = database.maintain_event_partitions(args.premake_days, args.retention_days)
+    for name in created:
+        print(f"Created {name}")
+    for name in dropped:
+        print(f"Dropped {name}")
+    if not created and not dropped:
+        print("Partitions up to date")
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def cmd_reports(args):
+    import database
+    start = args.start or date.today()
+    end = args.end or max(start, date.today())
+    if end < start:
+        sys.exit("--end must not be before --start")
+    
+    chunks = []
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=args.chunk_days - 1), end)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + timedelta(days=1)
+    
+    started = time.monotonic()
+    generated = 0
+    # Chunks cover disjoint dates, so workers never contend for the same rows.
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(database.generate_reports, chunk_start, chunk_end): (chunk_start, chunk_end)
+                   for chunk_start, chunk_end in chunks}
+        for future in as_completed(futures):
+            chunk_start, chunk_end = futures[future]
+            count = future.result()
+            generated += count
+            print(f"{chunk_start} .. {chunk_end}: {count} reports")
+    print(f"Generated {generated} reports in {time.monotonic() - started:.1f}s")
+
+def cmd_anomalies(args):
+    import anomaly
+    days = anomaly.pending_days(args.through, args.start)
+    if not days:
+        print("Anomaly baselines up to date")
+        return
+    for day in days:
+        result = anomaly.score_day(day)
+        print(f"{day}: {result['entities']} entities, {result['findings']} findings in {result['duration_ms']:.0f} ms")
+
+def cmd_rules(args):
+    import correlation
+    from config import Config
+    path = args.file or Config.CORRELATION_RULES_FILE
+    try:
+        rules = correlation.load_rules(path)
+    except (OSError, ValueError, KeyError) as e:
+        sys.exit(f"{path}: {str(e)}")
+    for rule in rules:
+        print(f"{rule.kind:<9} {rule.name:<40} by {rule.group_by:<12} {f'{rule.seconds:g}s':>6}  {rule.title}")
+    print(f"{len(rules)} rules OK")
+
+def main():
+    parser = argparse.ArgumentParser(description='SIEM dashboard maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    migrate = subparsers.add_parser('migrate', help='apply pending schema migrations')
+    migrate.add_argument('--target', type=int, help='stop after this migration version')
+    migrate.set_defaults(func=cmd_migrate)
+    
+    showmigrations = subparsers.add_parser('showmigrations', help='list migrations and whether they are applied')
+    showmigrations.set_defaults(func=cmd_showmigrations)
+    
+    explain = subparsers.add_parser('explain', help='check that the hot read queries can use an index')
+    explain.set_defaults(func=cmd_explain)
+    
+    partitions = subparsers.add_parser('partitions', help='create upcoming syslog_events partitions and drop expired ones')
+    partitions.add_argument('--premake-days', type=int, help='days ahead to create (default SYSLOG_PARTITION_PREMAKE_DAYS)')
+    partitions.add_argument('--retention-days', type=int, help='drop partitions older than this (default SYSLOG_RETENTION_DAYS, 0 keeps all)')
+    partitions.set_defaults(func=cmd_partitions)
+    
+    reports = subparsers.add_parser('reports', help='generate or backfill daily activity reports for all groups')
+    reports.add_argument('--start', type=_parse_date, help='first day, YYYY-MM-DD (default today)')
+    reports.add_argument('--end', type=_parse_date, help='last day, YYYY-MM-DD (default today)')
+    reports.add_argument('--workers', type=int, default=4, help='date chunks generated in parallel')
+    reports.add_argument('--chunk-days', type=int, default=7, help='days per set-based pass')
+    reports.set_defaults(func=cmd_reports)
+    
+    anomalies = subparsers.add_parser('anomalies', help='score unscored days against the activity baselines and fold them in')
+    anomalies.add_argument('--start', type=_parse_date, help='first day when nothing is scored yet (default ANOMALY_BASELINE_DAYS back)')
+    anomalies.add_argument('--through', type=_parse_date, help='last day to score, YYYY-MM-DD (default yesterday)')
+    anomalies.set_defaults(func=cmd_anomalies)
+    
+    rules = subparsers.add_parser('rules', help='validate and list the event correlation rules')
+    rules.add_argument('--file', help='rules file (default CORRELATION_RULES_FILE)')
+    rules.set_defaults(func=cmd_rules)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+from migrations import create_index_concurrently
+
+description = 'Indexes for dashboard reads, severity filters, daily counts and API-key lookups'
+
+transactional = False
+
+INDEXES = [
+    ('idx_syslog_events_timestamp', 'syslog_events', 'timestamp'),
+    ('idx_syslog_events_severity_timestamp', 'syslog_events', 'severity, timestamp'),
+    ('idx_syslog_events_log_source_id', 'syslog_events', 'log_source_id'),
+    ('idx_syslog_events_user_id', 'syslog_events', 'user_id'),
+    ('idx_log_sources_api_key', 'log_sources', 'api_key'),
+    ('idx_activity_reports_group_date', 'activity_reports', 'group_id, report_date'),
+]
+
+def upgrade(cur):
+    for name, table, columns in INDEXES:
+        create_index_concurrently(cur, name, table, columns)
@@ -0,0 +1,63 @@
+import database
+
+description = 'Range-partition syslog_events on timestamp so retention can drop whole partitions'
+
+rewrites = 'syslog_events'
+
+COLUMNS = 'id, timestamp, severity, source_ip, source_host, event_type, message, user_id, log_source_id, raw_log, processed'
+
+BATCH_SIZE = 50000
+
+def upgrade(cur):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = 'syslog_events'::regclass")
+    if cur.fetchone()[0] == 'p':
+        return
+    
+    cur.execute("LOCK TABLE syslog_events IN ACCESS EXCLUSIVE MODE")
+    cur.execute("ALTER TABLE syslog_events RENAME TO syslog_events_legacy")
+    cur.execute("ALTER TABLE syslog_events_legacy RENAME CONSTRAINT syslog_events_pkey TO syslog_events_legacy_pkey")
+    for name in ('idx_syslog_events_timestamp', 'idx_syslog_events_severity_timestamp',
+                 'idx_syslog_events_log_source_id', 'idx_syslog_events_user_id'):
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+    
+    # The partition key has to be part of the primary key, and a NULL
+    # timestamp could never be routed to a partition.
+    cur.execute('''
+        CREATE TABLE syslog_events (
+            id INTEGER NOT NULL DEFAULT nextval('syslog_events_id_seq'),
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            severity VARCHAR(50) NOT NULL,
+            source_ip VARCHAR(50),
+            source_host VARCHAR(255),
+            event_type VARCHAR(100),
+            message TEXT NOT NULL,
+            user_id INTEGER REFERENCES users(id),
+            log_source_id INTEGER REFERENCES log_sources(id),
+            raw_log TEXT,
+            processed BOOLEAN DEFAULT FALSE,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    ''')
+    cur.execute("ALTER SEQUENCE syslog_events_id_seq OWNED BY syslog_events.id")
+    cur.execute("CREATE TABLE syslog_events_default PARTITION OF syslog_events DEFAULT")
+    
+    cur.execute("SELECT DISTINCT timestamp::date FROM syslog_events_legacy WHERE timestamp IS NOT NULL")
+    days = database.partitioned_days(row[0] for row in cur.fetchall())
+    database.create_event_partitions(cur, days)
+    
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM syslog_events_legacy")
+    max_id = cur.fetchone()[0]
+    for low in range(0, max_id, BATCH_SIZE):
+        cur.execute(
+            f"""INSERT INTO syslog_events ({COLUMNS})
+                SELECT id, COALESCE(timestamp, CURRENT_TIMESTAMP), severity, source_ip, source_host,
+                       event_type, message, user_id, log_source_id, raw_log, processed
+                FROM syslog_events_legacy WHERE id > %s AND id <= %s""",
+            (low, low + BATCH_SIZE)
+        )
+    cur.execute("DROP TABLE syslog_events_legacy")
+    
+    cur.execute("CREATE INDEX idx_syslog_events_timestamp ON syslog_events (timestamp)")
+    cur.execute("CREATE INDEX idx_syslog_events_severity_timestamp ON syslog_events (severity, timestamp)")
+    cur.execute("CREATE INDEX idx_syslog_events_log_source_id ON syslog_events (log_source_id)")
+    cur.execute("CREATE INDEX idx_syslog_events_user_id ON syslog_events (user_id)")
@@ -0,0 +1,13 @@
+from migrations import create_partitioned_index
+
+description = 'Index syslog_events on (timestamp, id) for keyset pagination and since-cursors'
+
+transactional = False
+
+def upgrade(cur):
+    create_partitioned_index(cur, 'idx_syslog_events_timestamp_id', 'syslog_events', 'timestamp, id', 'timestamp_id')
+    create_partitioned_index(cur, 'idx_syslog_events_severity_timestamp_id', 'syslog_events',
+                             'severity, timestamp, id', 'severity_timestamp_id')
+    # Both are prefixes of the new indexes.
+    cur.execute("DROP INDEX IF EXISTS idx_syslog_events_timestamp")
+    cur.execute("DROP INDEX IF EXISTS idx_syslog_events_severity_timestamp")
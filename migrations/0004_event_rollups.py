@@ -0,0 +1,46 @@
+description = 'Per-minute, per-hour and per-day event count rollups for dashboard statistics'
+
+UNITS = ('minute', 'hour', 'day')
+
+MINUTE_BACKFILL = '2 days'
+
+def upgrade(cur):
+    # Source hosts get their own narrow tables: crossing them with severity
+    # and event type would multiply the rows every statistics query reads.
+    for unit in UNITS:
+        cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS event_rollups_{unit} (
+                bucket TIMESTAMP NOT NULL,
+                severity VARCHAR(50) NOT NULL,
+                event_type VARCHAR(100) NOT NULL DEFAULT '',
+                log_source_id INTEGER NOT NULL DEFAULT 0,
+                event_count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, severity, event_type, log_source_id)
+            )
+        ''')
+        cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS event_host_rollups_{unit} (
+                bucket TIMESTAMP NOT NULL,
+                source_host VARCHAR(255) NOT NULL DEFAULT '',
+                event_count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, source_host)
+            )
+        ''')
+    
+    # Writers start maintaining the rollups as soon as this commits; holding
+    # them off meanwhile keeps the backfill from missing or double counting.
+    cur.execute("LOCK TABLE syslog_events IN SHARE MODE")
+    for unit in UNITS:
+        where = f"WHERE timestamp >= date_trunc('hour', CURRENT_TIMESTAMP) - interval '{MINUTE_BACKFILL}'" if unit == 'minute' else ''
+        cur.execute(f'''
+            INSERT INTO event_rollups_{unit} (bucket, severity, event_type, log_source_id, event_count)
+            SELECT date_trunc('{unit}', timestamp), severity, COALESCE(event_type, ''), COALESCE(log_source_id, 0), COUNT(*)
+            FROM syslog_events {where}
+            GROUP BY 1, 2, 3, 4
+        ''')
+        cur.execute(f'''
+            INSERT INTO event_host_rollups_{unit} (bucket, source_host, event_count)
+            SELECT date_trunc('{unit}', timestamp), COALESCE(source_host, ''), COUNT(*)
+            FROM syslog_events {where}
+            GROUP BY 1, 2
+        ''')
@@ -0,0 +1,14 @@
+from migrations import create_index_concurrently
+
+description = 'One activity report per group and day, so report generation can upsert'
+
+transactional = False
+
+def upgrade(cur):
+    # Reports used to be inserted again on every generation; keep the newest.
+    cur.execute(
+        """DELETE FROM activity_reports a USING activity_reports b
+           WHERE a.group_id = b.group_id AND a.report_date = b.report_date AND a.id < b.id"""
+    )
+    create_index_concurrently(cur, 'uq_activity_reports_group_date', 'activity_reports', 'group_id, report_date', unique=True)
+    cur.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_activity_reports_group_date")
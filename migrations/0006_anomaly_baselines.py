@@ -0,0 +1,55 @@
+description = 'Hour-of-day activity baselines, usual terminal IPs and anomaly findings'
+
+def upgrade(cur):
+    # One row per entity holds 24 hour-of-day slots, so scoring a day is a
+    # single load into an entities x 24 matrix.
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_baselines (
+            entity_kind VARCHAR(20) NOT NULL,
+            entity VARCHAR(255) NOT NULL,
+            days_observed INTEGER NOT NULL DEFAULT 0,
+            hourly_mean DOUBLE PRECISION[] NOT NULL,
+            hourly_var DOUBLE PRECISION[] NOT NULL,
+            hourly_active DOUBLE PRECISION[] NOT NULL,
+            last_day DATE NOT NULL,
+            PRIMARY KEY (entity_kind, entity)
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_terminal_ips (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            source_ip VARCHAR(50) NOT NULL,
+            first_seen DATE NOT NULL,
+            last_seen DATE NOT NULL,
+            days_seen INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (user_id, source_ip)
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_findings (
+            id BIGSERIAL PRIMARY KEY,
+            finding_date DATE NOT NULL,
+            entity_kind VARCHAR(20) NOT NULL,
+            entity VARCHAR(255) NOT NULL,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            finding_type VARCHAR(50) NOT NULL,
+            hour SMALLINT,
+            observed DOUBLE PRECISION,
+            expected DOUBLE PRECISION,
+            score DOUBLE PRECISION,
+            details TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_anomaly_findings_date ON anomaly_findings (finding_date, score DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_anomaly_findings_user_date ON anomaly_findings (user_id, finding_date)")
+    # Baselines may only absorb each day once; this is the ledger of scored days.
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_runs (
+            score_date DATE PRIMARY KEY,
+            entities INTEGER NOT NULL DEFAULT 0,
+            findings INTEGER NOT NULL DEFAULT 0,
+            duration_ms DOUBLE PRECISION,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
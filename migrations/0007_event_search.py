@@ -0,0 +1,20 @@
+import logging
+
+from migrations import create_partitioned_index
+
+description = 'Trigram indexes for substring search over message and source_ip'
+
+transactional = False
+
+def upgrade(cur):
+    # The full-text search_vector comes with 0013, once every column it
+    # covers exists.
+    cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    if cur.fetchone() is None:
+        logging.warning("pg_trgm is not available; substring search will scan instead of using an index")
+        return
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    create_partitioned_index(cur, 'idx_syslog_events_message_trgm', 'syslog_events',
+                             'message gin_trgm_ops', 'message_trgm', using='gin')
+    create_partitioned_index(cur, 'idx_syslog_events_source_ip_trgm', 'syslog_events',
+                             'source_ip gin_trgm_ops', 'source_ip_trgm', using='gin')
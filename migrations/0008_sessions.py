@@ -0,0 +1,13 @@
+description = 'Unlogged server-side session table with an expiry index'
+
+def upgrade(cur):
+    # Sessions are cheap to lose (users log in again after a crash), so the
+    # table skips the WAL; it is truncated on crash recovery and not replicated.
+    cur.execute('''
+        CREATE UNLOGGED TABLE IF NOT EXISTS sessions (
+            id VARCHAR(255) PRIMARY KEY,
+            data BYTEA NOT NULL,
+            expiry TIMESTAMPTZ NOT NULL
+        )
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expiry ON sessions (expiry)")
@@ -0,0 +1,7 @@
+description = 'Occurrence count and last_seen for coalesced repeat events'
+
+def upgrade(cur):
+    # A constant default is stored in the catalog, so neither column rewrites
+    # existing partitions. timestamp stays the first occurrence.
+    cur.execute("ALTER TABLE syslog_events ADD COLUMN IF NOT EXISTS event_count INTEGER NOT NULL DEFAULT 1")
+    cur.execute("ALTER TABLE syslog_events ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP")
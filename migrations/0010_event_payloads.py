@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+import database
+
+description = 'Move raw_log into compressed blocks in syslog_event_payloads'
+
+rewrites = 'syslog_events'
+
+transactional = False
+
+BATCH_SIZE = 5000
+
+def upgrade(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS syslog_event_payloads (
+            timestamp TIMESTAMP NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            event_ids INTEGER[] NOT NULL,
+            lengths INTEGER[] NOT NULL,
+            data BYTEA NOT NULL,
+            PRIMARY KEY (last_id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    ''')
+    # Blocks are already zlib-compressed; TOAST trying pglz on them again
+    # only burns CPU.
+    cur.execute("ALTER TABLE syslog_event_payloads ALTER COLUMN data SET STORAGE EXTERNAL")
+    cur.execute("CREATE TABLE IF NOT EXISTS syslog_event_payloads_default PARTITION OF syslog_event_payloads DEFAULT")
+    
+    partitions = sorted(database._event_partition_names(cur))
+    for name in partitions:
+        match = database._EVENT_PARTITION_RE.match(name)
+        if not match:
+            continue
+        start = datetime.strptime(match.group(2), '%Y%m%d')
+        end = start + timedelta(days=7 if match.group(1) == 'w' else 1)
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {database._payload_partition(name)} "
+            f"PARTITION OF syslog_event_payloads FOR VALUES FROM (%s) TO (%s)",
+            (start, end)
+        )
+    
+    cur.execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'syslog_events' AND column_name = 'raw_log'"
+    )
+    if cur.fetchone() is not None:
+        _copy_payloads(cur, partitions)
+    
+    # Dropping the column only hides it; its space comes back when 0013
+    # rewrites every partition to add search_vector.
+    cur.execute("ALTER TABLE syslog_events DROP COLUMN IF EXISTS raw_log")
+
+def _copy_payloads(cur, partitions):
+    # Each batch commits on its own, and blocks are rebuilt identically, so
+    # an interrupted run picks up where it stopped.
+    for name in partitions:
+        last_id = 0
+        while True:
+            cur.execute(
+                f"""SELECT id, timestamp, message, raw_log FROM {name}
+                    WHERE id > %s AND raw_log IS NOT NULL ORDER BY id LIMIT %s""",
+                (last_id, BATCH_SIZE)
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            entries = [(event_id, timestamp, raw_log) for event_id, timestamp, message, raw_log in rows
+                       if database.payload_worth_keeping(message, raw_log)]
+            if entries:
+                execute_values(
+                    cur,
+                    f"INSERT INTO syslog_event_payloads ({database.PAYLOAD_COLUMNS}) VALUES %s ON CONFLICT DO NOTHING",
+                    list(database.payload_blocks(entries))
+                )
@@ -0,0 +1,6 @@
+description = 'Operator (the account that performed the action) on each event'
+
+def upgrade(cur):
+    # Nullable with no default, so existing partitions are not rewritten.
+    # Rows loaded before this keep operator NULL.
+    cur.execute("ALTER TABLE syslog_events ADD COLUMN IF NOT EXISTS operator VARCHAR(255)")
@@ -0,0 +1,21 @@
+description = 'Key operator baselines and usual terminal IPs on the operator name instead of user_id'
+
+def upgrade(cur):
+    # Operator baselines so far could only come from events with a user_id;
+    # they carry over under that user's name.
+    cur.execute(
+        """UPDATE anomaly_baselines b SET entity = u.username FROM users u
+           WHERE b.entity_kind = 'operator' AND b.entity = u.id::text
+             AND NOT EXISTS (SELECT 1 FROM anomaly_baselines o WHERE o.entity_kind = 'operator' AND o.entity = u.username)"""
+    )
+    cur.execute(
+        """UPDATE anomaly_findings f SET entity = u.username FROM users u
+           WHERE f.entity_kind = 'operator' AND f.user_id = u.id"""
+    )
+    cur.execute("ALTER TABLE anomaly_terminal_ips ADD COLUMN IF NOT EXISTS operator VARCHAR(255)")
+    cur.execute("UPDATE anomaly_terminal_ips t SET operator = u.username FROM users u WHERE u.id = t.user_id")
+    cur.execute("DELETE FROM anomaly_terminal_ips WHERE operator IS NULL")
+    cur.execute("ALTER TABLE anomaly_terminal_ips DROP CONSTRAINT anomaly_terminal_ips_pkey")
+    cur.execute("ALTER TABLE anomaly_terminal_ips DROP COLUMN user_id")
+    cur.execute("ALTER TABLE anomaly_terminal_ips ALTER COLUMN operator SET NOT NULL")
+    cur.execute("ALTER TABLE anomaly_terminal_ips ADD PRIMARY KEY (operator, source_ip)")
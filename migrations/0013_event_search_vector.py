@@ -0,0 +1,17 @@
+import database
+from migrations import create_partitioned_index
+
+description = 'Full-text search vector over message and operator, with a GIN index'
+
+rewrites = 'syslog_events'
+
+transactional = False
+
+def upgrade(cur):
+    # A stored generated column rewrites every partition while holding an
+    # exclusive lock; on a large table run this in a maintenance window.
+    cur.execute(
+        f"ALTER TABLE syslog_events ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({database.SEARCH_VECTOR_SQL}) STORED"
+    )
+    create_partitioned_index(cur, 'idx_syslog_events_search', 'syslog_events', 'search_vector', 'search', using='gin')
@@ -0,0 +1,237 @@
+import importlib
+import pkgutil
+import re
+import time
+from collections import namedtuple
+
+from config import Config
+import database
+
+Migration = namedtuple('Migration', ['version', 'name', 'module'])
+
+# Arbitrary key for pg_advisory_lock so concurrent workers never migrate twice.
+MIGRATION_LOCK_ID = 0x5349454D
+
+_MIGRATION_NAME_RE = re.compile(r'^(\d{4})_(\w+)$')
+
+class MigrationsPending(RuntimeError):
+    pass
+
+def load_migrations():
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MIGRATION_NAME_RE.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f'{__name__}.{module_info.name}')
+        migrations.append(Migration(int(match.group(1)), match.group(2), module))
+    migrations.sort(key=lambda migration: migration.version)
+    return migrations
+
+def _ensure_version_table(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INTEGER
+        )
+    ''')
+
+def _applied_versions(cur):
+    cur.execute("SELECT version, applied_at FROM schema_version")
+    return dict(cur.fetchall())
+
+def _acquire_lock(cur, timeout=600):
+    # pg_advisory_lock would sit in a statement with an open snapshot, which
+    # CREATE INDEX CONCURRENTLY in the lock holder waits on forever.
+    deadline = time.monotonic() + timeout
+    while True:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        if cur.fetchone()[0]:
+            return
+        if time.monotonic() > deadline:
+            raise TimeoutError("timed out waiting for another process to finish migrating")
+        time.sleep(0.5)
+
+def get_status():
+    with database.db_connection() as conn:
+        cur = conn.cursor()
+        _ensure_version_table(cur)
+        conn.commit()
+        applied = _applied_versions(cur)
+        cur.close()
+    
+    return [
+        {
+            'version': migration.version,
+            'name': migration.name,
+            'description': getattr(migration.module, 'description', ''),
+            'applied_at': applied.get(migration.version)
+        }
+        for migration in load_migrations()
+    ]
+
+def _blocked_at_startup(cur, migration):
+    # A migration that rewrites a table (`rewrites = '<table>'`) holds an
+    # exclusive lock on it for the whole copy. Startup only runs it while the
+    # table is small; on a large one it waits for `manage.py migrate`.
+    table = getattr(migration.module, 'rewrites', None)
+    if table is None:
+        return False
+    limit = Config.AUTO_MIGRATE_MAX_ROWS
+    cur.execute(f"SELECT count(*) FROM (SELECT 1 FROM {table} LIMIT %s) AS sample", (limit + 1,))
+    return cur.fetchone()[0] > limit
+
+def apply_migrations(target=None, log=None, startup=False):
+    log = log or (lambda message: None)
+    applied_now = []
+    blocked = None
+    
+    with database.db_connection() as conn:
+        conn.autocommit = True
+        cur = conn.cursor()
+        _acquire_lock(cur)
+        try:
+            _ensure_version_table(cur)
+            applied = _applied_versions(cur)
+            
+            for migration in load_migrations():
+                if migration.version in applied or (target is not None and migration.version > target):
+                    continue
+                if startup and _blocked_at_startup(cur, migration):
+                    blocked = migration
+                    break
+                
+                log(f"Applying {migration.version:04d}_{migration.name}...")
+                started = time.monotonic()
+                transactional = getattr(migration.module, 'transactional', True)
+                conn.autocommit = not transactional
+                try:
+                    migration.module.upgrade(cur)
+                    duration_ms = int((time.monotonic() - started) * 1000)
+                    cur.execute(
+                        "INSERT INTO schema_version (version, name, duration_ms) VALUES (%s, %s, %s)",
+                        (migration.version, migration.name, duration_ms)
+                    )
+                    if transactional:
+                        conn.commit()
+                except Exception:
+                    if transactional:
+                        conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
+                
+                log(f"Applied {migration.version:04d}_{migration.name} in {duration_ms} ms")
+                applied_now.append(migration.version)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            cur.close()
+    
+    if blocked is not None:
+        # The code expects the schema every migration leaves behind, so
+        # running without this one would only fail request by request.
+        raise MigrationsPending(
+            f"Migration {blocked.version:04d}_{blocked.name} rewrites {blocked.module.rewrites}, which holds more "
+            f"than AUTO_MIGRATE_MAX_ROWS ({Config.AUTO_MIGRATE_MAX_ROWS}) rows, so it is not applied at startup. "
+            f"Run `python3 manage.py migrate` before starting."
+        )
+    return applied_now
+
+def require_migrated():
+    # For processes that use the schema without migrating it.
+    pending = [migration for migration in get_status() if migration['applied_at'] is None]
+    if pending:
+        raise MigrationsPending(
+            f"{len(pending)} migration(s) pending, from {pending[0]['version']:04d}_{pending[0]['name']}. "
+            f"Run `python3 manage.py migrate` before starting."
+        )
+
+def create_index_concurrently(cur, name, table, columns, unique=False, where=None, using=None):
+    # A failed concurrent build leaves an INVALID index behind that
+    # IF NOT EXISTS would happily skip, so clear it out first.
+    cur.execute(
+        """SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+           WHERE c.relname = %s""",
+        (name,)
+    )
+    row = cur.fetchone()
+    if row and not row[0]:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    
+    cur.execute(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} "
+        f"ON {table} {f'USING {using} ' if using else ''}({columns}){f' WHERE {where}' if where else ''}"
+    )
+
+def create_partitioned_index(cur, name, table, columns, suffix, using=None):
+    # CREATE INDEX on a partitioned table cannot run CONCURRENTLY and would
+    # block writers for the whole build. Instead the parent index is created
+    # ON ONLY the parent and each partition's index is built concurrently and
+    # attached; the parent index becomes valid once every partition has one.
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {f'USING {using} ' if using else ''}({columns})")
+    # Partitions created after the parent index already have one attached,
+    # as do those done by an earlier, interrupted run.
+    cur.execute(
+        """SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = %s::regclass
+             AND NOT EXISTS (SELECT 1 FROM pg_inherits ii JOIN pg_index x ON x.indexrelid = ii.inhrelid
+                             WHERE ii.inhparent = %s::regclass AND x.indrelid = c.oid)
+           ORDER BY c.relname""",
+        (table, name)
+    )
+    for (partition,) in cur.fetchall():
+        index = f"{partition}_{suffix}"
+        create_index_concurrently(cur, index, partition, columns, using=using)
+        cur.execute(f"ALTER INDEX {name} ATTACH PARTITION {index}")
+
+HOT_PATH_QUERIES = [
+    ('latest events', 'syslog_events',
+     "SELECT * FROM syslog_events WHERE timestamp >= now() - interval '1 day' ORDER BY timestamp DESC, id DESC LIMIT 100", ()),
+    ('events by severity', 'syslog_events',
+     "SELECT * FROM syslog_events WHERE severity = %s AND timestamp >= now() - interval '1 day' ORDER BY timestamp DESC, id DESC LIMIT 100", ('CRITICAL',)),
+    ('events since cursor', 'syslog_events',
+     "SELECT * FROM syslog_events WHERE timestamp >= now() - interval '1 minute' AND (timestamp, id) > (now() - interval '1 minute', 0) ORDER BY timestamp, id LIMIT 51", ()),
+    ('full-text search', 'syslog_events',
+     "SELECT * FROM syslog_events WHERE search_vector @@ websearch_to_tsquery('english', %s) AND timestamp >= now() - interval '1 day' ORDER BY timestamp DESC, id DESC LIMIT 101", ('unauthorized access',)),
+    ('hourly rollups', 'event_rollups_hour',
+     "SELECT * FROM event_rollups_hour WHERE bucket >= now() - interval '1 day' AND bucket < now()", ()),
+    ('api key lookup', 'log_sources',
+     "SELECT * FROM log_sources WHERE api_key = %s AND is_active = TRUE", ('missing-key',)),
+    ('daily report lookup', 'activity_reports',
+     "SELECT * FROM activity_reports WHERE group_id = %s AND report_date = CURRENT_DATE", (1,)),
+]
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+# Below this many pages a sequential scan is what the planner should pick,
+# e.g. for an empty premade partition or a table of a few rows.
+MIN_INDEXED_PAGES = 16
+
+def check_index_usage(min_pages=MIN_INDEXED_PAGES):
+    # The plans the queries really get, under the current statistics. A
+    # query passes when none of its scans reads a table of min_pages or more
+    # sequentially; run ANALYZE first on freshly loaded data.
+    results = []
+    with database.db_connection() as conn:
+        cur = conn.cursor()
+        for label, table, query, params in HOT_PATH_QUERIES:
+            cur.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+            plan = cur.fetchone()[0][0]['Plan']
+            nodes = [node for node in _plan_nodes(plan)
+                     if node.get('Relation Name', '').startswith(table) or node.get('Index Name')]
+            sequential = [node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan']
+            large = []
+            if sequential:
+                cur.execute("SELECT relname FROM pg_class WHERE relname = ANY(%s) AND relpages >= %s",
+                            (sequential, min_pages))
+                large = [name for (name,) in cur.fetchall()]
+            scans = [(node['Node Type'], node.get('Index Name') or node.get('Relation Name')) for node in nodes]
+            results.append({'query': label, 'uses_index': bool(nodes) and not large, 'scans': scans})
+        conn.rollback()
+        cur.close()
+    return results
@@ -0,0 +1,262 @@
+import abc
+import json
+import operator
+import re
+from datetime import datetime
+from json.encoder import encode_basestring
+
+import database
+from database import EventRow
+from syslog_parser import parse_syslog
+
+# json.dumps builds a new encoder on every call that passes options.
+_encode_json = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str).encode
+
+# Severity names the parsers understand, folded to the four the dashboard
+# uses; anything else is stored upper-cased as before.
+SEVERITY_NAMES = {
+    'debug': 'INFO', 'info': 'INFO', 'informational': 'INFO', 'notice': 'INFO', 'minor': 'INFO',
+    'warn': 'WARNING', 'warning': 'WARNING',
+    'err': 'ERROR', 'error': 'ERROR', 'major': 'ERROR',
+    'crit': 'CRITICAL', 'critical': 'CRITICAL', 'alert': 'CRITICAL', 'emerg': 'CRITICAL',
+    'emergency': 'CRITICAL', 'fatal': 'CRITICAL'
+}
+
+_LIMITED_FIELDS = tuple((EventRow._fields.index(column), column, limit)
+                        for column, limit in database.EVENT_COLUMN_LIMITS.items())
+
+def _severity(value):
+    if not value:
+        return 'INFO'
+    value = str(value)
+    return SEVERITY_NAMES.get(value.lower()) or value.upper()
+
+def _text(value):
+    if value is None or value == '':
+        return None
+    value = value if isinstance(value, str) else str(value)
+    return value.replace('\x00', '') if '\x00' in value else value
+
+def _line(record):
+    # Every field of a text record is a slice of it, so one check covers them.
+    if isinstance(record, bytes):
+        record = record.decode('utf-8', 'replace')
+    return record.replace('\x00', '') if '\x00' in record else record
+
+def _nonblank(record):
+    if not record.strip():
+        raise ValueError("empty record")
+    return record
+
+def _operator(value):
+    # Exports write "--" (sometimes tab-prefixed) for actions with no operator.
+    value = value.strip() if value else value
+    return None if not value or value == '--' else value
+
+def _user_id(value):
+    if value in ('', None):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid user_id {value!r}")
+
+def _checked(row):
+    # The column limits normalize_log_entry enforces, checked once on the
+    # finished tuple.
+    for index, column, limit in _LIMITED_FIELDS:
+        value = row[index]
+        if value is not None and len(value) > limit:
+            raise ValueError(f"{column} exceeds {limit} characters")
+    return row
+
+class Parser(abc.ABC):
+    # Turns a batch of records in one source format into (index, EventRow)
+    # items ready for write_event_rows, plus (index, message) errors.
+    # Subclasses build everything they can up front and implement row().
+    accepts = None
+    
+    def parse(self, records, source=None, received_at=None, sender_ip=None, start=0):
+        received_at = received_at or datetime.now()
+        row = self.row
+        items = []
+        errors = []
+        for idx, record in enumerate(records, start):
+            try:
+                items.append((idx, _checked(row(record, source, received_at, sender_ip))))
+            except ValueError as e:
+                errors.append((idx, str(e)))
+        return items, errors
+    
+    @abc.abstractmethod
+    def row(self, record, source, received_at, sender_ip):
+        pass
+
+class JsonParser(Parser):
+    # One JSON object per event, as posted to /api/ingest. Events are stamped
+    # with the time they were received; every field that does not map to a
+    # column is kept as the raw payload.
+    accepts = 'json'
+    
+    MAPPED = frozenset(('message', 'severity', 'source_ip', 'host', 'source_host', 'hostname', 'event_type', 'type', 'operator',
+                        'user', 'raw_log'))
+    
+    def row(self, record, source, received_at, sender_ip):
+        if not isinstance(record, dict):
+            raise ValueError("expected a JSON object")
+        get = record.get
+        message = get('message')
+        if not message:
+            raise ValueError("message is required")
+        raw_log = get('raw_log')
+        if not raw_log:
+            extra = {key: value for key, value in record.items() if key not in self.MAPPED}
+            raw_log = _encode_json(extra) if extra else None
+        return EventRow(
+            received_at, _severity(get('severity')), _text(message),
+            _text(get('source_ip') or get('host')), _text(get('source_host') or get('hostname')),
+            _text(get('event_type') or get('type')), None, _text(raw_log), source['id'] if source else None,
+            operator=_operator(_text(get('operator') or get('user')))
+        )
+
+class SyslogParser(Parser):
+    # RFC 5424 and RFC 3164 lines, as sent to the listener or /api/syslog.
+    accepts = 'text'
+    
+    def row(self, record, source, received_at, sender_ip):
+        record = _nonblank(_line(record))
+        parsed = parse_syslog(record, received_at)
+        return EventRow(
+            parsed['timestamp'], parsed['severity'], parsed['message'] or record,
+            sender_ip or (source and source.get('source_ip')) or None,
+            parsed['hostname'] or (source and source.get('name')) or None,
+            parsed['app_name'] or 'SYSLOG', None, record, source['id'] if source else None
+        )
+
+class KeyValueParser(Parser):
+    # key=value lines (firewalls, appliances), with "quoted values" allowed.
+    # Keys are matched against KEYS case-insensitively; a date= and time=
+    # pair is joined into one timestamp, and digits are epoch seconds (or
+    # milliseconds). The whole line is the raw payload.
+    accepts = 'text'
+    
+    KEYS = {
+        'message': ('msg', 'message', 'desc', 'description'),
+        'severity': ('severity', 'level', 'sev'),
+        'source_ip': ('src', 'srcip', 'src_ip', 'source_ip', 'ip'),
+        'source_host': ('host', 'hostname', 'devname', 'device', 'source_host'),
+        'event_type': ('type', 'event_type', 'event', 'action', 'subtype'),
+        'timestamp': ('timestamp', 'ts', 'datetime', 'time'),
+        'date': ('date',),
+        'user_id': ('user_id', 'uid'),
+        'operator': ('operator', 'user', 'usr', 'username', 'suser')
+    }
+    
+    _PAIR_RE = re.compile(r'([A-Za-z_][\w.-]*)=(?:"((?:[^"\\]|\\.)*)"|(\S*))')
+    _UNESCAPE_RE = re.compile(r'\\(.)')
+    
+    def __init__(self):
+        self.columns = {key: column for column, keys in self.KEYS.items() for key in keys}
+    
+    def row(self, record, source, received_at, sender_ip):
+        record = _nonblank(_line(record))
+        columns = self.columns
+        fields = {}
+        for key, quoted, bare in self._PAIR_RE.findall(record):
+            column = columns.get(key.lower())
+            if column is not None and column not in fields:
+                fields[column] = self._UNESCAPE_RE.sub(r'\1', quoted) if '\\' in quoted else quoted or bare
+        
+        # A msg= that is present but empty is a broken record, not a line
+        # without a message.
+        message = fields['message'] if 'message' in fields else record.strip()
+        if not message.strip():
+            raise ValueError("message is required")
+        
+        timestamp = fields.get('timestamp')
+        if 'date' in fields:
+            timestamp = f"{fields['date']} {timestamp}" if timestamp else fields['date']
+        if not timestamp:
+            timestamp = received_at
+        elif timestamp.isdigit():
+            try:
+                timestamp = datetime.fromtimestamp(int(timestamp) / (1000 if len(timestamp) > 10 else 1))
+            except (OverflowError, OSError):
+                raise ValueError(f"invalid timestamp {timestamp!r}")
+        else:
+            timestamp = database.parse_timestamp(timestamp)
+        return EventRow(
+            timestamp, _severity(fields.get('severity')), message,
+            fields.get('source_ip') or sender_ip or None, fields.get('source_host') or (source and source.get('name')) or None,
+            fields.get('event_type') or None, _user_id(fields.get('user_id')), record, source['id'] if source else None,
+            operator=_operator(fields.get('operator'))
+        )
+
+class OperationLogParser(Parser):
+    # Rows of an OperationLog CSV export, as lists from csv.reader. The
+    # header is resolved to column positions, and encoded as the keys of the
+    # JSON raw payload, once per file; a missing column reads as the empty
+    # string.
+    accepts = 'csv'
+    
+    COLUMNS = ('Operation', 'Level', 'Details', 'Terminal IP Address', 'Source', 'Time', 'Operator')
+    
+    LEVELS = {'Minor': 'INFO', 'Warning': 'WARNING', 'Major': 'ERROR', 'Critical': 'CRITICAL'}
+    
+    def __init__(self, header=()):
+        self.header = [name.strip() for name in header]
+        self.width = len(self.header)
+        positions = {name: idx for idx, name in reversed(list(enumerate(self.header)))}
+        self.fields = operator.itemgetter(*(positions.get(name, self.width) for name in self.COLUMNS))
+        self.keys = [f"{_encode_json(name)}:" for name in header]
+        self._last_time = None
+        self._last_timestamp = None
+    
+    def _timestamp(self, text, received_at):
+        # Exports are written in time order, so consecutive rows usually
+        # share their second.
+        if not text:
+            return received_at
+        if text != self._last_time:
+            self._last_timestamp = database.parse_timestamp(text)
+            self._last_time = text
+        return self._last_timestamp
+    
+    def row(self, record, source, received_at, sender_ip):
+        if '\x00' in ''.join(record):
+            record = [value.replace('\x00', '') for value in record]
+        raw_log = '{' + ','.join(map(operator.add, self.keys, map(encode_basestring, record))) + '}'
+        padded = record + [''] * (self.width + 1 - len(record))
+        operation, level, details, terminal_ip, host, time_text, operator_name = self.fields(padded)
+        return EventRow(
+            self._timestamp(time_text, received_at), self.LEVELS.get(level or 'Minor', 'INFO'),
+            f"{operation} - {details}", terminal_ip or None, host or None, operation or None, None,
+            raw_log, source['id'] if source else None, operator=_operator(operator_name)
+        )
+
+# log_sources.source_type -> parser class. Types without an entry, or whose
+# parser reads a different input than the endpoint receives, get that
+# endpoint's default.
+PARSERS = {
+    'SYSLOG': SyslogParser,
+    'FORWARDING': SyslogParser,
+    'KV': KeyValueParser,
+    'API': JsonParser,
+    'CSV': OperationLogParser
+}
+
+DEFAULT_PARSERS = {'json': JsonParser, 'text': SyslogParser, 'csv': OperationLogParser}
+
+_instances = {}
+
+def get_parser(source_type, accepts, header=None):
+    parser_class = PARSERS.get((source_type or '').upper())
+    if parser_class is None or parser_class.accepts != accepts:
+        parser_class = DEFAULT_PARSERS[accepts]
+    if accepts == 'csv':
+        return parser_class(header or ())
+    # Header-less parsers hold no per-stream state and are shared.
+    parser = _instances.get(parser_class)
+    if parser is None:
+        parser = _instances[parser_class] = parser_class()
+    return parser
@@ -0,0 +1,28 @@
+import hashlib
+
+from flask import current_app, request
+
+from cache import TTLCache
+from config import Config
+
+_responses = TTLCache(maxsize=Config.RESPONSE_CACHE_SIZE, ttl=Config.RESPONSE_CACHE_TTL)
+
+def conditional_json(key, version, build):
+    # Bodies are cached already serialized and tagged with a hash of their
+    # bytes, so every worker hands out the same ETag for the same data and a
+    # client that has it gets an empty 304.
+    entry = _responses.get((key, version))
+    if entry is None:
+        body = current_app.json.dumps(build()).encode('utf-8')
+        entry = (body, hashlib.sha256(body).hexdigest()[:32])
+        _responses.set((key, version), entry)
+    body, etag = entry
+    
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def get_response_cache_stats():
+    return _responses.stats()
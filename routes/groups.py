@@ -8,17 +8,7 @@ bp = Blueprint('groups', __name__)
 @login_required
 @role_required(['Admin', 'Manager'])
 def list_groups():
-    groups = database.get_all_groups()
-    groups_with_perms = []
-    
-    for group in groups:
-        perms = database.get_permissions_by_group(group['id'])
-        groups_with_perms.append({
-            'group': group,
-            'permissions': perms
-        })
-    
-    return render_template('groups.html', groups=groups_with_perms)
+    return render_template('groups.html', groups=database.get_groups_with_permissions())
 
 @bp.route('/groups/add', methods=['POST'])
 @login_required
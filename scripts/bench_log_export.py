@@ -0,0 +1,43 @@
+import argparse
+import os
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from api import logs_api
+
+def counted(batches, totals):
+    for rows in batches:
+        totals['rows'] += len(rows)
+        yield rows
+
+def run(start, end, fmt, compress, batch_size):
+    totals = {'rows': 0}
+    batches = counted(database.iter_log_export(start, end, as_json=fmt == 'ndjson', batch_size=batch_size), totals)
+    size = 0
+    started = time.perf_counter()
+    for chunk in logs_api.export_chunks(batches, fmt, compress):
+        size += len(chunk)
+    return totals['rows'], size, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput of /api/logs/export formats over a time range')
+    parser.add_argument('--days', type=float, default=1, help='export the last N days')
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+    
+    end = datetime.now()
+    start = end - timedelta(days=args.days)
+    for fmt, compress in (('ndjson', False), ('ndjson', True), ('csv', False), ('csv', True)):
+        rows, size, elapsed = run(start, end, fmt, compress, args.batch_size)
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        label = f"{fmt}{'+gzip' if compress else ''}"
+        print(f"{label:>11}: {rows} rows in {elapsed:.2f}s, {rows / elapsed:,.0f} rows/s, "
+              f"{size / elapsed / 1e6:.1f} MB/s ({size / 1e6:.1f} MB), peak RSS {peak_mb:.0f} MB")
+
+if __name__ == '__main__':
+    main()
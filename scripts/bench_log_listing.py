@@ -0,0 +1,62 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+import database
+from api import logs_api
+
+def python_rendered(limit):
+    # The listing path before rows were rendered by Postgres: every column
+    # comes back as a dict and is re-serialised by jsonify.
+    logs, has_more = database.get_logs_page(limit)
+    return jsonify({
+        'logs': [logs_api._log_to_dict(log) for log in logs],
+        'next_cursor': None,
+        'latest_cursor': None,
+        'has_more': has_more
+    }).get_data()
+
+def database_rendered(limit):
+    return logs_api._logs_page_response(limit).get_data()
+
+def measure(render, limit, iterations):
+    wall = []
+    cpu = []
+    size = 0
+    for _ in range(iterations):
+        started_wall = time.perf_counter()
+        started_cpu = time.process_time()
+        size = len(render(limit))
+        cpu.append(time.process_time() - started_cpu)
+        wall.append(time.perf_counter() - started_wall)
+    wall.sort()
+    return {
+        'p50_ms': wall[len(wall) // 2] * 1000,
+        'p99_ms': wall[min(len(wall) - 1, int(len(wall) * 0.99))] * 1000,
+        'cpu_ms': statistics.mean(cpu) * 1000,
+        'bytes': size
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency and CPU of rendering a page of logs in Python versus in Postgres')
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    
+    app = Flask(__name__)
+    with app.test_request_context(f'/api/logs?limit={args.limit}'):
+        for render in (python_rendered, database_rendered):
+            render(args.limit)
+        for name, render in (('python', python_rendered), ('postgres', database_rendered)):
+            result = measure(render, args.limit, args.iterations)
+            print(f"{name:>8}: p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, "
+                  f"worker CPU {result['cpu_ms']:.2f} ms/request, {result['bytes']} bytes")
+
+if __name__ == '__main__':
+    main()
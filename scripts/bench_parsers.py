@@ -0,0 +1,129 @@
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import parsers
+from syslog_parser import syslog_to_log_entry
+
+SOURCE = {'id': None, 'name': 'bench-source', 'source_ip': None}
+
+OPERATION_LOG_HEADER = ['Operation', 'Level', 'Operator', 'Time', 'Source', 'Terminal IP Address',
+                        'Operation Object', 'Result', 'Details']
+
+def operation_log_csv(count, rng):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(OPERATION_LOG_HEADER)
+    start = datetime(2025, 11, 18, 9, 0, 0)
+    for idx in range(count):
+        operation = rng.choice(['query current activities', 'modify user', 'export alarm list'])
+        writer.writerow([operation, rng.choice(['Minor', 'Warning', 'Major']), 'Emran.Zaarir',
+                         f"\t{start + timedelta(seconds=idx // 3):%Y-%m-%d %H:%M:%S}", 'OSSFaceService',
+                         f"192.168.27.{rng.randrange(256)}", operation, 'Successful', operation])
+    return buf.getvalue()
+
+def json_records(count, rng):
+    return [{'message': f"user session {rng.randrange(10000)} refreshed", 'severity': rng.choice(['info', 'warning']),
+             'host': f"10.0.0.{rng.randrange(256)}", 'hostname': 'app-srv-07', 'type': 'session',
+             'request_id': f"{rng.getrandbits(64):016x}"} for _ in range(count)]
+
+def syslog_lines(count, rng):
+    return [f"<{rng.randrange(8, 24)}>Oct 18 18:56:13 core-sw-02 sshd[{rng.randrange(100, 9999)}]: "
+            f"Accepted publickey for deploy from 10.1.2.{rng.randrange(256)} port 40022 ssh2" for _ in range(count)]
+
+def kv_lines(count, rng):
+    return [f'date=2025-11-18 time=13:58:{rng.randrange(60):02d} devname="fw-edge-01" level=warning type=traffic '
+            f'subtype=forward srcip=203.0.113.{rng.randrange(256)} dstip=10.0.0.5 dstport=23 action=deny '
+            f'msg="Denied by policy {rng.randrange(100)}"' for _ in range(count)]
+
+# The per-row paths the parsers replaced: every record becomes an entry dict
+# that normalize_log_entry then validates field by field.
+LEVELS = {'Minor': 'INFO', 'Warning': 'WARNING', 'Major': 'ERROR', 'Critical': 'CRITICAL'}
+
+def dict_operation_log(text):
+    rows = []
+    for row in csv.DictReader(io.StringIO(text)):
+        rows.append(database.normalize_log_entry({
+            'severity': LEVELS.get(row.get('Level', 'Minor'), 'INFO'),
+            'message': (row.get('Operation') or '') + ' - ' + (row.get('Details') or ''),
+            'source_ip': row.get('Terminal IP Address', ''),
+            'source_host': row.get('Source', ''),
+            'event_type': row.get('Operation', ''),
+            'raw_log': json.dumps(row, ensure_ascii=False),
+            'timestamp': row.get('Time') if row.get('Time') else None
+        }))
+    return rows
+
+def dict_json(records):
+    received_at = datetime.now()
+    mapped = parsers.JsonParser.MAPPED
+    rows = []
+    for log in records:
+        extra = {key: value for key, value in log.items() if key not in mapped}
+        rows.append(database.normalize_log_entry({
+            'severity': log.get('severity', 'INFO'),
+            'message': log.get('message', ''),
+            'source_ip': log.get('source_ip') or log.get('host'),
+            'source_host': log.get('source_host') or log.get('hostname'),
+            'event_type': log.get('event_type') or log.get('type'),
+            'raw_log': log.get('raw_log') or (json.dumps(extra, default=str) if extra else None)
+        }, None, received_at))
+    return rows
+
+def dict_syslog(lines):
+    received_at = datetime.now()
+    return [database.normalize_log_entry(syslog_to_log_entry(line, '10.0.0.9', received_at)) for line in lines]
+
+def parse_operation_log(text):
+    reader = csv.reader(io.StringIO(text))
+    parser = parsers.get_parser('CSV', 'csv', next(reader))
+    return parser.parse([row for row in reader if row], SOURCE)
+
+def best_rate(run, data, count, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(data)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+def main():
+    parser = argparse.ArgumentParser(description='Records per second for each source parser, against the per-row '
+                                                 'entry dict path where one existed')
+    parser.add_argument('--records', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    rng = random.Random(1)
+    json_parser = parsers.get_parser('API', 'json')
+    syslog_parser = parsers.get_parser('SYSLOG', 'text')
+    kv_parser = parsers.get_parser('KV', 'text')
+    cases = (
+        ('OperationLog CSV', operation_log_csv(args.records, rng), dict_operation_log, parse_operation_log),
+        ('JSON', json_records(args.records, rng), dict_json, lambda records: json_parser.parse(records, SOURCE)),
+        ('syslog', syslog_lines(args.records, rng), dict_syslog,
+         lambda lines: syslog_parser.parse(lines, SOURCE, sender_ip='10.0.0.9')),
+        ('key=value', kv_lines(args.records, rng), None, lambda lines: kv_parser.parse(lines, SOURCE)),
+    )
+    for name, data, before, after in cases:
+        parsed = after(data)
+        assert len(parsed[0]) == args.records, parsed[1][:3]
+        rate = best_rate(after, data, args.records, args.repeat)
+        if before is None:
+            print(f"{name:>16}: {rate:>9.0f} records/s")
+            continue
+        old_rate = best_rate(before, data, args.records, args.repeat)
+        print(f"{name:>16}: {rate:>9.0f} records/s, entry dicts {old_rate:>9.0f} records/s ({rate / old_rate:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from psycopg2.extras import execute_values
+
+import database
+
+SCHEMA = 'bench_raw_log'
+
+# search_vector as it was generated while raw_log was stored inline.
+INLINE_SEARCH_SQL = (
+    f"setweight(to_tsvector('{database.SEARCH_CONFIG}', left(coalesce(message, ''), 65536)), 'A') || "
+    f"setweight(to_tsvector('{database.SEARCH_CONFIG}', left(coalesce(raw_log, ''), 65536)), 'B')"
+)
+
+EVENT_TABLE = '''
+    CREATE TABLE {name} (
+        id INTEGER NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        severity VARCHAR(50) NOT NULL,
+        source_ip VARCHAR(50),
+        source_host VARCHAR(255),
+        event_type VARCHAR(100),
+        message TEXT NOT NULL,
+        user_id INTEGER,
+        log_source_id INTEGER,
+        {raw_log}
+        processed BOOLEAN DEFAULT FALSE,
+        event_count INTEGER NOT NULL DEFAULT 1,
+        last_seen TIMESTAMP,
+        operator VARCHAR(255),
+        search_vector tsvector GENERATED ALWAYS AS ({search}) STORED,
+        PRIMARY KEY (id, timestamp)
+    )
+'''
+
+HOSTS = ['core-sw-02', 'app-srv-07', 'fw-edge-01', 'db-01', 'OSSFaceService']
+OPERATORS = ['ahmad.hajdawood', 'Emran.Zaarir', 'admin', 'noc.shift']
+SYSLOG_BODIES = [
+    ('sshd', 'Accepted publickey for deploy from 10.1.2.{n} port 40022 ssh2'),
+    ('sshd', 'Failed password for invalid user admin from 203.0.113.{n} port 51514 ssh2'),
+    ('kernel', 'DROP IN=eth0 OUT= SRC=203.0.113.{n} DST=10.0.0.5 PROTO=TCP DPT=23'),
+    ('sudo', 'operator : TTY=pts/0 ; PWD=/root ; USER=root ; COMMAND=/bin/systemctl restart nginx'),
+    ('nginx', '10.2.3.{n} - - "GET /admin HTTP/1.1" 403 153'),
+]
+OPERATIONS = ['query current activities', 'modify user', 'export alarm list', 'login', 'logout']
+
+def generate(count, seed):
+    # Returns (row, raw_log before, raw_log after) for a mix of the three
+    # ingest paths: syslog lines, /api/ingest JSON and OperationLog CSV rows.
+    rng = random.Random(seed)
+    start = datetime.now().replace(microsecond=0) - timedelta(days=1)
+    events = []
+    for idx in range(count):
+        timestamp = start + timedelta(seconds=idx * 86400 / count)
+        host = rng.choice(HOSTS)
+        kind = rng.random()
+        if kind < 0.4:
+            app_name, body = rng.choice(SYSLOG_BODIES)
+            message = body.format(n=rng.randrange(256))
+            line = f"<{rng.randrange(8, 24)}>{timestamp:%b %d %H:%M:%S} {host} {app_name}[{rng.randrange(100, 9999)}]: {message}"
+            events.append(((timestamp, 'INFO', message, None, host, app_name), line, line))
+        elif kind < 0.8:
+            log = {'message': f"user session {rng.randrange(10000)} refreshed", 'severity': 'INFO',
+                   'source_host': host, 'event_type': 'session'}
+            if rng.random() < 0.1:
+                log['request_id'] = f"{rng.getrandbits(64):016x}"
+            extra = {key: value for key, value in log.items() if key not in ('message', 'severity', 'source_host', 'event_type')}
+            events.append(((timestamp, 'INFO', log['message'], None, host, 'session'), str(log),
+                           json.dumps(extra) if extra else None))
+        else:
+            operation = rng.choice(OPERATIONS)
+            row = {'Operation': operation, 'Level': 'Minor', 'Operator': rng.choice(OPERATORS),
+                   'Time': f"\t{timestamp:%Y-%m-%d %H:%M:%S}", 'Source': 'OSSFaceService',
+                   'Terminal IP Address': f"192.168.27.{rng.randrange(256)}", 'Operation Object': operation,
+                   'Result': 'Successful', 'Details': operation}
+            ip = row['Terminal IP Address']
+            events.append(((timestamp, 'INFO', f"{operation} - {operation}", ip, 'OSSFaceService', operation),
+                           str(row), json.dumps(row, ensure_ascii=False)))
+    return events
+
+def copy_rows(cur, table, columns, rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(map(database._copy_value, row)))
+        buf.write('\n')
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+def relation_size(cur, table):
+    cur.execute("SELECT pg_total_relation_size(%s)", (table,))
+    return cur.fetchone()[0]
+
+def timed(cur, query, params, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        cur.execute(query, params)
+        cur.fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Table size and scan speed with raw_log stored inline versus in compressed '
+                                                 'payload blocks. Works in a scratch schema that is dropped afterwards.')
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    
+    events = generate(args.events, args.seed)
+    base_columns = ('id', 'timestamp', 'severity', 'message', 'source_ip', 'source_host', 'event_type')
+    with database.db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"SET search_path = {SCHEMA}, public")
+        cur.execute(EVENT_TABLE.format(name='events_inline', raw_log='raw_log TEXT,', search=INLINE_SEARCH_SQL))
+        cur.execute(EVENT_TABLE.format(name='syslog_events', raw_log='', search=database.SEARCH_VECTOR_SQL))
+        cur.execute(
+            f"""CREATE TABLE syslog_event_payloads (
+                    timestamp TIMESTAMP NOT NULL, first_id INTEGER NOT NULL, last_id INTEGER NOT NULL,
+                    event_ids INTEGER[] NOT NULL, lengths INTEGER[] NOT NULL, data BYTEA NOT NULL,
+                    PRIMARY KEY (last_id, timestamp))"""
+        )
+        cur.execute("ALTER TABLE syslog_event_payloads ALTER COLUMN data SET STORAGE EXTERNAL")
+        
+        started = time.perf_counter()
+        copy_rows(cur, 'events_inline', base_columns + ('raw_log',),
+                  ((idx,) + row + (before,) for idx, (row, before, _) in enumerate(events, 1)))
+        inline_load = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        copy_rows(cur, 'syslog_events', base_columns, ((idx,) + row for idx, (row, _, _) in enumerate(events, 1)))
+        kept = [(idx, row[0], after) for idx, (row, _, after) in enumerate(events, 1)
+                if database.payload_worth_keeping(row[2], after)]
+        compress_started = time.perf_counter()
+        blocks = list(database.payload_blocks(kept))
+        compress_time = time.perf_counter() - compress_started
+        execute_values(cur, f"INSERT INTO syslog_event_payloads ({database.PAYLOAD_COLUMNS}) VALUES %s", blocks)
+        split_load = time.perf_counter() - started
+        
+        for table in ('events_inline', 'syslog_events'):
+            cur.execute(f"CREATE INDEX ON {table} (timestamp, id)")
+            cur.execute(f"ANALYZE {table}")
+        conn.commit()
+        
+        raw_before = sum(len(before.encode()) for _, before, _ in events)
+        raw_after = sum(len(raw.encode()) for _, _, raw in kept)
+        stored = sum(len(block[-1].adapted) for block in blocks)
+        print(f"{args.events} events; raw payloads {raw_before / 1e6:.1f} MB inline, "
+              f"{len(kept)} kept ({raw_after / 1e6:.1f} MB) in {len(blocks)} blocks of {stored / 1e6:.2f} MB "
+              f"({raw_after / max(stored, 1):.1f}x, compressed in {compress_time:.2f} s)")
+        
+        inline_size = relation_size(cur, 'events_inline')
+        split_size = relation_size(cur, 'syslog_events')
+        payload_size = relation_size(cur, 'syslog_event_payloads')
+        print(f"  inline: events {inline_size / 1e6:.1f} MB, load {inline_load:.2f} s")
+        print(f"   split: events {split_size / 1e6:.1f} MB + payloads {payload_size / 1e6:.1f} MB, load {split_load:.2f} s")
+        
+        columns = database.LOG_COLUMNS
+        scans = (
+            ('full scan', "SELECT count(*) FROM {table} WHERE message LIKE '%%no such text%%'", ()),
+            ('latest 1000', "SELECT {columns} FROM {table} ORDER BY timestamp DESC, id DESC LIMIT 1000", ()),
+            ('day export', "SELECT {columns} FROM {table} WHERE timestamp >= %s ORDER BY timestamp, id", (events[0][0][0],)),
+        )
+        for label, query, params in scans:
+            inline = timed(cur, query.format(table='events_inline', columns=f"{columns}, raw_log"), params, args.iterations)
+            split = timed(cur, query.format(table='syslog_events', columns=columns), params, args.iterations)
+            print(f"  {label:>12}: inline {inline:.1f} ms, split {split:.1f} ms")
+        
+        sample = random.Random(args.seed).sample(kept, min(200, len(kept)))
+        started = time.perf_counter()
+        for event_id, timestamp, raw_log in sample:
+            assert database._fetch_payloads(cur, [(event_id, timestamp)])[event_id] == raw_log
+        print(f"  detail lookup: {(time.perf_counter() - started) / len(sample) * 1000:.2f} ms per event")
+        
+        cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        conn.commit()
+        cur.close()
+
+if __name__ == '__main__':
+    main()
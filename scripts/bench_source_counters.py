@@ -0,0 +1,102 @@
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+def insert_with_row_lock(source_id, seq):
+    # The write path before counters were deferred: the log_sources row stays
+    # locked from the UPDATE until the event's transaction commits.
+    with database.db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO syslog_events (severity, message, source_host, event_type, log_source_id) VALUES (%s, %s, %s, %s, %s) RETURNING id, timestamp",
+            ('INFO', f'benchmark event {seq}', 'bench-host', 'benchmark', source_id)
+        )
+        log_id, timestamp = cur.fetchone()
+        cur.execute(
+            "UPDATE log_sources SET total_logs_received = total_logs_received + 1, last_received = CURRENT_TIMESTAMP WHERE id = %s",
+            (source_id,)
+        )
+        conn.commit()
+        cur.close()
+    database._rollup_counters.add([database.EventRow(timestamp, 'INFO', f'benchmark event {seq}', None, 'bench-host', 'benchmark', None, None, source_id)])
+
+def insert_deferred(source_id, seq):
+    database.insert_log_event('INFO', f'benchmark event {seq}', source_host='bench-host', event_type='benchmark', log_source_id=source_id)
+
+def run(insert, source_id, threads, duration):
+    counts = [0] * threads
+    deadline = time.monotonic() + duration
+    
+    def worker(idx):
+        while time.monotonic() < deadline:
+            insert(source_id, counts[idx])
+            counts[idx] += 1
+    
+    workers = [threading.Thread(target=worker, args=(idx,)) for idx in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts), time.perf_counter() - started
+
+def total_received(source_id):
+    with database.db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT total_logs_received FROM log_sources WHERE id = %s", (source_id,))
+        total = cur.fetchone()[0]
+        cur.close()
+    return total
+
+def delete_benchmark(source_id):
+    # The benchmark events' share of the dashboard rollups goes with them;
+    # this process's pending rollup counts are flushed first.
+    database.flush_rollup_counters()
+    with database.db_connection() as conn:
+        cur = conn.cursor()
+        for unit in database.ROLLUP_UNITS:
+            cur.execute(
+                f"""UPDATE event_host_rollups_{unit} r SET event_count = r.event_count - e.events
+                    FROM (SELECT date_trunc('{unit}', timestamp) AS bucket, SUM(event_count) AS events
+                          FROM syslog_events WHERE log_source_id = %s GROUP BY 1) e
+                    WHERE r.bucket = e.bucket AND r.source_host = 'bench-host'""",
+                (source_id,)
+            )
+            cur.execute(f"DELETE FROM event_host_rollups_{unit} WHERE source_host = 'bench-host' AND event_count <= 0")
+            cur.execute(f"DELETE FROM event_rollups_{unit} WHERE log_source_id = %s", (source_id,))
+        cur.execute("DELETE FROM syslog_events WHERE log_source_id = %s", (source_id,))
+        cur.execute("DELETE FROM log_sources WHERE id = %s", (source_id,))
+        conn.commit()
+        cur.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent single-source ingest throughput with row-locked and deferred log source counters. '
+                                                 'Writes benchmark events, so run it against a scratch database.')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark source, its events and their rollups')
+    args = parser.parse_args()
+    
+    database.get_pool().max_size = max(database.get_pool().max_size, args.threads + 2)
+    source_id = database.create_log_source(f'bench-{uuid.uuid4().hex[:8]}', 'benchmark')
+    try:
+        for name, insert in (('row-locked', insert_with_row_lock), ('deferred', insert_deferred)):
+            before = total_received(source_id)
+            events, elapsed = run(insert, source_id, args.threads, args.duration)
+            database.flush_source_counters()
+            counted = total_received(source_id) - before
+            print(f"{name:>10}: {events} events in {elapsed:.1f}s, {events / elapsed:.0f} events/s "
+                  f"with {args.threads} threads, {counted} counted")
+    finally:
+        if not args.keep:
+            delete_benchmark(source_id)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import random
+import socket
+import time
+from datetime import datetime, timezone
+
+HOSTS = ['fw-edge-01', 'core-sw-02', 'vpn-gw-01', 'app-srv-07']
+APPS = [
+    ('sshd', 'Failed password for invalid user admin from 10.1.2.3 port 52344 ssh2'),
+    ('sshd', 'Accepted publickey for deploy from 10.1.2.9 port 40022 ssh2'),
+    ('kernel', 'DROP IN=eth0 OUT= SRC=203.0.113.7 DST=10.0.0.5 PROTO=TCP DPT=23'),
+    ('sudo', 'operator : TTY=pts/0 ; PWD=/root ; USER=root ; COMMAND=/bin/systemctl restart nginx'),
+    ('nginx', '10.2.3.4 - - "GET /admin HTTP/1.1" 403 153')
+]
+
+def build_message(seq, fmt):
+    pri = random.choice([10, 11, 12, 13, 14, 30, 38, 86, 131])
+    host = random.choice(HOSTS)
+    app, text = random.choice(APPS)
+    if fmt == 'rfc5424':
+        timestamp = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        return f'<{pri}>1 {timestamp} {host} {app} {random.randint(100, 9999)} - [meta seq="{seq}"] {text}'
+    timestamp = datetime.now().strftime('%b %d %H:%M:%S').replace(' 0', '  ', 1)
+    return f'<{pri}>{timestamp} {host} {app}[{random.randint(100, 9999)}]: {text}'
+
+def main():
+    parser = argparse.ArgumentParser(description='Send sample syslog traffic to syslog_listener.py')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5514)
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=0, help='messages per second, 0 sends as fast as possible')
+    parser.add_argument('--format', choices=['rfc3164', 'rfc5424'], default='rfc3164')
+    parser.add_argument('--tcp', action='store_true', help='use TCP with octet-counting framing')
+    args = parser.parse_args()
+    
+    if args.tcp:
+        sock = socket.create_connection((args.host, args.port))
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    
+    interval = 1.0 / args.rate if args.rate else 0
+    started = time.perf_counter()
+    for seq in range(args.count):
+        payload = build_message(seq, args.format).encode('utf-8')
+        if args.tcp:
+            sock.sendall(str(len(payload)).encode() + b' ' + payload)
+        else:
+            sock.sendto(payload, (args.host, args.port))
+        if interval:
+            time.sleep(interval)
+    elapsed = time.perf_counter() - started
+    sock.close()
+    print(f"sent {args.count} {args.format} messages over {'tcp' if args.tcp else 'udp'} "
+          f"in {elapsed:.2f}s ({args.count / elapsed:.0f} msg/s)")
+
+if __name__ == '__main__':
+    main()
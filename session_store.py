@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import time
+
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+from flask_session.defaults import Defaults
+
+from cache import TTLCache
+from config import Config
+import database
+
+class PostgresSession(ServerSideSession):
+    pass
+
+class PostgresSessionInterface(ServerSideSessionInterface):
+    session_class = PostgresSession
+    # Expired rows are swept by a background thread rather than by the store,
+    # which also makes flask-session register `flask session_cleanup`.
+    ttl = False
+    
+    def __init__(self, app, key_prefix=Defaults.SESSION_KEY_PREFIX, use_signer=Defaults.SESSION_USE_SIGNER,
+                 permanent=Defaults.SESSION_PERMANENT, sid_length=Defaults.SESSION_ID_LENGTH,
+                 serialization_format=Defaults.SESSION_SERIALIZATION_FORMAT,
+                 cache_size=4096, cache_ttl=5, sweep_interval=300, sweep_batch_size=5000):
+        # Decoded sessions are kept per worker for a few seconds, so a burst of
+        # requests from one browser reads the table once. The TTL bounds how
+        # long a logout served by another worker can go unnoticed here.
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.sweep_interval = sweep_interval
+        self.sweep_batch_size = sweep_batch_size
+        self._sweeper_pid = None
+        self._sweeper_lock = threading.Lock()
+        self.swept = 0
+        super().__init__(app, key_prefix, use_signer, permanent, sid_length, serialization_format)
+    
+    def _ensure_sweeper(self):
+        if self._sweeper_pid == os.getpid():
+            return
+        with self._sweeper_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            threading.Thread(target=self._sweep_forever, name='session-sweeper', daemon=True).start()
+    
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self._delete_expired_sessions()
+            except Exception as e:
+                logging.error(f"Session sweep failed: {str(e)}")
+    
+    def _retrieve_session_data(self, store_id):
+        self._ensure_sweeper()
+        entry = self.cache.get(store_id)
+        if entry is None:
+            row = database.get_session(store_id)
+            if row is None:
+                return None
+            data, remaining = row
+            entry = (self.serializer.decode(data), time.monotonic() + remaining)
+            self.cache.set(store_id, entry, ttl=min(self.cache.ttl, remaining))
+        return dict(entry[0])
+    
+    def should_set_storage(self, app, session):
+        if session.modified:
+            return True
+        if not app.config['SESSION_REFRESH_EACH_REQUEST']:
+            return False
+        # Writing the row back on every request only to push the expiry out
+        # would cost an UPDATE per page view; refresh it once half the
+        # lifetime has gone by instead.
+        entry = self.cache.get(self._get_store_id(session.sid))
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        return entry is None or entry[1] - time.monotonic() < lifetime / 2
+    
+    def _upsert_session(self, session_lifetime, session, store_id):
+        self._ensure_sweeper()
+        lifetime = session_lifetime.total_seconds()
+        database.save_session(store_id, self.serializer.encode(session), lifetime)
+        self.cache.set(store_id, (dict(session), time.monotonic() + lifetime))
+    
+    def _delete_session(self, store_id):
+        self.cache.pop(store_id)
+        database.delete_session(store_id)
+    
+    def _delete_expired_sessions(self):
+        deleted = database.delete_expired_sessions(self.sweep_batch_size)
+        self.swept += deleted
+        return deleted
+    
+    def stats(self):
+        stats = self.cache.stats()
+        stats['swept'] = self.swept
+        return stats
+
+def init_app(app):
+    app.session_interface = PostgresSessionInterface(
+        app,
+        key_prefix=app.config.get('SESSION_KEY_PREFIX', Defaults.SESSION_KEY_PREFIX),
+        use_signer=app.config.get('SESSION_USE_SIGNER', Defaults.SESSION_USE_SIGNER),
+        permanent=app.config.get('SESSION_PERMANENT', Defaults.SESSION_PERMANENT),
+        sid_length=app.config.get('SESSION_ID_LENGTH', Defaults.SESSION_ID_LENGTH),
+        serialization_format=app.config.get('SESSION_SERIALIZATION_FORMAT', Defaults.SESSION_SERIALIZATION_FORMAT),
+        cache_size=Config.SESSION_CACHE_SIZE,
+        cache_ttl=Config.SESSION_CACHE_TTL,
+        sweep_interval=Config.SESSION_SWEEP_INTERVAL,
+        sweep_batch_size=Config.SESSION_SWEEP_BATCH_SIZE
+    )
@@ -36,3 +36,107 @@ function showNotification(message, type = 'info') {
 function confirmDelete(message) {
     return confirm(message || 'Are you sure you want to delete this item?');
 }
+
+// Severity counts, top event types / hosts and a histogram for a time
+// window, served from the rollup tables rather than raw events.
+function fetchEventStats(params) {
+    return fetch(`/api/logs/stats?${new URLSearchParams(params)}`)
+        .then(res => res.json());
+}
+
+// GET a JSON endpoint that answers with an ETag, sending If-None-Match so an
+// unchanged resource comes back as an empty 304 and the last body is reused.
+const jsonResponseCache = new Map();
+
+function cachedFetchJSON(url) {
+    const cached = jsonResponseCache.get(url);
+    const headers = cached ? { 'If-None-Match': cached.etag } : {};
+    return fetch(url, { headers: headers, cache: 'no-store' })
+        .then(res => {
+            if (res.status === 304 && cached) {
+                return cached.data;
+            }
+            const etag = res.headers.get('ETag');
+            return res.json().then(data => {
+                if (res.ok && etag) {
+                    jsonResponseCache.set(url, { etag: etag, data: data });
+                }
+                return data;
+            });
+        });
+}
+
+class LogFeed {
+    // Keeps the newest `limit` events for a dashboard. After the first page
+    // each poll only asks for events newer than `latest_cursor`.
+    constructor(url, limit) {
+        this.url = url;
+        this.limit = limit;
+        this.logs = [];
+        this.cursor = null;
+    }
+    
+    poll() {
+        const params = new URLSearchParams({ limit: this.limit });
+        if (this.cursor) {
+            params.set('since', this.cursor);
+        }
+        return fetch(`${this.url}?${params}`)
+            .then(res => res.json())
+            .then(data => {
+                if (this.cursor && data.has_more) {
+                    // Too far behind to catch up page by page; start over from the newest events.
+                    this.cursor = null;
+                    return this.poll();
+                }
+                const incoming = this.cursor ? data.logs.slice().reverse() : data.logs;
+                const changed = !this.cursor || incoming.length > 0;
+                this.logs = this.cursor ? incoming.concat(this.logs).slice(0, this.limit) : incoming;
+                this.cursor = data.latest_cursor || this.cursor;
+                return { logs: this.logs, changed: changed };
+            });
+    }
+    
+    refresh() {
+        this.cursor = null;
+        return this.poll().then(result => this.onChange(result.logs));
+    }
+    
+    // Loads the newest page once, then follows /api/logs/stream and hands
+    // the updated list to onChange. Without EventSource it keeps polling.
+    stream(onChange, pollInterval) {
+        this.onChange = onChange;
+        if (!window.EventSource) {
+            this.refresh();
+            setInterval(() => this.poll().then(result => {
+                if (result.changed) {
+                    onChange(result.logs);
+                }
+            }), pollInterval);
+            return;
+        }
+        
+        let renderTimer = null;
+        this.refresh().then(() => {
+            const params = new URLSearchParams();
+            if (this.logs.length) {
+                params.set('last_event_id', Math.max(...this.logs.map(log => log.id)));
+            }
+            const source = new EventSource(`/api/logs/stream?${params}`);
+            source.addEventListener('log', event => {
+                this.logs.unshift(JSON.parse(event.data));
+                if (this.logs.length > this.limit) {
+                    this.logs.pop();
+                }
+                // Bursts arrive as many events; redraw at most a few times a second.
+                if (!renderTimer) {
+                    renderTimer = setTimeout(() => {
+                        renderTimer = null;
+                        onChange(this.logs);
+                    }, 250);
+                }
+            });
+            source.addEventListener('reset', () => this.refresh());
+        });
+    }
+}
@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import logging
+import re
+import signal
+import socket
+from datetime import datetime
+
+from config import Config
+import correlation
+import database
+import migrations
+import parsers
+from ingest_queue import IngestQueue
+
+class SyslogReceiver:
+    def __init__(self, queue, max_message_size=65536):
+        self.queue = queue
+        self.max_message_size = max_message_size
+        self.sources_by_ip = {}
+        self.received = 0
+        self.dropped = 0
+        self.invalid = 0
+    
+    def refresh_sources(self):
+        self.sources_by_ip = database.get_active_log_sources_by_ip()
+    
+    def build_row(self, data, sender_ip):
+        source = self.sources_by_ip.get(sender_ip)
+        parser = parsers.get_parser(source['source_type'] if source else None, 'text')
+        items, errors = parser.parse([data], source, datetime.now(), sender_ip)
+        if errors:
+            self.invalid += 1
+            logging.warning(f"Discarding syslog message from {sender_ip}: {errors[0][1]}")
+            return None
+        return items[0][1]
+    
+    def handle(self, data, sender_ip):
+        self.received += 1
+        row = self.build_row(data, sender_ip)
+        if row is not None and not self.queue.submit([row]):
+            self.dropped += 1
+
+class SyslogUDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver):
+        self.receiver = receiver
+    
+    def datagram_received(self, data, addr):
+        self.receiver.handle(data[:self.receiver.max_message_size], addr[0])
+
+_OCTET_COUNT_RE = re.compile(rb'(\d{1,10}) ')
+
+class SyslogTCPProtocol(asyncio.Protocol):
+    # Accepts both RFC 6587 framings: octet counting ("<len> <msg>") and
+    # newline-terminated messages from older senders.
+    def __init__(self, receiver):
+        self.receiver = receiver
+        self.buffer = bytearray()
+        self.transport = None
+        self.sender_ip = None
+        self.pending = []
+    
+    def connection_made(self, transport):
+        self.transport = transport
+        self.sender_ip = transport.get_extra_info('peername')[0]
+    
+    def data_received(self, data):
+        self.buffer.extend(data)
+        for message in self._frames():
+            self.receiver.received += 1
+            row = self.receiver.build_row(message, self.sender_ip)
+            if row is not None:
+                self.pending.append(row)
+        self._deliver()
+    
+    def _frames(self):
+        buffer = self.buffer
+        while buffer:
+            # Octet counting (RFC 6587) is digits and a space; a newline-framed
+            # message without a PRI can start with digits too.
+            counted = _OCTET_COUNT_RE.match(buffer)
+            if counted is None and len(buffer) < 11 and buffer.isdigit():
+                return
+            if counted is not None:
+                length = int(counted.group(1))
+                if length > self.receiver.max_message_size:
+                    self._abort(f"message of {length} bytes exceeds limit")
+                    return
+                end = counted.end() + length
+                if len(buffer) < end:
+                    return
+                message = bytes(buffer[counted.end():end])
+                del buffer[:end]
+            else:
+                newline = buffer.find(b'\n')
+                if newline == -1:
+                    if len(buffer) > self.receiver.max_message_size:
+                        self._abort("unterminated message exceeds limit")
+                    return
+                message = bytes(buffer[:newline])
+                del buffer[:newline + 1]
+            if message.strip():
+                yield message
+    
+    def _abort(self, reason):
+        logging.warning(f"Closing syslog connection from {self.sender_ip}: {reason}")
+        self.buffer.clear()
+        self.transport.close()
+    
+    def _deliver(self):
+        if not self.pending:
+            return True
+        if self.receiver.queue.submit(self.pending):
+            self.pending = []
+            return True
+        # Queue is full: stop reading so TCP backpressure reaches the sender
+        # instead of dropping what it already delivered.
+        if not self.transport.is_closing():
+            self.transport.pause_reading()
+            asyncio.get_running_loop().call_later(0.2, self._resume)
+        return False
+    
+    def _resume(self):
+        if self._deliver() and not self.transport.is_closing():
+            self.transport.resume_reading()
+    
+    def connection_lost(self, exc):
+        if self.pending and not self.receiver.queue.submit(self.pending):
+            self.receiver.dropped += len(self.pending)
+        self.pending = []
+
+async def serve(host, udp_port, tcp_port, stats_interval=60):
+    loop = asyncio.get_running_loop()
+    queue = IngestQueue(
+        maxsize=Config.INGEST_QUEUE_MAX_SIZE,
+        batch_size=Config.INGEST_BATCH_SIZE,
+        flush_interval=Config.INGEST_FLUSH_INTERVAL
+    )
+    receiver = SyslogReceiver(queue, Config.SYSLOG_MAX_MESSAGE_SIZE)
+    await loop.run_in_executor(None, receiver.refresh_sources)
+    correlation.install()
+    
+    udp_transport = None
+    tcp_server = None
+    if udp_port:
+        udp_transport, _ = await loop.create_datagram_endpoint(
+            lambda: SyslogUDPProtocol(receiver), local_addr=(host, udp_port))
+        # Bursts from network gear overflow the default socket buffer long
+        # before the event loop falls behind.
+        udp_transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        logging.info(f"Listening for syslog on udp://{host}:{udp_port}")
+    if tcp_port:
+        tcp_server = await loop.create_server(lambda: SyslogTCPProtocol(receiver), host, tcp_port)
+        logging.info(f"Listening for syslog on tcp://{host}:{tcp_port}")
+    
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=stats_interval)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await loop.run_in_executor(None, receiver.refresh_sources)
+        except Exception as e:
+            logging.error(f"Failed to refresh log sources: {str(e)}")
+        logging.info(f"syslog received={receiver.received} dropped={receiver.dropped} "
+                     f"invalid={receiver.invalid} queue={queue.stats()}")
+    
+    if udp_transport:
+        udp_transport.close()
+    if tcp_server:
+        tcp_server.close()
+        await tcp_server.wait_closed()
+    await loop.run_in_executor(None, queue.stop, Config.INGEST_DRAIN_TIMEOUT)
+
+def main():
+    parser = argparse.ArgumentParser(description='Receive RFC 3164/5424 syslog over UDP and TCP into syslog_events')
+    parser.add_argument('--host', default=Config.SYSLOG_BIND_HOST)
+    parser.add_argument('--udp-port', type=int, default=Config.SYSLOG_UDP_PORT, help='0 disables UDP')
+    parser.add_argument('--tcp-port', type=int, default=Config.SYSLOG_TCP_PORT, help='0 disables TCP')
+    parser.add_argument('--stats-interval', type=float, default=60)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    migrations.require_migrated()
+    asyncio.run(serve(args.host, args.udp_port, args.tcp_port, args.stats_interval))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import re
+from datetime import datetime, timedelta
+
+FACILITIES = (
+    'kern', 'user', 'mail', 'daemon', 'auth', 'syslog', 'lpr', 'news',
+    'uucp', 'cron', 'authpriv', 'ftp', 'ntp', 'security', 'console', 'solaris-cron',
+    'local0', 'local1', 'local2', 'local3', 'local4', 'local5', 'local6', 'local7'
+)
+
+SYSLOG_SEVERITIES = ('emerg', 'alert', 'crit', 'err', 'warning', 'notice', 'info', 'debug')
+
+# Syslog has eight levels, the dashboard only knows Config.LOG_SEVERITIES.
+SEVERITY_MAP = ('CRITICAL', 'CRITICAL', 'CRITICAL', 'ERROR', 'WARNING', 'INFO', 'INFO', 'INFO')
+
+DEFAULT_PRI = 13
+
+_PRI_RE = re.compile(r'<(\d{1,3})>')
+_RFC5424_RE = re.compile(r'([1-9]\d{0,2}) (\S+) (\S+) (\S+) (\S+) (\S+) ')
+_RFC3164_TS_RE = re.compile(r'([A-Z][a-z]{2}) {1,2}(\d{1,2}) (\d{2}):(\d{2}):(\d{2}) ')
+_TAG_RE = re.compile(r'([^\s:\[\]]{1,48})(?:\[([^\]]*)\])?: ?')
+_SD_PARAM_RE = re.compile(r'\s*([^\s=\]"]+)="((?:[^"\\]|\\.)*)"')
+_SD_UNESCAPE_RE = re.compile(r'\\([\\"\]])')
+
+_MONTHS = {name: idx for idx, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), start=1)}
+
+def _nil(value):
+    return None if value == '-' else value
+
+def _to_local_naive(timestamp):
+    if timestamp.tzinfo is not None:
+        # Offsets can push a time at the calendar limits past year 1 or 9999.
+        try:
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        except (OverflowError, OSError):
+            raise ValueError(f"timestamp out of range {timestamp.isoformat()!r}")
+    return timestamp
+
+def _parse_structured_data(text):
+    if text.startswith('-'):
+        return None, text[1:]
+    elements = {}
+    pos = 0
+    while pos < len(text) and text[pos] == '[':
+        end_id = pos + 1
+        while end_id < len(text) and text[end_id] not in ' ]':
+            end_id += 1
+        sd_id = text[pos + 1:end_id]
+        params = {}
+        pos = end_id
+        while True:
+            match = _SD_PARAM_RE.match(text, pos)
+            if not match:
+                break
+            params[match.group(1)] = _SD_UNESCAPE_RE.sub(r'\1', match.group(2))
+            pos = match.end()
+        if pos >= len(text) or text[pos] != ']':
+            break
+        elements[sd_id] = params
+        pos += 1
+    return elements or None, text[pos:]
+
+def _parse_rfc5424(body, result):
+    match = _RFC5424_RE.match(body)
+    if not match:
+        return False
+    timestamp = _nil(match.group(2))
+    if timestamp:
+        try:
+            result['timestamp'] = _to_local_naive(datetime.fromisoformat(timestamp))
+        except ValueError:
+            return False
+    result['hostname'] = _nil(match.group(3))
+    result['app_name'] = _nil(match.group(4))
+    result['procid'] = _nil(match.group(5))
+    result['msgid'] = _nil(match.group(6))
+    structured_data, message = _parse_structured_data(body[match.end():])
+    result['structured_data'] = structured_data
+    message = message[1:] if message.startswith(' ') else message
+    result['message'] = message.lstrip('\ufeff')
+    return True
+
+def _parse_rfc3164(body, result, received_at):
+    match = _RFC3164_TS_RE.match(body)
+    if match and match.group(1) in _MONTHS:
+        month = _MONTHS[match.group(1)]
+        try:
+            timestamp = datetime(received_at.year, month, int(match.group(2)),
+                                 int(match.group(3)), int(match.group(4)), int(match.group(5)))
+        except ValueError:
+            timestamp = None
+        if timestamp is not None:
+            # BSD timestamps carry no year; a date far in the future is last year's.
+            if timestamp - received_at > timedelta(days=1):
+                timestamp = timestamp.replace(year=timestamp.year - 1)
+            result['timestamp'] = timestamp
+            body = body[match.end():]
+            hostname, _, rest = body.partition(' ')
+            if rest and not hostname.endswith(':'):
+                result['hostname'] = hostname
+                body = rest
+    
+    tag = _TAG_RE.match(body)
+    if tag:
+        result['app_name'] = tag.group(1)
+        result['procid'] = tag.group(2)
+        body = body[tag.end():]
+    result['message'] = body
+
+def parse_syslog(data, received_at=None):
+    if isinstance(data, bytes):
+        data = data.decode('utf-8', 'replace')
+    received_at = received_at or datetime.now()
+    text = data.strip('\r\n\x00 ')
+    
+    pri = DEFAULT_PRI
+    match = _PRI_RE.match(text)
+    if match and int(match.group(1)) <= 191:
+        pri = int(match.group(1))
+        body = text[match.end():]
+    else:
+        body = text
+    
+    facility, level = divmod(pri, 8)
+    result = {
+        'pri': pri,
+        'facility': FACILITIES[facility],
+        'syslog_severity': SYSLOG_SEVERITIES[level],
+        'severity': SEVERITY_MAP[level],
+        'timestamp': received_at,
+        'hostname': None,
+        'app_name': None,
+        'procid': None,
+        'msgid': None,
+        'structured_data': None,
+        'message': body,
+        'format': 'rfc5424'
+    }
+    if not _parse_rfc5424(body, result):
+        result['format'] = 'rfc3164'
+        result['structured_data'] = None
+        result['timestamp'] = received_at
+        _parse_rfc3164(body, result, received_at)
+    return result
+
+def syslog_to_log_entry(data, sender_ip=None, received_at=None):
+    if isinstance(data, bytes):
+        data = data.decode('utf-8', 'replace')
+    parsed = parse_syslog(data, received_at)
+    return {
+        'timestamp': parsed['timestamp'],
+        'severity': parsed['severity'],
+        'message': parsed['message'] or data,
+        'source_ip': sender_ip,
+        'source_host': parsed['hostname'],
+        'event_type': parsed['app_name'] or 'SYSLOG',
+        'raw_log': data
+    }
+
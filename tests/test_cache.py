@@ -0,0 +1,44 @@
+import time
+
+from cache import TTLCache
+
+def test_get_returns_value_until_it_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = TTLCache(ttl=10)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    now[0] += 11
+    assert cache.get('a', 'gone') == 'gone'
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_per_entry_ttl_overrides_default(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = TTLCache(ttl=10)
+    cache.set('short', 1, ttl=1)
+    cache.set('long', 2)
+    now[0] += 5
+    assert cache.get('short') is None
+    assert cache.get('long') == 2
+
+def test_evicts_least_recently_used_beyond_maxsize():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.evictions == 1
+
+def test_pop_and_discard_where():
+    cache = TTLCache()
+    for key in range(5):
+        cache.set(key, key * 10)
+    assert cache.pop(0) == 0
+    assert cache.pop(0, 'missing') == 'missing'
+    assert cache.discard_where(lambda key, value: value >= 30) == 2
+    assert sorted(cache._data) == [1, 2]
+    assert cache.stats()['size'] == 2
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from database import EventCoalescer, EventRow, coalesce_items, event_fingerprint
+
+T = datetime(2026, 3, 1, 12, 0, 0)
+
+def _row(seconds=0, message='Login failed for admin', operator='alice', **fields):
+    return EventRow(T + timedelta(seconds=seconds), 'WARNING', message, '10.0.0.1', 'app-1', 'LOGIN', None, None, 3,
+                    operator=operator, **fields)
+
+def test_repeats_within_the_window_fold_into_one_row():
+    rows = coalesce_items([(0, _row(0)), (1, _row(5, message='login  FAILED for admin')), (2, _row(9))], window=10)
+    assert len(rows) == 1
+    idx, row = rows[0]
+    assert (idx, row.timestamp, row.event_count, row.last_seen) == (0, T, 3, T + timedelta(seconds=9))
+
+def test_repeat_past_the_window_starts_a_new_row():
+    rows = coalesce_items([(0, _row(0)), (1, _row(11))], window=10)
+    assert [(idx, row.event_count, row.last_seen) for idx, row in rows] == [(0, 1, None), (1, 1, None)]
+
+def test_different_operators_stay_separate():
+    rows = coalesce_items([(0, _row(0)), (1, _row(1, operator='bob')), (2, _row(2))], window=10)
+    assert sorted((row.operator, row.event_count) for _, row in rows) == [('alice', 2), ('bob', 1)]
+    assert event_fingerprint(_row(operator='alice')) != event_fingerprint(_row(operator='bob'))
+
+def test_out_of_order_repeat_moves_the_start_back():
+    rows = coalesce_items([(0, _row(5)), (1, _row(0, event_count=2, last_seen=T + timedelta(seconds=3)))], window=10)
+    [(_, row)] = rows
+    assert (row.timestamp, row.event_count, row.last_seen) == (T, 3, T + timedelta(seconds=5))
+
+def test_groups_close_as_the_stream_moves_on_and_beyond_max_groups():
+    coalescer = EventCoalescer(window=10, max_groups=2)
+    assert coalescer.add(0, _row(0, message='a')) == []
+    assert coalescer.add(1, _row(1, message='b')) == []
+    assert [idx for idx, _ in coalescer.add(2, _row(2, message='c'))] == [0]
+    assert [idx for idx, _ in coalescer.add(3, _row(20, message='d'))] == [1, 2]
+    assert [idx for idx, _ in coalescer.drain()] == [3]
+    assert (coalescer.events, coalescer.rows) == (4, 4)
@@ -0,0 +1,123 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import correlation
+from config import Config
+from database import EventRow
+
+T = datetime(2026, 3, 1, 12, 0, 0)
+
+def _event(seconds, event_type='sshd', message='Failed password for root', ip='203.0.113.5', host='app-1',
+           operator=None, severity='INFO', count=1):
+    return EventRow(T + timedelta(seconds=seconds), severity, message, ip, host, event_type, None, None, None,
+                    count, operator=operator)
+
+def _engine(*specs):
+    return correlation.CorrelationEngine(correlation.build_rules(specs))
+
+def _observe(engine, rows, one_by_one=False):
+    if one_by_one:
+        return [alert for row in rows for alert in engine.observe([row])]
+    return engine.observe(rows)
+
+THRESHOLD = {'name': 'burst', 'type': 'threshold', 'match': {'event_type': 'sshd'}, 'group_by': 'source_ip',
+             'threshold': 3, 'window': 60}
+
+def test_threshold_fires_once_the_count_is_reached_within_the_window():
+    engine = _engine(THRESHOLD)
+    assert _observe(engine, [_event(0), _event(30)]) == []
+    [alert] = _observe(engine, [_event(59)])
+    payload = json.loads(alert.raw_log)
+    assert (alert.severity, alert.event_type, alert.source_ip) == ('CRITICAL', correlation.ALERT_EVENT_TYPE, '203.0.113.5')
+    assert (payload['count'], payload['first_seen'], payload['last_seen']) == (3, T.isoformat(), _event(59).timestamp.isoformat())
+    assert _observe(engine, [_event(200), _event(400), _event(600)]) == []
+
+def test_threshold_counts_coalesced_rows_by_event_count():
+    assert len(_observe(_engine(THRESHOLD), [_event(0, count=2), _event(1)])) == 1
+
+@pytest.mark.parametrize('one_by_one', [False, True])
+def test_threshold_ignores_late_events_outside_the_window(one_by_one):
+    newest_first = [_event(-60 * n) for n in range(6)]
+    assert _observe(_engine(THRESHOLD), newest_first, one_by_one) == []
+
+def test_threshold_counts_late_events_inside_the_window():
+    [alert] = _observe(_engine(THRESHOLD), [_event(0), _event(-10), _event(-20)], one_by_one=True)
+    payload = json.loads(alert.raw_log)
+    assert (payload['first_seen'], payload['last_seen']) == (_event(-20).timestamp.isoformat(), T.isoformat())
+    assert alert.timestamp == T
+
+def test_distinct_counts_different_values_only():
+    engine = _engine({'name': 'sweep', 'type': 'distinct', 'match': {'event_type': 'sshd'}, 'group_by': 'source_ip',
+                      'field': 'source_host', 'threshold': 3, 'window': 300})
+    assert _observe(engine, [_event(0, host='a'), _event(1, host='a'), _event(2, host='b'), _event(3, host=None)]) == []
+    [alert] = _observe(engine, [_event(-100, host='c')])
+    assert '3 distinct source_host values' in alert.message
+    assert _observe(engine, [_event(-1000, host='d')]) == []
+
+SEQUENCE = {'name': 'disable_then_modify', 'type': 'sequence', 'group_by': 'operator', 'window': 600,
+            'steps': [{'event_type': 'Deactive Monitor task'}, {'event_type': ['Modify Monitor Task', 'Add Monitor Task']}]}
+
+def test_sequence_fires_per_operator_and_alert_carries_it():
+    engine = _engine(SEQUENCE)
+    rows = [_event(0, 'Deactive Monitor task', operator='alice'), _event(10, 'Modify Monitor Task', operator='bob'),
+            _event(200, 'Add Monitor Task', operator='alice')]
+    [alert] = _observe(engine, rows)
+    assert alert.operator == 'alice'
+    assert alert.message.endswith('2-step sequence by operator alice within 200s')
+
+def test_sequence_steps_must_be_in_time_order():
+    engine = _engine(SEQUENCE)
+    rows = [_event(200, 'Modify Monitor Task', operator='alice'), _event(0, 'Deactive Monitor task', operator='alice')]
+    assert _observe(engine, rows, one_by_one=True) == []
+    [alert] = _engine(SEQUENCE).observe(rows)
+    assert 'within 200s' in alert.message
+
+def test_sequence_window_expires():
+    rows = [_event(0, 'Deactive Monitor task', operator='alice'), _event(601, 'Modify Monitor Task', operator='alice')]
+    assert _observe(_engine(SEQUENCE), rows) == []
+
+def test_text_conditions_and_unindexed_rules():
+    engine = _engine({'name': 'deny', 'type': 'threshold', 'match': {'message': {'regex': '(?i)^deny'}},
+                      'group_by': 'source_ip', 'threshold': 2, 'window': 60},
+                     {'name': 'op', 'type': 'threshold', 'match': {'operator': {'contains': 'adm'}, 'event_type': 'x'},
+                      'group_by': 'operator', 'threshold': 1, 'window': 60})
+    assert len(engine.unindexed) == 1
+    assert len(_observe(engine, [_event(0, 'fw', 'DENY tcp'), _event(1, 'fw', 'Deny udp'), _event(2, 'fw', 'allowed')])) == 1
+    [alert] = _observe(engine, [_event(2, 'x', operator='sysadmin'), _event(3, 'y', operator='sysadmin')])
+    assert alert.operator == 'sysadmin'
+
+def test_keys_are_bounded_and_expired():
+    rules = correlation.build_rules([THRESHOLD], max_keys=2)
+    engine = correlation.CorrelationEngine(rules)
+    engine.observe([_event(0, ip=f"10.0.0.{n}") for n in range(3)])
+    assert (len(rules[0].keys), rules[0].evicted) == (2, 1)
+    rules[0].expire(T + timedelta(seconds=61))
+    assert (len(rules[0].keys), rules[0].expired) == (0, 2)
+
+@pytest.mark.parametrize('spec, error', [
+    ({'type': 'threshold'}, "missing 'name'"),
+    (dict(THRESHOLD, type='nope'), 'type must be one of'),
+    (dict(THRESHOLD, threshold=0), 'threshold must be at least 1'),
+    (dict(THRESHOLD, window=-1), 'window must be positive'),
+    (dict(THRESHOLD, group_by='nope'), "unknown field 'nope'"),
+    (dict(THRESHOLD, match={'user_id': {'contains': '1'}}), 'user_id is not a text field'),
+    (dict(THRESHOLD, match={'message': {'regex': '('}}), 'burst'),
+    (dict(SEQUENCE, steps=[{'event_type': 'a'}]), 'a sequence needs at least two steps'),
+])
+def test_invalid_rules_are_rejected(spec, error):
+    with pytest.raises(ValueError, match=error):
+        correlation.build_rules([spec])
+
+def test_duplicate_names_are_rejected():
+    with pytest.raises(ValueError, match='duplicate name'):
+        correlation.build_rules([THRESHOLD, THRESHOLD])
+
+def test_rule_subclasses_must_implement_latest_and_update():
+    with pytest.raises(TypeError):
+        correlation.Rule({'name': 'x', 'window': 1, 'group_by': 'source_ip'})
+
+def test_shipped_rules_load():
+    rules = correlation.load_rules(Config.CORRELATION_RULES_FILE)
+    assert len({rule.name for rule in rules}) == len(rules)
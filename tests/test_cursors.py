@@ -0,0 +1,25 @@
+from datetime import datetime
+
+import pytest
+
+from api.logs_api import decode_log_cursor, decode_search_cursor, encode_log_cursor, encode_search_cursor
+
+def test_log_cursor_round_trips():
+    timestamp = datetime(2026, 3, 1, 12, 30, 5, 123456)
+    cursor = encode_log_cursor(timestamp, 42)
+    assert '=' not in cursor
+    assert decode_log_cursor(cursor) == (timestamp, 42)
+
+def test_search_cursor_round_trips_rank_exactly():
+    timestamp = datetime(2026, 3, 1, 12, 30, 5)
+    rank = 0.1 + 0.2
+    assert decode_search_cursor(encode_search_cursor(rank, timestamp, 7)) == (rank, timestamp, 7)
+
+@pytest.mark.parametrize('cursor', ['', 'not-base64!', encode_log_cursor(datetime(2026, 1, 1), 1) + 'x', 'é'])
+def test_invalid_log_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_log_cursor(cursor)
+
+def test_log_cursor_is_not_a_search_cursor():
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_search_cursor(encode_log_cursor(datetime(2026, 1, 1), 1))
@@ -0,0 +1,92 @@
+import os
+import uuid
+from datetime import date, timedelta
+
+import psycopg2
+import pytest
+from psycopg2 import extensions
+
+from config import Config
+import database
+import migrations
+
+# A server the test may create and drop a scratch database on.
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason='TEST_DATABASE_URL is not set')
+
+def _admin_execute(statement):
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    conn.autocommit = True
+    try:
+        conn.cursor().execute(statement)
+    finally:
+        conn.close()
+
+def _load(cur):
+    # Enough rows that the planner has to choose, spread the way a live
+    # install is: a few days of events, a year of reports, many sources.
+    cur.execute('''
+        INSERT INTO syslog_events (timestamp, severity, message, source_ip, source_host, event_type, operator)
+        SELECT now() - (n * interval '4 seconds'),
+               CASE WHEN n % 50 = 0 THEN 'CRITICAL' WHEN n % 10 = 0 THEN 'ERROR' WHEN n % 5 = 0 THEN 'WARNING'
+                    ELSE 'INFO' END,
+               CASE WHEN n % 500 = 0 THEN 'unauthorized access to /admin'
+                    ELSE 'session opened for user ' || (n % 300) END,
+               '10.0.' || (n % 250) || '.' || (n % 200), 'host-' || (n % 40), 'sshd', 'op-' || (n % 50)
+        FROM generate_series(1, 60000) AS n
+    ''')
+    cur.execute("INSERT INTO groups (name) SELECT 'group-' || n FROM generate_series(1, 40) AS n")
+    cur.execute('''
+        INSERT INTO activity_reports (group_id, report_date)
+        SELECT g.id, CURRENT_DATE - d FROM groups g, generate_series(0, 364) AS d
+    ''')
+    cur.execute('''
+        INSERT INTO log_sources (name, source_type, api_key)
+        SELECT 'source-' || n, 'API', md5(n::text) FROM generate_series(1, 20000) AS n
+    ''')
+    cur.execute('''
+        INSERT INTO event_rollups_hour (bucket, severity, event_type, log_source_id, event_count)
+        SELECT date_trunc('hour', now()) - h * interval '1 hour', s, 'type-' || t, 0, 1
+        FROM generate_series(0, 24 * 60) AS h, unnest(ARRAY['INFO', 'WARNING', 'ERROR', 'CRITICAL']) AS s,
+             generate_series(1, 10) AS t
+    ''')
+
+@pytest.fixture(scope='module')
+def scratch_database():
+    name = f"siem_index_test_{uuid.uuid4().hex[:8]}"
+    _admin_execute(f"CREATE DATABASE {name}")
+    saved_url, saved_pool = Config.DATABASE_URL, database._pool
+    Config.DATABASE_URL = extensions.make_dsn(TEST_DATABASE_URL, dbname=name)
+    database._pool = None
+    try:
+        database.init_database()
+        database.ensure_event_partitions({date.today() - timedelta(days=offset) for offset in range(4)})
+        with database.db_connection() as conn:
+            cur = conn.cursor()
+            _load(cur)
+            conn.commit()
+            conn.autocommit = True
+            cur.execute("VACUUM ANALYZE")
+            conn.autocommit = False
+            cur.close()
+        yield name
+    finally:
+        if database._pool is not None:
+            database._pool.close()
+        Config.DATABASE_URL, database._pool = saved_url, saved_pool
+        _admin_execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+
+def test_hot_path_queries_use_indexes(scratch_database):
+    results = migrations.check_index_usage()
+    assert [result['query'] for result in results] == [label for label, _, _, _ in migrations.HOT_PATH_QUERIES]
+    assert [result['query'] for result in results if not result['uses_index']] == []
+
+def test_large_sequential_scan_fails_the_check(scratch_database, monkeypatch):
+    # A filter no index covers must be reported, not hidden.
+    monkeypatch.setattr(migrations, 'HOT_PATH_QUERIES', [
+        ('unindexed filter', 'log_sources', "SELECT * FROM log_sources WHERE name = %s", ('source-1',))
+    ])
+    [result] = migrations.check_index_usage()
+    assert not result['uses_index']
+    assert result['scans'] == [('Seq Scan', 'log_sources')]
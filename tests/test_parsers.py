@@ -0,0 +1,99 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import parsers
+
+RECEIVED = datetime(2026, 3, 1, 12, 0, 0)
+SOURCE = {'id': 7, 'name': 'fw-edge-01', 'source_ip': '10.0.0.1', 'source_type': 'KV'}
+
+def _parse(parser, records, source=SOURCE):
+    return parser.parse(records, source, RECEIVED, '192.0.2.9')
+
+def test_json_maps_fields_and_keeps_the_rest_as_payload():
+    items, errors = _parse(parsers.JsonParser(), [
+        {'message': 'Login failed', 'severity': 'warn', 'host': '10.1.1.1', 'hostname': 'app-1', 'type': 'LOGIN',
+         'user': ' alice ', 'extra': 1},
+        {'severity': 'info'},
+        'not an object'
+    ])
+    assert errors == [(1, 'message is required'), (2, 'expected a JSON object')]
+    [(idx, row)] = items
+    assert (idx, row.timestamp, row.severity, row.source_ip, row.source_host) == (0, RECEIVED, 'WARNING', '10.1.1.1', 'app-1')
+    assert (row.event_type, row.operator, row.log_source_id) == ('LOGIN', 'alice', 7)
+    assert json.loads(row.raw_log) == {'extra': 1}
+
+def test_column_limits_are_row_errors():
+    items, errors = _parse(parsers.JsonParser(), [{'message': 'x', 'severity': 'S' * 51}])
+    assert items == [] and errors == [(0, 'severity exceeds 50 characters')]
+
+def test_syslog_rfc3164_line():
+    [(_, row)], errors = _parse(parsers.SyslogParser(), [b'<34>Oct 11 22:14:15 mymachine su: su root failed'])
+    assert errors == []
+    assert (row.severity, row.source_host, row.event_type, row.message) == ('CRITICAL', 'mymachine', 'su', 'su root failed')
+    assert (row.source_ip, row.raw_log) == ('192.0.2.9', '<34>Oct 11 22:14:15 mymachine su: su root failed')
+
+def test_syslog_rfc5424_offset_is_converted_to_local_time():
+    [(_, row)], _ = _parse(parsers.SyslogParser(), ['<13>1 2026-03-01T10:00:00Z host app - - - hello'])
+    assert row.timestamp == datetime(2026, 3, 1, 10, 0, 0, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert (row.message, row.event_type) == ('hello', 'app')
+
+def test_syslog_rejects_blank_records():
+    items, errors = _parse(parsers.SyslogParser(), ['', ' \n'])
+    assert items == [] and errors == [(0, 'empty record'), (1, 'empty record')]
+
+def test_key_value_fields_timestamps_and_quoting():
+    parser = parsers.KeyValueParser()
+    items, errors = _parse(parser, [
+        'date=2026-03-01 time=08:15:00 devname=fw1 src=203.0.113.5 action=deny msg="blocked \\"telnet\\"" user=bob',
+        'ts=1772352000 msg=epoch',
+        'ts=1772352000000 msg=millis',
+        'src=1.2.3.4 action=allow',
+    ])
+    assert errors == []
+    rows = [row for _, row in items]
+    assert (rows[0].timestamp, rows[0].source_host, rows[0].source_ip) == (datetime(2026, 3, 1, 8, 15), 'fw1', '203.0.113.5')
+    assert (rows[0].event_type, rows[0].message, rows[0].operator) == ('deny', 'blocked "telnet"', 'bob')
+    assert rows[1].timestamp == rows[2].timestamp == datetime.fromtimestamp(1772352000)
+    assert (rows[3].message, rows[3].timestamp) == ('src=1.2.3.4 action=allow', RECEIVED)
+
+@pytest.mark.parametrize('record, error', [
+    ('', 'empty record'),
+    ('msg= src=1.2.3.4', 'message is required'),
+    ('msg="" src=1.2.3.4', 'message is required'),
+    ('ts=99999999999999999999 msg=x', "invalid timestamp '99999999999999999999'"),
+    ('ts="9999-12-31T23:59:59-05:00" msg=x', "timestamp out of range '9999-12-31T23:59:59-05:00'"),
+    ('uid=abc msg=x', "invalid user_id 'abc'"),
+])
+def test_key_value_row_errors(record, error):
+    items, errors = _parse(parsers.KeyValueParser(), [record, 'msg=ok'])
+    assert errors == [(0, error)]
+    assert [idx for idx, _ in items] == [1]
+
+def test_operation_log_rows():
+    header = ['Operation', 'Level', 'Operator', 'Time', 'Source', 'Terminal IP Address', 'Operation Object', 'Result',
+              'Details']
+    parser = parsers.get_parser('CSV', 'csv', header)
+    items, errors = _parse(parser, [
+        ['Export Object Tree', 'Major', 'ahmad', '\t2026-03-01 09:00:00', 'OSS', '192.168.27.29', 'tree', 'Successful',
+         'Export'],
+        ['query current activities', 'Minor', '\t--', '', 'OSS', '', '', '', 'query'],
+        ['Modify Report', 'Minor', 'x', '0001-01-01T00:00:00+05:00', 'OSS', '', '', '', 'r'],
+    ])
+    assert [idx for idx, _ in errors] == [2]
+    first, second = [row for _, row in items]
+    assert (first.timestamp, first.severity, first.message) == (datetime(2026, 3, 1, 9), 'ERROR', 'Export Object Tree - Export')
+    assert (first.operator, first.source_ip, first.source_host) == ('ahmad', '192.168.27.29', 'OSS')
+    assert json.loads(first.raw_log)['Operation Object'] == 'tree'
+    assert (second.operator, second.source_ip, second.timestamp) == (None, None, RECEIVED)
+
+def test_get_parser_falls_back_to_the_endpoint_default():
+    assert type(parsers.get_parser('KV', 'text')) is parsers.KeyValueParser
+    assert type(parsers.get_parser('KV', 'json')) is parsers.JsonParser
+    assert type(parsers.get_parser(None, 'text')) is parsers.SyslogParser
+    assert parsers.get_parser('SYSLOG', 'text') is parsers.get_parser('FORWARDING', 'text')
+
+def test_parser_requires_row():
+    with pytest.raises(TypeError):
+        parsers.Parser()
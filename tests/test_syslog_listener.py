@@ -0,0 +1,89 @@
+import asyncio
+
+from syslog_listener import SyslogReceiver, SyslogTCPProtocol
+
+class Queue:
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.rows = []
+    
+    def submit(self, rows):
+        if self.accept:
+            self.rows.extend(rows)
+        return self.accept
+
+class Transport:
+    def __init__(self):
+        self.closed = False
+        self.paused = False
+    
+    def get_extra_info(self, name):
+        return ('192.0.2.9', 51514)
+    
+    def close(self):
+        self.closed = True
+    
+    def is_closing(self):
+        return self.closed
+    
+    def pause_reading(self):
+        self.paused = True
+    
+    def resume_reading(self):
+        self.paused = False
+
+def _connect(max_message_size=1024, accept=True):
+    queue = Queue(accept)
+    protocol = SyslogTCPProtocol(SyslogReceiver(queue, max_message_size))
+    transport = Transport()
+    protocol.connection_made(transport)
+    return protocol, queue, transport
+
+def _counted(message):
+    return f"{len(message)} {message}".encode()
+
+def _messages(queue):
+    return [row.message for row in queue.rows]
+
+def test_octet_counted_and_newline_framing_mix():
+    protocol, queue, _ = _connect()
+    protocol.data_received(_counted('<13>Oct 11 22:14:15 h a: one') + b'<13>Oct 11 22:14:15 h a: two\n')
+    assert _messages(queue) == ['one', 'two']
+
+def test_frames_split_across_reads():
+    protocol, queue, _ = _connect()
+    framed = _counted('<13>Oct 11 22:14:15 h a: hello world') + b'<13>Oct 11 22:14:15 h a: tail'
+    for chunk in (framed[:1], framed[1:10], framed[10:40], framed[40:]):
+        protocol.data_received(chunk)
+    assert _messages(queue) == ['hello world']
+    protocol.data_received(b'\n')
+    assert _messages(queue) == ['hello world', 'tail']
+
+def test_line_starting_with_digits_is_newline_framed():
+    protocol, queue, transport = _connect()
+    protocol.data_received(b'12:00:00 host msg\n2024-01-01 started\n')
+    assert len(queue.rows) == 2 and not transport.closed
+    assert queue.rows[0].raw_log == '12:00:00 host msg'
+
+def test_blank_lines_are_skipped():
+    protocol, queue, _ = _connect()
+    protocol.data_received(b'\n\r\n<13>Oct 11 22:14:15 h a: x\n')
+    assert _messages(queue) == ['x']
+
+def test_oversized_frames_close_the_connection():
+    protocol, queue, transport = _connect(max_message_size=16)
+    protocol.data_received(b'100 ')
+    assert transport.closed and protocol.buffer == bytearray()
+    protocol, queue, transport = _connect(max_message_size=16)
+    protocol.data_received(b'<13>' + b'x' * 20)
+    assert transport.closed
+
+def test_full_queue_pauses_reading_until_rows_are_accepted():
+    async def run():
+        protocol, queue, transport = _connect(accept=False)
+        protocol.data_received(b'<13>Oct 11 22:14:15 h a: x\n')
+        assert transport.paused and len(protocol.pending) == 1
+        queue.accept = True
+        await asyncio.sleep(0.3)
+        assert not transport.paused and protocol.pending == [] and _messages(queue) == ['x']
+    asyncio.run(run())